@@ -0,0 +1,435 @@
+"""Offline benchmark: chạy các tier scrape, parser và Telegram dispatcher trên fixture ghi sẵn
+
+Không gọi Google Trends / Telegram thật: fixture được phục vụ bởi 1 HTTP server local,
+Telegram là 1 fake Bot API local. Kết quả (throughput, p50/p99, peak memory) in ra JSON,
+so sánh với baseline để phát hiện regression.
+
+    python bench.py                              # chạy với fixture sinh sẵn
+    python bench.py --record fixtures/           # lưu fixture ra thư mục
+    python bench.py --fixtures fixtures/         # chạy với fixture đã ghi
+    python bench.py --save-baseline bench.json   # lưu baseline
+    python bench.py --baseline bench.json        # exit 1 nếu chậm hơn baseline quá --tolerance
+"""
+import os
+import sys
+import json
+import time
+import logging
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from typing import Callable, Dict, List
+
+FIXTURE_FILES = {
+    'batchexecute': 'batchexecute.txt',
+    'trending': 'trending.html',
+    'rss_daily': 'rss_daily.xml',
+    'rss_realtime': 'rss_realtime.xml'
+}
+
+VOLUME_SAMPLES = ['2 N+', '500 N+', '1 Tr+', '20 N+', '200+', '1M+', '50K+', '1,000+', '10 K+', '2.5M+']
+KEYWORD_SAMPLES = ['real madrid vs barcelona', 'iPhone 17', 'giá vàng hôm nay', 'Tìm kiếm', 'Xu hướng',
+                   'taylor swift', 'x', 'Thời tiết hà nội', '2 N+', 'NFL week 5']
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+def trend_items(count: int, seed: int = 42) -> List:
+    """Trend item giống payload i0OFE: [keyword, _, geo, [start_ts], _, _, volume, _, _, related]"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        volume = rng.choice([2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000])
+        items.append([f"trend keyword {i}", None, 'US', [1760000000 + i * 60], None, None,
+                      volume, None, 1000, [f"related {i} a", f"related {i} b"]])
+    return items
+
+def volume_label(volume: int) -> str:
+    if volume >= 1000000:
+        return f"{volume // 1000000} Tr+"
+    if volume >= 1000:
+        return f"{volume // 1000} N+"
+    return f"{volume}+"
+
+def build_fixtures(count: int = 25) -> Dict[str, str]:
+    """Sinh fixture deterministic cho mọi tier"""
+    items = trend_items(count)
+
+    inner = json.dumps([None, items])
+    chunk = json.dumps([['wrb.fr', 'i0OFE', inner, None, None, None, 'generic'], ['di', 42]])
+    batchexecute = ")]}'\n\n" + str(len(chunk)) + "\n" + chunk + "\n25\n[[\"e\",4,null,null,100]]\n"
+
+    # Trang HTML: 2 table (Selenium đọc tbody thứ 2), div class cho BeautifulSoup, AF_initDataCallback
+    def related_cell(terms: List[str]) -> str:
+        return ''.join(f'<span data-term="{term}">{term}</span>' for term in terms)
+
+    table_rows = ''.join(
+        f"<tr><td><div>{i + 1}</div></td><td><div>{item[0]}</div></td>"
+        f"<td><div><div>{volume_label(item[6])}</div></div></td><td><div>3 giờ trước</div></td>"
+        f"<td>{related_cell(item[9])}</td></tr>"
+        for i, item in enumerate(items)
+    )
+    divs = ''.join(
+        f"<div class=\"mZ3RIc\">{item[0]}</div><div class=\"lqv0Cb\">{volume_label(item[6])}</div>"
+        for item in items
+    )
+    trending = (
+        "<html><head><script>AF_initDataCallback({key: 'ds:0', hash: '1', data:[1,2], sideChannel: {}});</script>"
+        f"<script>AF_initDataCallback({{key: 'ds:1', hash: '2', data:{json.dumps([None, items])}, sideChannel: {{}}}});</script>"
+        "</head><body><table><tbody><tr><td>header</td></tr></tbody></table>"
+        f"<table><tbody>{table_rows}</tbody></table>{divs}</body></html>"
+    )
+
+    def rss(feed_items: List) -> str:
+        entries = ''.join(
+            f"<item><title>{item[0]}</title><ht:approx_traffic>{item[6]:,}+</ht:approx_traffic></item>"
+            for item in feed_items
+        )
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<rss version="2.0" xmlns:ht="https://trends.google.com/trending/rss">'
+                f"<channel><title>Daily Search Trends</title>{entries}</channel></rss>")
+
+    return {
+        'batchexecute': batchexecute,
+        'trending': trending,
+        'rss_daily': rss(items),
+        'rss_realtime': rss(items[:count // 2])
+    }
+
+def load_fixtures(directory: str) -> Dict[str, str]:
+    fixtures = {}
+    for name, filename in FIXTURE_FILES.items():
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            fixtures[name] = f.read()
+    return fixtures
+
+def save_fixtures(fixtures: Dict[str, str], directory: str):
+    os.makedirs(directory, exist_ok=True)
+    for name, filename in FIXTURE_FILES.items():
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+            f.write(fixtures[name])
+
+# ---------------------------------------------------------------------------
+# Local servers
+# ---------------------------------------------------------------------------
+
+def start_server(handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def trends_handler(fixtures: Dict[str, str]):
+    """Google Trends giả: batchexecute, trang /trending, RSS daily/realtime"""
+    routes = {
+        ('POST', '/_/TrendsUi/data/batchexecute'): ('batchexecute', 'application/json'),
+        ('GET', '/trending'): ('trending', 'text/html; charset=utf-8'),
+        ('GET', '/trends/trendingsearches/daily/rss'): ('rss_daily', 'application/rss+xml'),
+        ('GET', '/trends/trendingsearches/realtime/rss'): ('rss_realtime', 'application/rss+xml')
+    }
+
+    class TrendsHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _serve(self, method: str):
+            length = int(self.headers.get('Content-Length', 0))
+            if length:
+                self.rfile.read(length)
+            route = routes.get((method, urlparse(self.path).path))
+            body = fixtures[route[0]].encode('utf-8') if route else b''
+            self.send_response(200 if route else 404)
+            self.send_header('Content-Type', route[1] if route else 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._serve('GET')
+
+        def do_POST(self):
+            self._serve('POST')
+
+    return TrendsHandler
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """Bot API giả: sendMessage luôn ok, đếm số request"""
+    protocol_version = 'HTTP/1.1'
+    received = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        FakeTelegramHandler.received += 1
+        body = json.dumps({'ok': True, 'result': {
+            'message_id': FakeTelegramHandler.received, 'date': int(time.time()),
+            'chat': {'id': 1, 'type': 'private'}, 'text': 'bench'
+        }}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def measure(fn: Callable, iterations: int, items_per_op: int = 1, warmup: int = 2) -> Dict:
+    """Chạy fn nhiều lần: latency p50/p99, throughput; peak memory đo ở 1 lần chạy riêng (tracemalloc)"""
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        op_started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - op_started)
+    elapsed = time.perf_counter() - started_at
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'ops': iterations,
+        'ops_per_s': round(iterations / elapsed, 2),
+        'items_per_s': round(iterations * items_per_op / elapsed, 1),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'peak_kb': round(peak / 1024, 1)
+    }
+
+def measure_import(runs: int, cwd: str) -> Dict:
+    """Cold import main.py trong process mới (START_MONITOR=0), dùng số giây main tự đo (IMPORT_STARTED_AT)"""
+    script = "import main; print(main.startup_state['import_seconds'])"
+    path = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, 'PYTHONPATH': path, 'START_MONITOR': '0'}
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', script], cwd=cwd, env=env, capture_output=True,
+                                text=True, check=True).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return {
+        'ops': runs,
+        'ops_per_s': round(runs / sum(samples), 2),
+        'items_per_s': round(runs / sum(samples), 1),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'peak_kb': 0
+    }
+
+def chrome_available() -> bool:
+    return any(shutil.which(name) for name in ('chromedriver', 'google-chrome', 'chromium', 'chromium-browser'))
+
+def run_benchmarks(main, iterations: int, corpus_size: int, messages: int, selenium: bool) -> Dict[str, Dict]:
+    monitor = main.monitor
+    results = {}
+
+    def bench(name: str, fn: Callable, runs: int = iterations, items: int = 1):
+        results[name] = measure(fn, runs, items)
+        print(f"  {name:<24} p50 {results[name]['p50_ms']:>9.3f} ms  p99 {results[name]['p99_ms']:>9.3f} ms  "
+              f"{results[name]['items_per_s']:>12,.1f} items/s  peak {results[name]['peak_kb']:>9.1f} KB", file=sys.stderr)
+
+    # Tier scrape end-to-end trên fixture (HTTP local)
+    tiers = [(tier, scrape) for tier, scrape in monitor.source_tiers() if tier != 'selenium' or selenium]
+    tiers.append(('fallback', monitor.scrape_fallback))
+    for tier, scrape in tiers:
+        for timeframe in ('4h', '24h'):
+            rows = scrape(timeframe, None, main.GEO_LOCATION)
+            if not rows:
+                raise RuntimeError(f"tier {tier} {timeframe} returned no rows on fixtures")
+            bench(f"tier.{tier}.{timeframe}", lambda: scrape(timeframe, None, main.GEO_LOCATION),
+                  runs=max(3, iterations // 10) if tier == 'selenium' else iterations, items=len(rows))
+
+    # Parser thuần (không I/O)
+    fixtures = main_fixtures
+    bench('parse.batchexecute', lambda: monitor.trend_items_to_rows(
+        main.find_trend_items(main.parse_batchexecute_response(fixtures['batchexecute']))))
+    bench('parse.af_init_data', lambda: [main.find_trend_items(payload)
+                                         for payload in main.parse_af_init_data(fixtures['trending'])])
+
+    # Volume / keyword: scalar vs batch (NumPy)
+    rng = random.Random(7)
+    volumes = [rng.choice(VOLUME_SAMPLES) for _ in range(corpus_size)]
+    keywords = [rng.choice(KEYWORD_SAMPLES) for _ in range(corpus_size)]
+    corpus_runs = max(3, iterations // 10)
+    bench('volume.scalar', lambda: [monitor.parse_volume_string(v) for v in volumes], corpus_runs, corpus_size)
+    bench('volume.batch', lambda: monitor.parse_volumes(volumes), corpus_runs, corpus_size)
+    bench('keyword.scalar', lambda: [monitor.is_valid_trending_keyword(k) for k in keywords], corpus_runs, corpus_size)
+    bench('keyword.batch', lambda: monitor.validate_keywords(keywords), corpus_runs, corpus_size)
+
+    # Archive: replay (AlertRules + tracker, như CLI replay) trên 1 ngày synthetic (np.memmap)
+    import numpy as np
+    archive = main.SnapshotArchive(os.path.join(os.getcwd(), 'archive'))
+    archive_rows = corpus_size // 25 * 25
+    np_rng = np.random.default_rng(7)
+    archive.write_day(main.ArchiveDay(
+        '2000-01-01',
+        ts=np.repeat(np.arange(archive_rows // 25, dtype='<i8') * 60000, 25),
+        target=np.zeros(archive_rows, dtype='<i4'),
+        rank=np.tile(np.arange(1, 26, dtype='<i4'), archive_rows // 25),
+        keyword=np_rng.integers(0, len(KEYWORD_SAMPLES), archive_rows, dtype='<i4'),
+        volume=np_rng.integers(0, 3000000, archive_rows, dtype='<i8'),
+        keywords=list(KEYWORD_SAMPLES),
+        targets=[f'{main.GEO_LOCATION}:4h']
+    ))
+    bench('archive.replay', lambda: main.run_replay(archive, start='2000-01-01', end='2000-01-01'),
+          corpus_runs, archive_rows)
+
+    # Telegram webhook: update giả (fake update source) -> Flask test client, trả lời từ snapshot
+    for target in monitor.targets:
+        monitor.snapshots.put(target, monitor.scrape_fallback(target.timeframe, None, target.geo), 'bench')
+    webhook = main.app.test_client()
+    chat_id = int(main.TELEGRAM_COMMAND_CHATS[0])
+    updates = [{'update_id': index, 'message': {'message_id': index, 'chat': {'id': chat_id}, 'text': text}}
+               for index, text in enumerate(['/top n=10', '/threshold', '/history bench keyword', '/help'])]
+
+    def handle_updates():
+        for update in updates:
+            response = webhook.post('/telegram/webhook', json=update,
+                                    headers={'X-Telegram-Bot-Api-Secret-Token': main.TELEGRAM_WEBHOOK_SECRET})
+            if response.status_code != 200 or response.get_json()['method'] != 'sendMessage':
+                raise RuntimeError(f"webhook {update['message']['text']} -> {response.status_code}")
+
+    bench('telegram.webhook', handle_updates, iterations, len(updates))
+
+    # Telegram: submit N notification, chờ fake Bot API nhận hết
+    notification = {'keyword': 'bench keyword', 'volume': 1000000, 'timeframe': '4h', 'geo': main.GEO_LOCATION,
+                    'rank': 1, 'timestamp': main.get_vietnam_time()}
+
+    def dispatch():
+        for _ in range(messages):
+            main.send_notification(notification)
+        if not main.dispatcher.join(timeout=60):
+            raise RuntimeError('telegram dispatcher did not drain')
+
+    bench('telegram.dispatch', dispatch, max(3, iterations // 10), messages * len(main.dispatcher.chat_ids))
+    if main.dispatcher.stats['failed']:
+        raise RuntimeError(f"telegram dispatcher failed {main.dispatcher.stats['failed']} messages")
+    return results
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Regression = p50 hoặc peak memory vượt baseline quá tolerance"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'peak_kb'):
+            if previous[metric] > 0 and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {current[metric]} > {previous[metric]} (+{tolerance:.0%})")
+    return regressions
+
+main_fixtures: Dict[str, str] = {}
+
+def main_cli(argv: List[str] = None) -> int:
+    global main_fixtures
+    parser = argparse.ArgumentParser(description='Offline benchmark cho scrape tiers, parser và Telegram dispatcher')
+    parser.add_argument('--fixtures', help='thư mục fixture đã ghi (mặc định: sinh deterministic)')
+    parser.add_argument('--record', help='lưu fixture ra thư mục rồi thoát')
+    parser.add_argument('--rows', type=int, default=25, help='số trend trong fixture sinh ra')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--corpus', type=int, default=100000, help='số volume/keyword cho benchmark parse')
+    parser.add_argument('--messages', type=int, default=50, help='số notification mỗi lần đo dispatcher')
+    parser.add_argument('--import-runs', type=int, default=5, help='số lần đo cold import main.py (0 = bỏ qua)')
+    parser.add_argument('--selenium', action='store_true', help='đo cả tier Selenium (cần Chrome)')
+    parser.add_argument('--output', help='ghi kết quả JSON ra file (mặc định stdout)')
+    parser.add_argument('--baseline', help='file baseline JSON để so sánh')
+    parser.add_argument('--save-baseline', help='ghi kết quả làm baseline mới')
+    parser.add_argument('--verbose', action='store_true', help='giữ log INFO của bot')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='ngưỡng regression (0.25 = chậm hơn 25%%)')
+    args = parser.parse_args(argv)
+
+    main_fixtures = load_fixtures(args.fixtures) if args.fixtures else build_fixtures(args.rows)
+    if args.record:
+        save_fixtures(main_fixtures, args.record)
+        print(f"📁 Fixtures saved to {args.record}", file=sys.stderr)
+        return 0
+
+    selenium = args.selenium and chrome_available()
+    if args.selenium and not selenium:
+        print('⚠️ Chrome not found, skipping Selenium tier', file=sys.stderr)
+
+    trends_server = start_server(trends_handler(main_fixtures))
+    telegram_server = start_server(FakeTelegramHandler)
+    workdir = tempfile.mkdtemp(prefix='trends-bench-')
+
+    # Cấu hình trước khi import main: không start monitor, mọi endpoint trỏ về server local
+    os.environ.update({
+        'START_MONITOR': '0',
+        'TRENDS_BASE_URL': f"http://127.0.0.1:{trends_server.server_port}",
+        'TELEGRAM_API_BASE': f"http://127.0.0.1:{telegram_server.server_port}/bot",
+        'BOT_TOKEN': '123456:bench',
+        'TELEGRAM_WEBHOOK_SECRET': 'bench-secret',
+        'CHAT_IDS': '1001,1002',
+        'TELEGRAM_GLOBAL_RATE': '100000',
+        'TELEGRAM_CHAT_RATE': '100000',
+        'HISTORY_DB_FILE': os.path.join(workdir, 'trends_history.db'),
+        'BROWSER_STANDBY': '0'
+    })
+    cwd = os.getcwd()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+    try:
+        import main
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.ERROR)
+        if not selenium:
+            main.monitor.driver_pool.factory = lambda: None
+        print(f"⏱️ Benchmarking ({args.iterations} iterations, corpus {args.corpus:,})", file=sys.stderr)
+        results = run_benchmarks(main, args.iterations, args.corpus, args.messages, selenium)
+        if args.import_runs > 0:
+            results['startup.import'] = measure_import(args.import_runs, workdir)
+            print(f"  {'startup.import':<24} p50 {results['startup.import']['p50_ms']:>9.3f} ms  "
+                  f"(budget {main.IMPORT_BUDGET_SECONDS * 1000:.0f} ms)", file=sys.stderr)
+        import_budget_ms = main.IMPORT_BUDGET_SECONDS * 1000
+    finally:
+        os.chdir(cwd)
+        trends_server.shutdown()
+        telegram_server.shutdown()
+
+    report = {'python': sys.version.split()[0], 'rows': args.rows, 'results': results}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(output)
+
+    regressions = []
+    if 'startup.import' in results and results['startup.import']['p50_ms'] > import_budget_ms:
+        regressions.append(f"startup.import.p50_ms: {results['startup.import']['p50_ms']} > budget {import_budget_ms:.0f}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions += compare(results, json.load(f)['results'], args.tolerance)
+    for regression in regressions:
+        print(f"❌ REGRESSION {regression}", file=sys.stderr)
+    if regressions:
+        return 1
+    if args.baseline:
+        print('✅ No regression vs baseline', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -1,30 +1,57 @@
+from __future__ import annotations
+
+import time
+IMPORT_STARTED_AT = time.perf_counter()
+
 import os
+import sys
 import asyncio
 import logging
 import json
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Tuple
-from threading import Thread
-import time
-import requests
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from threading import Thread, BoundedSemaphore, Condition, Event, Lock, Timer, local
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from collections import OrderedDict, deque
+import signal
+import queue
+import argparse
+import itertools
+import subprocess
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+import sqlite3
+import atexit
+import fcntl
+import socket
+import importlib.util
 import re
-from bs4 import BeautifulSoup
 import random
+import bisect
+import hashlib
+import hmac
+import struct
+import zlib
+import unicodedata
+from xml.etree import ElementTree
 
-# Selenium imports
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
+# Chỉ Flask được import ngay. requests / numpy / BeautifulSoup / Selenium / python-telegram-bot
+# import lazy trong hàm dùng chúng -> process bind PORT nhanh, scrape subsystem load ở background
+from flask import Blueprint, Flask, request, jsonify
 
-# Import libraries
-from flask import Flask, request, jsonify
-from telegram import Bot
+if TYPE_CHECKING:
+    import numpy as np
+    import requests
 
-# Setup Flask app
-app = Flask(__name__)
+# Brotli là optional: urllib3 chỉ giải nén 'br' khi có brotli/brotlicffi
+ACCEPT_ENCODING = 'gzip, deflate, br' if any(
+    importlib.util.find_spec(name) for name in ('brotli', 'brotlicffi')
+) else 'gzip, deflate'
+
+# Flask routes (đăng ký vào app trong create_app)
+routes = Blueprint('trends', __name__)
 
 # Logging
 logging.basicConfig(level=logging.INFO)
@@ -33,13 +60,151 @@ logger = logging.getLogger(__name__)
 # Config từ environment variables
 BOT_TOKEN = os.getenv('BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
 CHAT_ID = os.getenv('CHAT_ID', 'YOUR_CHAT_ID_HERE')
+# Fan-out tới nhiều chat: CHAT_IDS="id1,id2" (mặc định = CHAT_ID)
+CHAT_IDS = [chat_id.strip() for chat_id in os.getenv('CHAT_IDS', CHAT_ID).split(',') if chat_id.strip()]
+TELEGRAM_API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org/bot')
+# Webhook command (/top, /history, /threshold, /check): Telegram gửi header X-Telegram-Bot-Api-Secret-Token
+# = secret_token lúc setWebhook; chưa cấu hình secret thì webhook tắt
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+# Chat được phép gửi command (mặc định = CHAT_IDS)
+TELEGRAM_COMMAND_CHATS = [chat_id.strip() for chat_id in os.getenv('TELEGRAM_COMMAND_CHATS', ','.join(CHAT_IDS)).split(',') if chat_id.strip()]
 PORT = int(os.getenv('PORT', 8080))
+START_MONITOR = os.getenv('START_MONITOR', '1') == '1'
+# Cold start: import module phải xong trong budget; monitor chỉ start sau khi PORT đã nhận kết nối
+IMPORT_BUDGET_SECONDS = float(os.getenv('IMPORT_BUDGET_SECONDS', 1.0))
+STARTUP_BIND_TIMEOUT_SECONDS = float(os.getenv('STARTUP_BIND_TIMEOUT_SECONDS', 30))
 
 # Bot settings - TEST MODE
 CHECK_INTERVAL_MINUTES = 30   # Test với 1 phút
-SEARCH_THRESHOLD = 500000    # Test với 100K
-GEO_LOCATION = 'US'
+SEARCH_THRESHOLD = int(os.getenv('SEARCH_THRESHOLD', 500000))    # Test với 100K
+# Keyword đã thông báo chỉ được báo lại khi volume > NOTIFY_GROWTH x volume lần trước
+NOTIFY_GROWTH = float(os.getenv('NOTIFY_GROWTH', 1.1))
+GEO_LOCATION = os.getenv('GEO_LOCATION', 'US')
 KEYWORDS_DB_FILE = 'notified_keywords.json'
+KEYWORDS_FLUSH_SECONDS = float(os.getenv('KEYWORDS_FLUSH_SECONDS', 5))
+KEYWORDS_COMPACT_ENTRIES = int(os.getenv('KEYWORDS_COMPACT_ENTRIES', 500))
+KEYWORD_TTL_HOURS = float(os.getenv('KEYWORD_TTL_HOURS', 24 * 7))
+
+# Lịch sử trend (SQLite) - cũng là nơi lưu keyword đã thông báo khi KEYWORDS_BACKEND=sqlite
+HISTORY_DB_FILE = os.getenv('HISTORY_DB_FILE', 'trends_history.db')
+KEYWORDS_BACKEND = os.getenv('KEYWORDS_BACKEND', 'sqlite')  # sqlite | json
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', 180))
+# Archive mọi snapshot thô (columnar, nén, append-only, xoay vòng theo ngày) cho backtest; '' để tắt
+SNAPSHOT_ARCHIVE_DIR = os.getenv('SNAPSHOT_ARCHIVE_DIR', 'snapshot_archive')
+
+def env_rate(name: str, default: float) -> float:
+    """Rate (msg/s) từ env; TokenBucket chia cho rate nên phải > 0"""
+    rate = float(os.getenv(name, default))
+    if rate <= 0:
+        raise ValueError(f'{name} must be > 0, got {rate:g}')
+    return rate
+
+# Telegram rate limits: ~30 msg/s toàn bot, 1 msg/s mỗi chat, 20 msg/phút mỗi group
+TELEGRAM_GLOBAL_RATE = env_rate('TELEGRAM_GLOBAL_RATE', 30)
+TELEGRAM_CHAT_RATE = env_rate('TELEGRAM_CHAT_RATE', 1)
+TELEGRAM_GROUP_RATE = env_rate('TELEGRAM_GROUP_RATE', 20 / 60)
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', 5))
+TELEGRAM_BACKOFF_BASE_SECONDS = float(os.getenv('TELEGRAM_BACKOFF_BASE_SECONDS', 1))
+TELEGRAM_BACKOFF_MAX_SECONDS = float(os.getenv('TELEGRAM_BACKOFF_MAX_SECONDS', 60))
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', 8))
+TELEGRAM_QUEUE_SIZE = int(os.getenv('TELEGRAM_QUEUE_SIZE', 1000))
+# Chờ event loop của dispatcher sẵn sàng (tạo Bot / HTTPXRequest) tối đa bao lâu
+TELEGRAM_START_TIMEOUT_SECONDS = float(os.getenv('TELEGRAM_START_TIMEOUT_SECONDS', 10))
+TELEGRAM_MAX_MESSAGE_CHARS = 4096
+
+# Notification: 'digest' = gom alert của 1 chu kỳ (hoặc cửa sổ DIGEST_WINDOW_SECONDS) thành ít tin nhắn nhất,
+# 'single' = mỗi alert 1 tin. Alert có volume >= DIGEST_IMMEDIATE_VOLUME gửi ngay, không chờ digest (0 = tắt)
+NOTIFY_MODE = os.getenv('NOTIFY_MODE', 'digest')
+DIGEST_WINDOW_SECONDS = float(os.getenv('DIGEST_WINDOW_SECONDS', 0))
+DIGEST_IMMEDIATE_VOLUME = int(os.getenv('DIGEST_IMMEDIATE_VOLUME', 2000000))
+
+# Velocity detector: cảnh báo khi tốc độ tăng volume bất thường (z-score của growth rate)
+DETECTOR_WINDOW = int(os.getenv('DETECTOR_WINDOW', 16))
+DETECTOR_ALPHA = float(os.getenv('DETECTOR_ALPHA', 0.3))
+DETECTOR_Z_THRESHOLD = float(os.getenv('DETECTOR_Z_THRESHOLD', 3.0))
+DETECTOR_MIN_VOLUME = int(os.getenv('DETECTOR_MIN_VOLUME', 50000))
+DETECTOR_MIN_SAMPLES = int(os.getenv('DETECTOR_MIN_SAMPLES', 4))
+DETECTOR_COOLDOWN_MINUTES = float(os.getenv('DETECTOR_COOLDOWN_MINUTES', 120))
+DETECTOR_MAX_KEYS = int(os.getenv('DETECTOR_MAX_KEYS', 10000))
+# Tier có volume giả -> không đưa vào detector (RSS dùng ht:approx_traffic thật)
+ESTIMATED_TIERS = {'fallback'}
+# Tier volume xấp xỉ: chỉ thử sau các tier chính xác, dù nhanh hơn
+APPROXIMATE_TIERS = {'rss'}
+
+# Circuit breaker theo source tier: mở sau TIER_FAILURE_THRESHOLD lần lỗi liên tiếp, probe half-open
+# ở background sau cooldown (probe lỗi -> cooldown x2, tối đa TIER_COOLDOWN_MAX_SECONDS)
+TIER_FAILURE_THRESHOLD = int(os.getenv('TIER_FAILURE_THRESHOLD', 3))
+TIER_COOLDOWN_SECONDS = float(os.getenv('TIER_COOLDOWN_SECONDS', 300))
+TIER_COOLDOWN_MAX_SECONDS = float(os.getenv('TIER_COOLDOWN_MAX_SECONDS', 3600))
+TIER_LATENCY_ALPHA = float(os.getenv('TIER_LATENCY_ALPHA', 0.3))
+TIER_ORDER = os.getenv('TIER_ORDER', 'adaptive')  # adaptive = tier healthy nhanh nhất trước | static
+
+# Google Trends base URL (đổi sang server local khi test/replay)
+TRENDS_BASE_URL = os.getenv('TRENDS_BASE_URL', 'https://trends.google.com').rstrip('/')
+TRENDS_RPC_ID = 'i0OFE'
+FAST_PATH_TIMEOUT_SECONDS = int(os.getenv('FAST_PATH_TIMEOUT_SECONDS', 10))
+
+# HTTP cache trên đĩa cho session (ETag/Last-Modified, LRU theo dung lượng); HTTP_CACHE_MAX_MB=0 để tắt
+HTTP_CACHE_DIR = os.getenv('HTTP_CACHE_DIR', '.http_cache')
+HTTP_CACHE_MAX_MB = float(os.getenv('HTTP_CACHE_MAX_MB', 64))
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv('HTTP_CACHE_MAX_ENTRIES', 512))
+PARSE_MEMO_SIZE = int(os.getenv('PARSE_MEMO_SIZE', 256))
+
+# Scrape targets: "GEO:HOURS" ngăn cách bởi dấu phẩy, ví dụ "US:4,US:24,DE:4"
+SCRAPE_TARGETS = os.getenv('SCRAPE_TARGETS', f'{GEO_LOCATION}:4,{GEO_LOCATION}:24')
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', 2))
+TARGET_TIMEOUT_SECONDS = int(os.getenv('TARGET_TIMEOUT_SECONDS', 120))
+MAX_PENDING_TARGETS = int(os.getenv('MAX_PENDING_TARGETS', BROWSER_POOL_SIZE * 2))
+
+# Scrape mode: 'thread' = scrape trong process Flask, 'process' = các worker process riêng
+# (mỗi worker có browser riêng) gửi kết quả về coordinator qua result bus
+SCRAPE_MODE = os.getenv('SCRAPE_MODE', 'thread')
+SCRAPE_WORKERS = int(os.getenv('SCRAPE_WORKERS', BROWSER_POOL_SIZE))
+RESULT_BUS_ADDRESS = os.getenv('RESULT_BUS_ADDRESS', '127.0.0.1:6070')
+RESULT_BUS_AUTHKEY = os.getenv('RESULT_BUS_AUTHKEY', '')
+WORKER_RESTART_MAX_SECONDS = int(os.getenv('WORKER_RESTART_MAX_SECONDS', 60))
+# Worker không trả kết quả trong thời gian này bị kill (supervisor spawn lại), job được requeue 1 lần
+WORKER_JOB_TIMEOUT_SECONDS = int(os.getenv('WORKER_JOB_TIMEOUT_SECONDS', TARGET_TIMEOUT_SECONDS))
+# Process này là worker (python main.py worker): chỉ scrape, không chạy Flask / monitor / notification
+WORKER_PROCESS = os.getenv('WORKER_PROCESS', '1' if sys.argv[1:2] == ['worker'] else '0') == '1'
+# python main.py replay: backtest offline, không start monitor
+REPLAY_PROCESS = sys.argv[1:2] == ['replay']
+
+# Scheduler: interval riêng theo target, ví dụ "4h=5,24h=30" (phút; key là timeframe hoặc GEO:timeframe)
+TARGET_INTERVALS = os.getenv('TARGET_INTERVALS', '')
+SCHEDULE_JITTER_SECONDS = float(os.getenv('SCHEDULE_JITTER_SECONDS', 0))
+# Tick bị lỡ (chu kỳ chạy quá lâu / process bị treo):
+# coalesce = chạy bù 1 lần rồi về lịch, skip = bỏ qua tới tick kế tiếp, catchup = chạy bù từng tick
+MISSED_TICK_POLICY = os.getenv('MISSED_TICK_POLICY', 'coalesce')
+
+# Browser lifecycle: recycle driver khi quá RSS / số lần dùng / tuổi; giữ sẵn standby driver
+BROWSER_MAX_RSS_MB = int(os.getenv('BROWSER_MAX_RSS_MB', 700))
+BROWSER_MAX_USES = int(os.getenv('BROWSER_MAX_USES', 50))
+BROWSER_MAX_AGE_MINUTES = int(os.getenv('BROWSER_MAX_AGE_MINUTES', 120))
+BROWSER_STANDBY = int(os.getenv('BROWSER_STANDBY', 1))
+BROWSER_PROBE_TIMEOUT_SECONDS = int(os.getenv('BROWSER_PROBE_TIMEOUT_SECONDS', 10))
+BROWSER_PROBE_IDLE_SECONDS = int(os.getenv('BROWSER_PROBE_IDLE_SECONDS', 60))
+
+# Scrape profile Chrome: chặn resource không cần cho bảng trending (ảnh, font, media, analytics, ads)
+# qua CDP Network.setBlockedURLs, page load 'eager', profile + disk cache dùng lại giữa các session
+BLOCK_RESOURCES = os.getenv('BLOCK_RESOURCES', '1') == '1'
+BLOCKED_URL_PATTERNS = [pattern.strip() for pattern in os.getenv('BLOCKED_URL_PATTERNS', ','.join([
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.mp4', '*.webm', '*.mp3',
+    '*fonts.googleapis.com*', '*fonts.gstatic.com*', '*googletagmanager.com*', '*google-analytics.com*',
+    '*doubleclick.net*', '*googlesyndication.com*', '*googleadservices.com*', '*/gen_204*', '*/log?*'
+])).split(',') if pattern.strip()]
+PAGE_LOAD_STRATEGY = os.getenv('PAGE_LOAD_STRATEGY', 'eager')  # normal | eager | none
+CHROME_PROFILE_DIR = os.getenv('CHROME_PROFILE_DIR', '.chrome_profiles')  # '' = profile tạm cho mỗi driver
+CHROME_DISK_CACHE_MB = int(os.getenv('CHROME_DISK_CACHE_MB', 64))
+
+# Readiness: trả về ngay khi bảng có dữ liệu và DOM đứng yên READY_QUIET_MS
+READY_TIMEOUT_SECONDS = int(os.getenv('READY_TIMEOUT_SECONDS', 30))
+READY_QUIET_MS = int(os.getenv('READY_QUIET_MS', 500))
+READY_POLL_SECONDS = 0.2
+
+# Snapshot cho /status: quá TTL thì đánh dấu stale
+SNAPSHOT_TTL_SECONDS = int(os.getenv('SNAPSHOT_TTL_SECONDS', CHECK_INTERVAL_MINUTES * 60 * 2))
 
 # Vietnam timezone
 VIETNAM_TZ = timezone(timedelta(hours=7))
@@ -48,74 +213,2480 @@ def get_vietnam_time() -> datetime:
     """Lấy thời gian Vietnam chính xác (UTC+7)"""
     return datetime.now(VIETNAM_TZ)
 
+class Counter:
+    """Counter theo label (Prometheus-style)"""
+    kind = 'counter'
+    
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._lock = Lock()
+    
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    
+    def get(self, **labels) -> float:
+        key = self._key(labels)
+        with self._lock:
+            return self.values.get(key, 0)
+    
+    @staticmethod
+    def _escape(value: str) -> str:
+        """Escape label value theo text format: \\, \" và xuống dòng"""
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    
+    def _label_text(self, key: Tuple[str, ...], extra: str = '') -> str:
+        parts = [f'{name}="{self._escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return '{' + ','.join(parts) + '}' if parts else ''
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.values.items())
+        return [f'{self.name}{self._label_text(key)} {value}' for key, value in items]
+
+class Gauge(Counter):
+    """Gauge theo label"""
+    kind = 'gauge'
+    
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[self._key(labels)] = value
+
+class Histogram(Counter):
+    """Histogram với bucket cố định - memory chỉ phụ thuộc số bucket x số label"""
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+    
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self.values.get(key)
+            if state is None:
+                # [count theo bucket..., +Inf], sum
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+    
+    @contextmanager
+    def time(self, **labels):
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started_at, **labels)
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self.values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{self._label_text(key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{self._label_text(key)} {total}')
+            lines.append(f'{self.name}_count{self._label_text(key)} {cumulative}')
+        return lines
+
+class MetricsRegistry:
+    """Registry metrics nội bộ, render text format cho /metrics"""
+    def __init__(self):
+        self.metrics: List[Counter] = []
+    
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+    
+    def gauge(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+    
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), **kwargs) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, **kwargs))
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+METRICS = MetricsRegistry()
+PAGE_LOAD_SECONDS = METRICS.histogram('trends_page_load_seconds', 'Selenium driver.get() duration', ('target',))
+TIME_TO_DATA_SECONDS = METRICS.histogram('trends_time_to_data_seconds', 'Time until table data is available', ('target', 'tier'))
+SCRAPE_SECONDS = METRICS.histogram('trends_scrape_seconds', 'Total scrape duration per target incl. fallbacks', ('target',))
+TIER_SERVED = METRICS.counter('trends_tier_served_total', 'Which source tier served each result', ('target', 'tier'))
+TIER_FAILURES = METRICS.counter('trends_tier_failures_total', 'Source tier failures', ('target', 'tier'))
+PARSE_FAILURES = METRICS.counter('trends_parse_failures_total', 'Values that could not be parsed', ('kind',))
+TELEGRAM_SEND_SECONDS = METRICS.histogram('telegram_send_seconds', 'Telegram sendMessage latency', ())
+TELEGRAM_MESSAGES = METRICS.counter('telegram_messages_total', 'Telegram messages by result', ('result',))
+NOTIFICATION_ALERTS = METRICS.counter('notification_alerts_total', 'Alerts by delivery path (digest, immediate, single)', ('path',))
+CYCLE_SECONDS = METRICS.histogram('monitor_cycle_seconds', 'Monitoring cycle duration', (), buckets=(1, 5, 10, 20, 30, 60, 90, 120, 180, 300, 600))
+CYCLES = METRICS.counter('monitor_cycles_total', 'Monitoring cycles by result', ('result',))
+ALERTS = METRICS.counter('trends_alerts_total', 'Alerts raised', ('reason',))
+BROWSER_POOL = METRICS.gauge('browser_pool', 'Browser pool state', ('field',))
+HTTP_CACHE = METRICS.counter('http_cache_total', 'HTTP cache lookups (not_modified, unchanged, changed, miss, evicted)', ('result',))
+HTTP_CACHE_BYTES_SAVED = METRICS.counter('http_cache_bytes_saved_total', 'Body bytes not re-downloaded thanks to 304 responses', ())
+PARSE_SKIPPED = METRICS.counter('trends_parse_skipped_total', 'Parses skipped because the document content hash was unchanged', ('tier',))
+SCHEDULER_LAG_SECONDS = METRICS.histogram('scheduler_lag_seconds', 'Delay between scheduled tick and job start', ('job',), buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300))
+BROWSER_REQUESTS = METRICS.counter('browser_requests_total', 'Selenium page sub-requests by outcome (network, blocked, cached)', ('outcome',))
+BROWSER_BYTES = METRICS.counter('browser_bytes_total', 'Selenium page bytes by source (network, cached)', ('source',))
+TIER_LATENCY = METRICS.gauge('trends_tier_latency_ewma_seconds', 'EWMA latency of successful scrapes per source tier', ('tier',))
+TIER_STATE = METRICS.gauge('trends_tier_circuit_state', 'Source tier circuit breaker (0 closed, 1 half-open, 2 open)', ('tier',))
+TIER_TRANSITIONS = METRICS.counter('trends_tier_circuit_transitions_total', 'Circuit breaker state changes', ('tier', 'state'))
+TELEGRAM_COMMANDS = METRICS.counter('telegram_commands_total', 'Telegram webhook commands by result (ok, unknown, rejected)', ('command', 'result'))
+STARTUP_SECONDS = METRICS.gauge('startup_seconds', 'Cold start duration by phase (import, services)', ('phase',))
+SCHEDULER_TICKS = METRICS.counter('scheduler_ticks_total', 'Scheduler ticks by outcome (run, triggered, missed, error)', ('job', 'outcome'))
+
+# UI terms bị loại khỏi keyword - gộp thành 1 regex compile sẵn
+UI_TERMS = [
+    'trending', 'search', 'explore', 'more', 'view', 'show', 'load',
+    'see', 'all', 'categories', 'filters', 'menu', 'home', 'back',
+    'next', 'previous', 'settings', 'privacy', 'terms'
+]
+UI_TERMS_RE = re.compile('|'.join(re.escape(term) for term in UI_TERMS))
+
+# Volume dạng chuẩn sau khi clean: "200K", "1.5M", "5000"; dạng khác đi đường scalar
+VOLUME_CLEAN_TABLE = str.maketrans('', '', '+, ')
+VOLUME_FAST_RE = re.compile(r'([0-9]+(?:\.[0-9]+)?)([KM]?)')
+VOLUME_MULTIPLIERS = {'K': 1000, 'M': 1000000}
+
+class TrendRow(NamedTuple):
+    """Một dòng trong bảng trending"""
+    rank: int
+    keyword: str
+    volume_str: str
+    volume: int
+    started: str
+    related: List[str]
+
+class TrendTarget(NamedTuple):
+    """Một cặp (geo, hours) cần scrape"""
+    geo: str
+    hours: int
+    
+    @property
+    def timeframe(self) -> str:
+        return f'{self.hours}h'
+    
+    @property
+    def key(self) -> str:
+        return f'{self.geo}:{self.timeframe}'
+    
+    @property
+    def scope(self) -> str:
+        """Scope trong NotificationTracker - giữ '4h'/'24h' cho geo mặc định"""
+        return self.timeframe if self.geo == GEO_LOCATION else self.key
+
+def parse_targets(spec: str) -> List[TrendTarget]:
+    """Parse "US:4,DE:24h" thành danh sách TrendTarget"""
+    targets = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        geo, _, hours = item.partition(':')
+        try:
+            target = TrendTarget(geo.strip().upper(), int(hours.strip().lower().rstrip('h') or 24))
+        except ValueError:
+            logger.error(f"Invalid scrape target: {item}")
+            continue
+        if target not in targets:
+            targets.append(target)
+    return targets
+
+def parse_intervals(spec: str) -> Dict[str, float]:
+    """Parse "4h=5,US:24h=30" thành {key: phút}"""
+    intervals = {}
+    for item in spec.split(','):
+        key, _, minutes = item.partition('=')
+        geo, _, timeframe = key.strip().rpartition(':')
+        timeframe = timeframe.strip().lower()
+        if not timeframe:
+            continue
+        timeframe = timeframe if timeframe.endswith('h') else f'{timeframe}h'
+        try:
+            intervals[f'{geo.strip().upper()}:{timeframe}' if geo else timeframe] = float(minutes)
+        except ValueError:
+            logger.error(f"Invalid target interval: {item}")
+    return intervals
+
+def target_interval_minutes(target: TrendTarget, intervals: Dict[str, float]) -> float:
+    """Interval của target: GEO:timeframe > timeframe > CHECK_INTERVAL_MINUTES"""
+    return intervals.get(target.key, intervals.get(target.timeframe, CHECK_INTERVAL_MINUTES))
+
+# JS đọc toàn bộ bảng trending (tbody[2]) trong 1 round-trip
+TRENDS_TABLE_JS = """
+const bodies = document.querySelectorAll('table > tbody');
+const body = bodies.length > 1 ? bodies[1] : bodies[0];
+if (!body) { return []; }
+const firstLine = el => el ? (el.innerText || el.textContent || '').trim().split('\\n')[0].trim() : '';
+const rows = [];
+for (const tr of body.querySelectorAll(':scope > tr')) {
+    const cells = tr.querySelectorAll(':scope > td');
+    if (cells.length < 3) { continue; }
+    let related = [];
+    if (cells.length > 4) {
+        related = Array.from(cells[4].querySelectorAll('[data-term]')).map(el => el.getAttribute('data-term'));
+    }
+    rows.push({
+        keyword: firstLine(cells[1].querySelector(':scope > div')),
+        volume: firstLine(cells[2].querySelector(':scope > div > div')),
+        started: cells.length > 3 ? firstLine(cells[3].querySelector(':scope > div')) : '',
+        related: related
+    });
+}
+return rows;
+"""
+
+def parse_batchexecute_response(text: str, rpc_id: str = TRENDS_RPC_ID):
+    """Lấy payload JSON của rpc_id từ response batchexecute (")]}'" + các chunk)"""
+    if text.startswith(")]}'"):
+        text = text[4:]
+    
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith('['):
+            continue
+        try:
+            chunk = json.loads(line)
+        except ValueError:
+            PARSE_FAILURES.inc(kind='batchexecute')
+            continue
+        for entry in chunk:
+            if isinstance(entry, list) and len(entry) > 2 and entry[0] == 'wrb.fr' and entry[1] == rpc_id:
+                if isinstance(entry[2], str):
+                    return json.loads(entry[2])
+    return None
+
+AF_INIT_DATA_RE = re.compile(r"AF_initDataCallback\(\{.*?data:(\[.*?\]), sideChannel:", re.DOTALL)
+
+def parse_af_init_data(html: str) -> List:
+    """Lấy các payload data:[...] nhúng trong AF_initDataCallback của trang"""
+    payloads = []
+    for match in AF_INIT_DATA_RE.finditer(html):
+        try:
+            payloads.append(json.loads(match.group(1)))
+        except ValueError:
+            PARSE_FAILURES.inc(kind='af_init_data')
+            continue
+    return payloads
+
+def xml_local_name(tag: str) -> str:
+    """'{https://trends.google.com/trending/rss}approx_traffic' -> 'approx_traffic'"""
+    return tag.rsplit('}', 1)[-1]
+
+def iter_feed_items(chunks: Iterable[bytes]) -> Iterator[Dict[str, str]]:
+    """Đọc RSS/Atom tăng dần (pull parser): yield {tên tag con: text} cho từng <item>/<entry>.
+    
+    Item đã yield được gỡ khỏi cây ngay, nên bộ nhớ không phụ thuộc độ dài feed;
+    caller dừng vòng lặp là dừng parse.
+    """
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    parents = []
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == 'start':
+                parents.append(elem)
+                continue
+            parents.pop()
+            if xml_local_name(elem.tag) not in ('item', 'entry'):
+                continue
+            yield {xml_local_name(child.tag): (child.text or '').strip() for child in elem if len(child) == 0}
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+    parser.close()
+
+def is_trend_item(item) -> bool:
+    """Item trend: [keyword, _, geo, [start_ts], ..., volume (index 6), ...]"""
+    return (
+        isinstance(item, list) and len(item) > 6
+        and isinstance(item[0], str) and item[0]
+        and isinstance(item[6], int) and not isinstance(item[6], bool)
+    )
+
+def find_trend_items(data, depth: int = 0) -> List:
+    """Tìm (đệ quy) list đầu tiên chứa các trend item trong payload"""
+    if not isinstance(data, list) or depth > 6:
+        return []
+    if data and all(is_trend_item(item) for item in data):
+        return data
+    for child in data:
+        items = find_trend_items(child, depth + 1)
+        if items:
+            return items
+    return []
+
+# JS kiểm tra bảng đã render xong: đếm dòng có dữ liệu + thời gian từ lần mutation cuối
+TABLE_READY_JS = """
+if (!window.__trendsObserver) {
+    window.__trendsLastMutation = performance.now();
+    window.__trendsObserver = new MutationObserver(() => { window.__trendsLastMutation = performance.now(); });
+    window.__trendsObserver.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+}
+const bodies = document.querySelectorAll('table > tbody');
+const body = bodies.length > 1 ? bodies[1] : bodies[0];
+let populated = 0;
+if (body) {
+    for (const tr of body.querySelectorAll(':scope > tr')) {
+        const cells = tr.querySelectorAll(':scope > td');
+        if (cells.length >= 3 && cells[1].innerText.trim() && cells[2].innerText.trim()) { populated++; }
+    }
+}
+return {rows: populated, quiet_ms: performance.now() - window.__trendsLastMutation};
+"""
+
+class TableRowsStable:
+    """Expected condition: bảng trending đã có dòng dữ liệu và DOM không còn thay đổi"""
+    def __init__(self, min_rows: int = 1, quiet_ms: int = READY_QUIET_MS):
+        self.min_rows = min_rows
+        self.quiet_ms = quiet_ms
+        self._last_rows = -1
+    
+    def __call__(self, driver):
+        state = driver.execute_script(TABLE_READY_JS) or {}
+        rows = int(state.get('rows') or 0)
+        stable = (
+            rows >= self.min_rows
+            and rows == self._last_rows
+            and (state.get('quiet_ms') or 0) >= self.quiet_ms
+        )
+        self._last_rows = rows
+        return rows if stable else False
+
+def process_tree_rss(pid: int) -> int:
+    """Tổng RSS (bytes) của process và toàn bộ process con - đọc từ /proc, trả về 0 nếu không đọc được"""
+    total = 0
+    stack, seen = [pid], set()
+    while stack:
+        current = stack.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    stack.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+def process_tree_pids(pid: int) -> List[int]:
+    """pid + mọi process con (dùng để kill Chrome bị treo)"""
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        if current in pids:
+            continue
+        pids.append(current)
+        try:
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    stack.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return pids
+
+class ProfileSlot:
+    """1 thư mục user-data-dir đang được 1 Chrome dùng, giữ bằng flock cho tới khi driver quit"""
+    def __init__(self, path: str, lock_file):
+        self.path = path
+        self._lock_file = lock_file
+    
+    def release(self):
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+class ProfileSlots:
+    """Cấp user-data-dir cố định (slot-0, slot-1, ...) để cache / profile Chrome dùng lại giữa các session.
+    
+    Chrome không cho 2 process chung 1 profile -> mỗi slot khóa bằng flock (cả giữa các worker process,
+    tự nhả khi process chết).
+    """
+    def __init__(self, base_dir: str, max_slots: int):
+        self.base_dir = base_dir
+        self.max_slots = max(1, max_slots)
+    
+    def acquire(self) -> Optional[ProfileSlot]:
+        os.makedirs(self.base_dir, exist_ok=True)
+        for index in range(self.max_slots):
+            path = os.path.join(self.base_dir, f'slot-{index}')
+            lock_file = open(f'{path}.lock', 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            os.makedirs(path, exist_ok=True)
+            # Chrome bị kill để lại Singleton* -> xóa, flock đã đảm bảo không còn ai dùng slot này
+            for name in ('SingletonLock', 'SingletonCookie', 'SingletonSocket'):
+                try:
+                    os.unlink(os.path.join(path, name))
+                except OSError:
+                    pass
+            return ProfileSlot(path, lock_file)
+        return None
+
+def release_profile(driver):
+    slot = getattr(driver, 'profile_slot', None)
+    if slot:
+        slot.release()
+
+def network_stats(entries: List[Dict]) -> Dict[str, int]:
+    """Tổng hợp performance log (CDP Network.*) của 1 lần load trang.
+    
+    Request bị chặn không rời trình duyệt nên chỉ đếm được số lượng; bytes cached là dữ liệu
+    lấy từ disk/memory cache thay vì tải lại.
+    """
+    stats = {'requests': 0, 'blocked': 0, 'cached': 0, 'bytes': 0, 'cached_bytes': 0}
+    cached_ids = set()
+    for entry in entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, TypeError, ValueError):
+            continue
+        method, params = message.get('method'), message.get('params') or {}
+        request_id = params.get('requestId')
+        if method == 'Network.requestWillBeSent' and not params.get('redirectResponse'):
+            stats['requests'] += 1
+        elif method == 'Network.requestServedFromCache':
+            cached_ids.add(request_id)
+        elif method == 'Network.responseReceived' and (params.get('response') or {}).get('fromDiskCache'):
+            cached_ids.add(request_id)
+        elif method == 'Network.dataReceived' and request_id in cached_ids:
+            stats['cached_bytes'] += int(params.get('dataLength') or 0)
+        elif method == 'Network.loadingFinished':
+            stats['bytes'] += int(params.get('encodedDataLength') or 0)
+        elif method == 'Network.loadingFailed' and params.get('blockedReason'):
+            stats['blocked'] += 1
+    stats['cached'] = len(cached_ids)
+    return stats
+
+class ManagedDriver:
+    """Chrome driver + metadata cho lifecycle (tuổi, số lần dùng, thời gian khởi động)"""
+    __slots__ = ('driver', 'created_at', 'startup_seconds', 'uses', 'last_used')
+    
+    def __init__(self, driver, startup_seconds: float):
+        self.driver = driver
+        self.created_at = time.monotonic()
+        self.startup_seconds = startup_seconds
+        self.uses = 0
+        self.last_used = self.created_at
+    
+    @property
+    def pid(self) -> Optional[int]:
+        process = getattr(getattr(self.driver, 'service', None), 'process', None)
+        return process.pid if process else None
+
+class DriverPool:
+    """Pool Chrome driver có quản lý lifecycle: liveness probe, giới hạn RSS/uses/tuổi, standby driver khởi động sẵn"""
+    def __init__(self, factory, size: int, standby: int = BROWSER_STANDBY,
+                 max_rss_mb: int = BROWSER_MAX_RSS_MB, max_uses: int = BROWSER_MAX_USES,
+                 max_age_minutes: int = BROWSER_MAX_AGE_MINUTES):
+        self.factory = factory
+        self.size = max(1, size)
+        self.standby = max(0, standby)
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.max_uses = max_uses
+        self.max_age_seconds = max_age_minutes * 60
+        self._idle = queue.LifoQueue()
+        self._standby = queue.Queue()
+        self._slots = BoundedSemaphore(self.size)
+        self._lock = Lock()
+        self._refilling = False
+        self._closed = False
+        self.startup_seconds = deque(maxlen=50)
+        # stats / recycle_reasons / startup_seconds: cập nhật từ thread scrape, standby, retire -> chỉ đụng khi giữ _lock
+        self.stats = {'created': 0, 'create_failed': 0, 'recycled': 0, 'probe_failed': 0, 'standby_hits': 0}
+        self.recycle_reasons: Dict[str, int] = {}
+    
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+    
+    @contextmanager
+    def acquire(self, timeout: float = None):
+        """Mượn 1 driver khỏe; ưu tiên driver idle, rồi standby, cuối cùng mới tạo mới"""
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError('No browser available in pool')
+        
+        from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException
+        from urllib3.exceptions import HTTPError as DriverConnectionError
+        
+        managed = None
+        try:
+            managed = self._checkout()
+            yield managed.driver if managed else None
+        except (InvalidSessionIdException, NoSuchWindowException, DriverConnectionError, ConnectionError):
+            # Chỉ lỗi của chính driver / session (mất session, cửa sổ bị đóng, mất kết nối tới chromedriver) -> bỏ đi.
+            # TimeoutException của WebDriverWait, lỗi parse... không liên quan driver: driver quay lại pool ở finally
+            if managed:
+                self.retire(managed, 'error')
+                managed = None
+            raise
+        finally:
+            if managed:
+                managed.uses += 1
+                managed.last_used = time.monotonic()
+                reason = self.recycle_reason(managed)
+                if reason:
+                    self.retire(managed, reason)
+                else:
+                    self._idle.put(managed)
+            self._slots.release()
+    
+    def _checkout(self) -> Optional[ManagedDriver]:
+        while True:
+            try:
+                managed = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            # Driver idle lâu -> probe trước khi dùng
+            if time.monotonic() - managed.last_used < BROWSER_PROBE_IDLE_SECONDS or self.is_alive(managed):
+                return managed
+            self.retire(managed, 'dead')
+        
+        try:
+            managed = self._standby.get_nowait()
+            self._count('standby_hits')
+            self._refill_standby()
+            return managed
+        except queue.Empty:
+            pass
+        
+        managed = self._create()
+        self._refill_standby()
+        return managed
+    
+    def _create(self) -> Optional[ManagedDriver]:
+        started_at = time.monotonic()
+        driver = self.factory()
+        elapsed = time.monotonic() - started_at
+        if not driver:
+            self._count('create_failed')
+            return None
+        with self._lock:
+            self.stats['created'] += 1
+            self.startup_seconds.append(elapsed)
+        logger.info(f"🚀 Chrome started in {elapsed:.1f}s")
+        return ManagedDriver(driver, elapsed)
+    
+    def _refill_standby(self):
+        """Khởi động standby driver ở background để recycle không rơi vào đường scrape"""
+        with self._lock:
+            if self._refilling or self._closed or self._standby.qsize() >= self.standby:
+                return
+            self._refilling = True
+        
+        def refill():
+            try:
+                while not self._closed and self._standby.qsize() < self.standby:
+                    managed = self._create()
+                    if not managed:
+                        break
+                    self._standby.put(managed)
+            finally:
+                with self._lock:
+                    self._refilling = False
+        
+        Thread(target=refill, name='browser-standby', daemon=True).start()
+    
+    def is_alive(self, managed: ManagedDriver) -> bool:
+        """Liveness probe: execute_script phải trả lời trong BROWSER_PROBE_TIMEOUT_SECONDS"""
+        result = {}
+        
+        def probe():
+            try:
+                result['ok'] = managed.driver.execute_script('return 1') == 1
+            except Exception:
+                result['ok'] = False
+        
+        thread = Thread(target=probe, name='browser-probe', daemon=True)
+        thread.start()
+        thread.join(BROWSER_PROBE_TIMEOUT_SECONDS)
+        alive = result.get('ok', False)
+        if not alive:
+            self._count('probe_failed')
+        return alive
+    
+    def rss_bytes(self, managed: ManagedDriver) -> int:
+        return process_tree_rss(managed.pid) if managed.pid else 0
+    
+    def recycle_reason(self, managed: ManagedDriver) -> Optional[str]:
+        if self._closed:
+            return 'closed'
+        if self.max_uses and managed.uses >= self.max_uses:
+            return 'uses'
+        if self.max_age_seconds and time.monotonic() - managed.created_at >= self.max_age_seconds:
+            return 'age'
+        if self.max_rss_bytes and self.rss_bytes(managed) >= self.max_rss_bytes:
+            return 'rss'
+        return None
+    
+    def retire(self, managed: ManagedDriver, reason: str):
+        """Quit driver ở background; kill cả process tree nếu quit bị treo"""
+        with self._lock:
+            self.stats['recycled'] += 1
+            self.recycle_reasons[reason] = self.recycle_reasons.get(reason, 0) + 1
+        logger.info(f"♻️ Recycling Chrome ({reason}, {managed.uses} uses)")
+        pids = process_tree_pids(managed.pid) if managed.pid else []
+        
+        def shutdown():
+            quitter = Thread(target=self._quit, args=(managed.driver,), daemon=True)
+            quitter.start()
+            quitter.join(BROWSER_PROBE_TIMEOUT_SECONDS)
+            if not quitter.is_alive():
+                return
+            logger.warning(f"🔪 Chrome quit hung, killing {len(pids)} process(es)")
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except (OSError, AttributeError):
+                    pass
+            release_profile(managed.driver)
+        
+        Thread(target=shutdown, name='browser-retire', daemon=True).start()
+        if reason != 'closed':
+            self._refill_standby()
+    
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        finally:
+            release_profile(driver)
+    
+    def maintain(self):
+        """Gọi định kỳ: probe + recycle driver idle không khỏe / quá giới hạn, bổ sung standby"""
+        checked = []
+        while True:
+            try:
+                checked.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        
+        for managed in checked:
+            reason = self.recycle_reason(managed) or (None if self.is_alive(managed) else 'dead')
+            if reason:
+                self.retire(managed, reason)
+            else:
+                self._idle.put(managed)
+        
+        # Chỉ giữ standby khi Selenium thực sự được dùng (JSON fast path có thể đủ)
+        with self._lock:
+            used = self.stats['created'] > 0
+        if used:
+            self._refill_standby()
+    
+    def metrics(self) -> Dict:
+        with self._lock:
+            stats, reasons, startups = dict(self.stats), dict(self.recycle_reasons), list(self.startup_seconds)
+        return {
+            **stats,
+            'recycle_reasons': reasons,
+            'idle': self._idle.qsize(),
+            'standby': self._standby.qsize(),
+            'startup_avg_seconds': round(sum(startups) / len(startups), 2) if startups else None,
+            'startup_last_seconds': round(startups[-1], 2) if startups else None
+        }
+    
+    def close(self) -> int:
+        """Đóng toàn bộ driver idle + standby (khi tắt process)"""
+        self._closed = True
+        closed = 0
+        for pool in (self._idle, self._standby):
+            while True:
+                try:
+                    managed = pool.get_nowait()
+                except queue.Empty:
+                    break
+                self._quit(managed.driver)
+                closed += 1
+        return closed
+
+class TrendSnapshot(NamedTuple):
+    """Kết quả scrape gần nhất của 1 target"""
+    target: TrendTarget
+    rows: List[TrendRow]
+    fetched_at: float
+    vietnam_time: datetime
+    source: str = ''
+
+class SnapshotStore:
+    """Lưu snapshot mới nhất cho từng target - monitoring loop ghi, Flask đọc"""
+    def __init__(self, ttl_seconds: int = SNAPSHOT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._snapshots: Dict[TrendTarget, TrendSnapshot] = {}
+        self._lock = Lock()
+    
+    def put(self, target: TrendTarget, rows: List[TrendRow], source: str = '') -> TrendSnapshot:
+        snapshot = TrendSnapshot(target, list(rows), time.time(), get_vietnam_time(), source)
+        with self._lock:
+            self._snapshots[target] = snapshot
+        return snapshot
+    
+    def get(self, target: TrendTarget) -> Optional[TrendSnapshot]:
+        with self._lock:
+            return self._snapshots.get(target)
+    
+    def all(self) -> List[TrendSnapshot]:
+        with self._lock:
+            return list(self._snapshots.values())
+    
+    def age(self, snapshot: TrendSnapshot) -> float:
+        return time.time() - snapshot.fetched_at
+    
+    def is_stale(self, snapshot: TrendSnapshot) -> bool:
+        return self.age(snapshot) > self.ttl_seconds
+
+# Ngưỡng "N+" của Google Trends - đổi bậc = tier jump
+VOLUME_TIERS = (1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000, 2000000, 5000000, 10000000)
+KEYWORD_VS_RE = re.compile(r'\s+(?:vs\.?|v\.?|versus|[-\u2013\u2014])\s+')
+KEYWORD_PUNCT_RE = re.compile(r'[^\w\s]+')
+
+def normalize_keyword(keyword: str) -> str:
+    """Key so sánh keyword: bỏ dấu, casefold, gộp 'vs' / 'v' / '-' và thứ tự 2 vế.
+    
+    'Real Sociedad - Real Madrid' và 'real madrid vs real sociedad' -> cùng 1 key.
+    """
+    text = keyword.replace('đ', 'd').replace('Đ', 'D')
+    text = ''.join(ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch)).casefold()
+    sides = [' '.join(KEYWORD_PUNCT_RE.sub(' ', side).split()) for side in KEYWORD_VS_RE.split(text.strip())]
+    sides = [side for side in sides if side]
+    return ' vs '.join(sorted(sides)) if len(sides) > 1 else (sides[0] if sides else '')
+
+def volume_tier(volume: int) -> int:
+    return bisect.bisect_right(VOLUME_TIERS, volume)
+
+class SnapshotDiff(NamedTuple):
+    """Khác biệt giữa 2 snapshot liên tiếp của 1 target"""
+    target: TrendTarget
+    digest: str
+    baseline: bool  # lần đầu thấy target: mọi dòng là new
+    new: List[TrendRow]
+    dropped: List[TrendRow]
+    moved: List[Tuple[TrendRow, int]]  # (row, rank cũ)
+    updated: List[Tuple[TrendRow, int]]  # volume đổi: (row, volume cũ)
+    tier_jumps: List[Tuple[TrendRow, int]]  # volume đổi bậc: (row, volume cũ)
+    
+    @property
+    def unchanged(self) -> bool:
+        return not (self.new or self.dropped or self.moved or self.updated)
+    
+    def changed_rows(self) -> List[TrendRow]:
+        """Dòng mới / đổi rank / đổi volume, theo thứ tự rank"""
+        rows = {row.rank: row for row in self.new}
+        rows.update({row.rank: row for row, _ in self.moved + self.updated})
+        return [rows[rank] for rank in sorted(rows)]
+    
+    def volume_changed_rows(self) -> List[TrendRow]:
+        return self.new + [row for row, _ in self.updated]
+    
+    def to_dict(self) -> Dict:
+        return {
+            'target': self.target.key,
+            'digest': self.digest,
+            'baseline': self.baseline,
+            'unchanged': self.unchanged,
+            'new': [{'keyword': row.keyword, 'rank': row.rank, 'volume': row.volume} for row in self.new],
+            'dropped': [{'keyword': row.keyword, 'rank': row.rank, 'volume': row.volume} for row in self.dropped],
+            'moved': [{'keyword': row.keyword, 'rank': row.rank, 'previous_rank': rank} for row, rank in self.moved],
+            'tier_jumps': [{'keyword': row.keyword, 'volume': row.volume, 'previous_volume': volume} for row, volume in self.tier_jumps]
+        }
+
+class SnapshotDiffer:
+    """So sánh snapshot mới với snapshot trước của cùng target theo keyword đã normalize.
+    
+    Digest của cả bảng giống lần trước -> trả về diff rỗng ngay, không so từng dòng.
+    """
+    def __init__(self):
+        self._previous: Dict[TrendTarget, Tuple[str, Dict[str, TrendRow]]] = {}
+        self.latest: Dict[TrendTarget, SnapshotDiff] = {}
+        self._lock = Lock()
+    
+    def diff(self, target: TrendTarget, rows: List[TrendRow]) -> SnapshotDiff:
+        current: Dict[str, TrendRow] = {}
+        for row in rows:
+            # Keyword trùng sau normalize: giữ dòng rank cao nhất
+            current.setdefault(normalize_keyword(row.keyword), row)
+        digest = hashlib.blake2b(
+            json.dumps([(key, row.rank, row.volume) for key, row in current.items()]).encode('utf-8'), digest_size=8
+        ).hexdigest()
+        
+        with self._lock:
+            previous = self._previous.get(target)
+            self._previous[target] = (digest, current)
+            if previous is None:
+                diff = SnapshotDiff(target, digest, True, list(current.values()), [], [], [], [])
+            elif previous[0] == digest:
+                diff = SnapshotDiff(target, digest, False, [], [], [], [], [])
+            else:
+                old = previous[1]
+                new, moved, updated, tier_jumps = [], [], [], []
+                for key, row in current.items():
+                    before = old.get(key)
+                    if before is None:
+                        new.append(row)
+                        continue
+                    if before.rank != row.rank:
+                        moved.append((row, before.rank))
+                    if before.volume != row.volume:
+                        updated.append((row, before.volume))
+                        if volume_tier(before.volume) != volume_tier(row.volume):
+                            tier_jumps.append((row, before.volume))
+                dropped = [row for key, row in old.items() if key not in current]
+                diff = SnapshotDiff(target, digest, False, new, dropped, moved, updated, tier_jumps)
+            self.latest[target] = diff
+        return diff
+
+class SingleFlight:
+    """Gộp các lời gọi đồng thời cùng key: chỉ 1 lần chạy, các caller khác chờ chung kết quả"""
+    class _Call:
+        def __init__(self):
+            self.done = Event()
+            self.result = None
+            self.error = None
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = Lock()
+    
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+class LazyService:
+    """Proxy tạo object thật ở lần dùng đầu tiên (thread-safe) -> import module không kéo theo Selenium / Telegram"""
+    def __init__(self, name: str, factory):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', Lock())
+    
+    @property
+    def service_loaded(self) -> bool:
+        return self._instance is not None
+    
+    def load(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    started_at = time.perf_counter()
+                    instance = self._factory()
+                    object.__setattr__(self, '_instance', instance)
+                    logger.info(f"📦 {self._name} loaded in {time.perf_counter() - started_at:.2f}s")
+        return instance
+    
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+    
+    def __setattr__(self, name, value):
+        setattr(self.load(), name, value)
+
+class CacheEntry(NamedTuple):
+    """Metadata của 1 response trong HttpCache (body lưu ở file riêng)"""
+    url: str
+    etag: str
+    last_modified: str
+    content_hash: str
+    content_type: str
+    encoding: Optional[str]
+    size: int
+
+class HttpCache:
+    """Cache HTTP trên đĩa: <sha1(url)>.json (metadata) + .body (nội dung đã giải nén), LRU theo dung lượng/số entry"""
+    def __init__(self, directory: str = HTTP_CACHE_DIR, max_bytes: int = int(HTTP_CACHE_MAX_MB * 1024 * 1024),
+                 max_entries: int = HTTP_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._index: 'OrderedDict[str, CacheEntry]' = OrderedDict()  # LRU: cũ nhất ở đầu
+        self._bytes = 0
+        self._lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+    
+    def _path(self, url: str, suffix: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest() + suffix)
+    
+    def _load(self):
+        """Dựng lại index từ đĩa, thứ tự LRU theo mtime của body"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    entry = CacheEntry(**json.load(f))
+                mtime = os.path.getmtime(self._path(entry.url, '.body'))
+            except (OSError, ValueError, TypeError):
+                continue
+            entries.append((mtime, entry))
+        for _, entry in sorted(entries, key=lambda item: item[0]):
+            self._index[entry.url] = entry
+            self._bytes += entry.size
+        self._evict()
+    
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._index.get(url)
+            if entry:
+                self._index.move_to_end(url)
+            return entry
+    
+    def read_body(self, entry: CacheEntry) -> Optional[bytes]:
+        path = self._path(entry.url, '.body')
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+            os.utime(path)
+            return body
+        except OSError:
+            self.discard(entry.url)
+            return None
+    
+    def store(self, url: str, response: requests.Response, content_hash: str):
+        """Lưu response 200 (trừ khi server cấm bằng no-store)"""
+        if 'no-store' in response.headers.get('Cache-Control', ''):
+            return
+        body = response.content
+        entry = CacheEntry(
+            url=url,
+            etag=response.headers.get('ETag', ''),
+            last_modified=response.headers.get('Last-Modified', ''),
+            content_hash=content_hash,
+            content_type=response.headers.get('Content-Type', ''),
+            encoding=response.encoding,
+            size=len(body)
+        )
+        if entry.size > self.max_bytes:
+            return
+        
+        # Ghi body trước rồi metadata, đều qua file tạm + rename (atomic)
+        for suffix, data in (('.body', body), ('.json', json.dumps(entry._asdict()).encode('utf-8'))):
+            path = self._path(url, suffix)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+        
+        with self._lock:
+            previous = self._index.pop(url, None)
+            self._bytes += entry.size - (previous.size if previous else 0)
+            self._index[url] = entry
+            self._evict()
+    
+    def _evict(self):
+        while self._index and (len(self._index) > self.max_entries or self._bytes > self.max_bytes):
+            url, entry = self._index.popitem(last=False)
+            self._bytes -= entry.size
+            self._remove_files(url)
+            HTTP_CACHE.inc(result='evicted')
+    
+    def discard(self, url: str):
+        with self._lock:
+            entry = self._index.pop(url, None)
+            if entry:
+                self._bytes -= entry.size
+        self._remove_files(url)
+    
+    def _remove_files(self, url: str):
+        for suffix in ('.json', '.body'):
+            try:
+                os.remove(self._path(url, suffix))
+            except OSError:
+                pass
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._index), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+class CachingSession:
+    """Bọc requests.Session, gửi GET có điều kiện (If-None-Match / If-Modified-Since) qua HttpCache.
+    
+    Response trả về có thêm content_hash, from_cache (server trả 304) và unchanged
+    (nội dung giống lần trước) để caller bỏ qua parse. requests chỉ được import khi tạo session.
+    """
+    def __init__(self, cache: Optional[HttpCache] = None):
+        import requests
+        self._requests = requests
+        self._session = requests.Session()
+        self.headers = self._session.headers
+        self.cache = cache
+    
+    def post(self, url, **kwargs) -> requests.Response:
+        return self._session.post(url, **kwargs)
+    
+    def close(self):
+        self._session.close()
+    
+    def get(self, url, **kwargs) -> requests.Response:
+        if not self.cache or kwargs.get('stream'):
+            return self._session.get(url, **kwargs)
+        
+        url = self._requests.Request('GET', url, params=kwargs.pop('params', None)).prepare().url
+        entry = self.cache.lookup(url)
+        request_headers = kwargs.pop('headers', None) or {}
+        headers = dict(request_headers)
+        if entry and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        
+        response = self._session.get(url, headers=headers, **kwargs)
+        
+        if response.status_code == 304 and entry:
+            body = self.cache.read_body(entry)
+            if body is not None:
+                HTTP_CACHE.inc(result='not_modified')
+                HTTP_CACHE_BYTES_SAVED.inc(entry.size)
+                return self._from_cache(entry, body, response)
+            # Body trong cache bị mất -> tải lại không điều kiện, xử lý (hash, lưu cache) như 1 response 200
+            response = self._session.get(url, headers=request_headers, **kwargs)
+        
+        if response.status_code == 200:
+            content_hash = hashlib.sha1(response.content).hexdigest()
+            response.content_hash = content_hash
+            response.from_cache = False
+            response.unchanged = bool(entry) and entry.content_hash == content_hash
+            HTTP_CACHE.inc(result='unchanged' if response.unchanged else 'changed' if entry else 'miss')
+            try:
+                self.cache.store(url, response, content_hash)
+            except OSError as e:
+                logger.warning(f"⚠️ HTTP cache write failed for {url}: {e}")
+        return response
+    
+    def _from_cache(self, entry: CacheEntry, body: bytes, not_modified: requests.Response) -> requests.Response:
+        from requests.structures import CaseInsensitiveDict
+        
+        response = self._requests.Response()
+        response.status_code = 200
+        response._content = body
+        response.headers = CaseInsensitiveDict({**not_modified.headers, 'Content-Type': entry.content_type})
+        response.headers.pop('Content-Length', None)
+        response.encoding = entry.encoding
+        response.url = entry.url
+        response.request = not_modified.request
+        response.elapsed = not_modified.elapsed
+        response._content_consumed = True
+        response.content_hash = entry.content_hash
+        response.from_cache = True
+        response.unchanged = True
+        return response
+
+class KeywordStore:
+    """Persistence cho NotificationTracker: snapshot JSON (atomic rename) + journal append-only, ghi theo batch"""
+    EVICT_INTERVAL_SECONDS = 60
+    
+    def __init__(self, path: str, state_fn, flush_seconds: float = KEYWORDS_FLUSH_SECONDS,
+                 compact_entries: int = KEYWORDS_COMPACT_ENTRIES, evict_fn=None):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.state_fn = state_fn  # trả về state hiện tại (đã evict) để compact
+        self.evict_fn = evict_fn  # evict keyword quá TTL trong memory, trả về số keyword đã xóa
+        self.flush_seconds = flush_seconds
+        self.compact_entries = compact_entries
+        self._pending = []
+        self._journal_entries = 0
+        self._evicted_at = time.monotonic()
+        self._lock = Lock()
+        self._io_lock = Lock()
+        self._stop = Event()
+        self._flusher = None
+    
+    def load(self) -> Dict[str, Dict[str, Tuple[int, float]]]:
+        """Đọc snapshot rồi replay journal; hỗ trợ format cũ {scope: {keyword: volume}}"""
+        self._ensure_flusher()
+        storages = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Format cũ không có thời điểm thông báo: lấy mtime của file (không cho keyword cũ 1 TTL mới)
+            legacy_ts = os.path.getmtime(self.path)
+            for scope, keywords in data.items():
+                storages[scope] = {
+                    keyword: (value, legacy_ts) if isinstance(value, int) else (value[0], value[1])
+                    for keyword, value in keywords.items()
+                }
+        
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Dòng cuối có thể bị ghi dở khi crash
+                        continue
+                    storages.setdefault(entry['s'], {})[entry['k']] = (entry['v'], entry['t'])
+                    self._journal_entries += 1
+        return storages
+    
+    def record(self, scope: str, keyword: str, volume: int, ts: float):
+        """Ghi nhận thay đổi; flush xuống journal theo batch ở background"""
+        with self._lock:
+            self._pending.append({'s': scope, 'k': keyword, 'v': volume, 't': ts})
+        self._ensure_flusher()
+        if self.flush_seconds <= 0:
+            self.flush()
+    
+    def _ensure_flusher(self):
+        with self._lock:
+            if self._flusher is None and self.flush_seconds > 0:
+                self._flusher = Thread(target=self._flush_loop, name='keyword-store', daemon=True)
+                self._flusher.start()
+    
+    def _evict_due(self) -> int:
+        """Evict TTL trong memory tối đa mỗi EVICT_INTERVAL_SECONDS (chạy trên đường flush định kỳ)"""
+        if not self.evict_fn or time.monotonic() - self._evicted_at < self.EVICT_INTERVAL_SECONDS:
+            return 0
+        self._evicted_at = time.monotonic()
+        return self.evict_fn()
+    
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+    
+    def flush(self):
+        """Append các thay đổi đang chờ vào journal; compact khi journal quá dài hoặc có keyword vừa hết TTL"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        
+        with self._io_lock:
+            try:
+                if pending:
+                    self._append(pending)
+                    self._journal_entries += len(pending)
+                
+                if self._journal_entries >= self.compact_entries or self._evict_due():
+                    self._compact()
+            except Exception as e:
+                logger.error(f"Error saving data: {e}")
+    
+    def _append(self, pending: List[Dict]):
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in pending))
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def compact(self):
+        with self._io_lock:
+            self._compact()
+    
+    def _compact(self):
+        """Ghi snapshot mới (tmp + fsync + os.replace) rồi xóa journal"""
+        state = self.state_fn()
+        data = {
+            scope: {keyword: [volume, ts] for keyword, (volume, ts) in keywords.items()}
+            for scope, keywords in state.items()
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        
+        # Các record trong journal đều đã nằm trong snapshot
+        open(self.journal_path, 'w').close()
+        self._journal_entries = 0
+        logger.info(f"🗜️ Compacted {self.path}: {sum(len(keywords) for keywords in data.values())} keywords")
+    
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+class TrendHistoryStore:
+    """Lưu kết quả scrape (keyword, volume, rank, ts) vào SQLite, có index theo (geo, timeframe, keyword_key, ts).
+    
+    keyword_key = normalize_keyword(keyword), cùng key với tracker / differ: tra cứu không phân biệt hoa-thường, dấu,
+    thứ tự 2 vế; cột keyword giữ cách viết gốc để hiển thị.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS observations (
+        id INTEGER PRIMARY KEY,
+        ts INTEGER NOT NULL,
+        geo TEXT NOT NULL,
+        timeframe TEXT NOT NULL,
+        keyword TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        volume INTEGER NOT NULL,
+        keyword_key TEXT NOT NULL DEFAULT ''
+    );
+    CREATE TABLE IF NOT EXISTS notified (
+        scope TEXT NOT NULL,
+        keyword TEXT NOT NULL,
+        volume INTEGER NOT NULL,
+        ts REAL NOT NULL,
+        PRIMARY KEY (scope, keyword)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_notified_ts ON notified (ts);
+    """
+    
+    # Tạo sau migration: DB cũ chưa có cột keyword_key
+    INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_observations_key ON observations (geo, timeframe, keyword_key, ts);
+    CREATE INDEX IF NOT EXISTS idx_observations_ts ON observations (geo, timeframe, ts);
+    CREATE INDEX IF NOT EXISTS idx_observations_key_any ON observations (keyword_key, ts);
+    """
+    
+    INSERT_OBSERVATION = """
+    INSERT INTO observations (ts, geo, timeframe, keyword, rank, volume, keyword_key) VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+    
+    # WHERE ghép trong history(): chỉ các filter có giá trị, để SQLite chọn được index
+    HISTORY_QUERY = "SELECT id, ts, geo, timeframe, keyword, rank, volume FROM observations"
+    
+    SERIES_QUERY = """
+    SELECT (ts / ?) * ? AS bucket, MAX(volume), MIN(rank), COUNT(*) FROM observations
+    WHERE geo = ? AND timeframe = ? AND keyword_key = ? AND ts >= ?
+    GROUP BY bucket ORDER BY bucket
+    """
+    
+    # Observation gần nhất trước mốc since: history chỉ ghi khi keyword đổi nên đây là giá trị tại since
+    BEFORE_QUERY = """
+    SELECT volume, rank FROM observations
+    WHERE geo = ? AND timeframe = ? AND keyword_key = ? AND ts < ?
+    ORDER BY ts DESC LIMIT 1
+    """
+    
+    # SQLite: cột "trần" đi cùng MIN()/MAX() lấy từ đúng dòng có giá trị min/max.
+    # Giá trị đầu = observation cuối trước cửa sổ (nếu có), không phải lần đổi đầu tiên trong cửa sổ
+    MOVERS_QUERY = """
+    SELECT keyword, first_volume, last_volume, last_volume - first_volume AS delta, rank, ts FROM (
+        SELECT last.keyword, last.volume AS last_volume, last.rank, last.ts, COALESCE(
+            (SELECT volume FROM observations AS before
+             WHERE before.geo = ? AND before.timeframe = ? AND before.keyword_key = last.keyword_key AND before.ts < ?
+             ORDER BY before.ts DESC LIMIT 1),
+            first.volume) AS first_volume
+        FROM (SELECT keyword_key, MIN(ts) AS ts, volume FROM observations
+              WHERE geo = ? AND timeframe = ? AND ts >= ? GROUP BY keyword_key) AS first
+        JOIN (SELECT keyword_key, MAX(ts) AS ts, keyword, volume, rank FROM observations
+              WHERE geo = ? AND timeframe = ? AND ts >= ? GROUP BY keyword_key) AS last USING (keyword_key)
+    )
+    ORDER BY delta DESC, last_volume DESC LIMIT ?
+    """
+    
+    def __init__(self, path: str = HISTORY_DB_FILE, retention_days: int = HISTORY_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self._lock = Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        self.migrate()
+        self.conn.executescript(self.INDEXES)
+        self._last_prune = 0.0
+    
+    def migrate(self):
+        """DB cũ (chưa có keyword_key): thêm cột, điền normalize_keyword cho dòng cũ, bỏ index theo keyword thô"""
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(observations)')]
+        if 'keyword_key' in columns:
+            return
+        started_at = time.perf_counter()
+        with self.conn:
+            self.conn.execute("ALTER TABLE observations ADD COLUMN keyword_key TEXT NOT NULL DEFAULT ''")
+            keywords = [row[0] for row in self.conn.execute('SELECT DISTINCT keyword FROM observations')]
+            self.conn.executemany('UPDATE observations SET keyword_key = ? WHERE keyword = ?',
+                                  [(normalize_keyword(keyword), keyword) for keyword in keywords])
+            self.conn.execute('DROP INDEX IF EXISTS idx_observations_keyword')
+            self.conn.execute('DROP INDEX IF EXISTS idx_observations_keyword_any')
+        logger.info(f"🗃️ History migrated: keyword_key for {len(keywords)} keywords in {time.perf_counter() - started_at:.2f}s")
+    
+    def record_snapshot(self, target: TrendTarget, rows: List[TrendRow], ts: float = None):
+        """Ghi các dòng của 1 lần scrape trong 1 transaction (monitor chỉ truyền dòng mới / đổi rank / đổi volume)"""
+        ts = int(ts or time.time())
+        params = [(ts, target.geo, target.timeframe, row.keyword, row.rank, row.volume, normalize_keyword(row.keyword))
+                  for row in rows]
+        with self._lock, self.conn:
+            self.conn.executemany(self.INSERT_OBSERVATION, params)
+        if ts - self._last_prune > 3600:
+            self.prune(ts)
+    
+    def prune(self, now: float = None) -> int:
+        """Xóa dữ liệu cũ hơn HISTORY_RETENTION_DAYS"""
+        now = now or time.time()
+        self._last_prune = now
+        if self.retention_days <= 0:
+            return 0
+        with self._lock, self.conn:
+            cursor = self.conn.execute("DELETE FROM observations WHERE ts < ?", (int(now - self.retention_days * 86400),))
+        return cursor.rowcount
+    
+    def history(self, keyword: str, geo: str = None, timeframe: str = None, since: float = 0,
+                limit: int = 100, cursor: int = None) -> Tuple[List[Dict], Optional[int]]:
+        """Các lần keyword xuất hiện / đổi rank / đổi volume, mới nhất trước (lần scrape không đổi không được ghi).
+        
+        keyword so theo normalize_keyword; cursor = id cuối của trang trước (keyset pagination).
+        """
+        limit = max(1, min(limit, 1000))
+        clauses, params = ['keyword_key = ?'], [normalize_keyword(keyword)]
+        if geo:
+            clauses.append('geo = ?')
+            params.append(geo)
+        if timeframe:
+            clauses.append('timeframe = ?')
+            params.append(timeframe)
+        clauses.append('ts >= ?')
+        params.append(int(since))
+        if cursor:
+            clauses.append('id < ?')
+            params.append(cursor)
+        query = f"{self.HISTORY_QUERY} WHERE {' AND '.join(clauses)} ORDER BY ts DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self.conn.execute(query, (*params, limit)).fetchall()
+        items = [{
+            'ts': ts,
+            'time': datetime.fromtimestamp(ts, VIETNAM_TZ).isoformat(),
+            'geo': row_geo,
+            'timeframe': row_timeframe,
+            'keyword': row_keyword,
+            'rank': rank,
+            'volume': volume
+        } for _, ts, row_geo, row_timeframe, row_keyword, rank, volume in rows]
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return items, next_cursor
+    
+    def volume_series(self, keyword: str, geo: str, timeframe: str, since: float = 0,
+                      bucket_seconds: int = 3600) -> List[Dict]:
+        """Volume theo thời gian (max volume mỗi bucket).
+        
+        History chỉ ghi khi keyword đổi: bucket không có observation mang volume / rank của bucket trước
+        (samples = 0), bắt đầu từ giá trị trước since. Sau observation cuối không điền (keyword có thể đã rời bảng).
+        """
+        bucket_seconds = max(60, int(bucket_seconds))
+        key = normalize_keyword(keyword)
+        with self._lock:
+            rows = self.conn.execute(self.SERIES_QUERY, (
+                bucket_seconds, bucket_seconds, geo, timeframe, key, int(since)
+            )).fetchall()
+            before = self.conn.execute(self.BEFORE_QUERY, (geo, timeframe, key, int(since))).fetchone() if rows else None
+        
+        series = []
+        carried = before
+        bucket = int(since) // bucket_seconds * bucket_seconds if before else (rows[0][0] if rows else 0)
+        for row_bucket, volume, rank, samples in rows:
+            for gap in range(bucket, row_bucket, bucket_seconds):
+                series.append((gap, carried[0], carried[1], 0))
+            series.append((row_bucket, volume, rank, samples))
+            carried, bucket = (volume, rank), row_bucket + bucket_seconds
+        return [{
+            'ts': bucket,
+            'time': datetime.fromtimestamp(bucket, VIETNAM_TZ).isoformat(),
+            'volume': volume,
+            'best_rank': rank,
+            'samples': samples
+        } for bucket, volume, rank, samples in series]
+    
+    def top_movers(self, geo: str, timeframe: str, since: float, limit: int = 20) -> List[Dict]:
+        """Keyword tăng volume nhiều nhất từ mốc since (giá trị cuối trước since nếu có) tới lần đổi gần nhất"""
+        limit = max(1, min(limit, 200))
+        with self._lock:
+            rows = self.conn.execute(self.MOVERS_QUERY, (
+                geo, timeframe, int(since), geo, timeframe, int(since), geo, timeframe, int(since), limit
+            )).fetchall()
+        return [{
+            'keyword': keyword,
+            'first_volume': first_volume,
+            'last_volume': last_volume,
+            'delta': delta,
+            'growth': round(delta / first_volume, 4) if first_volume else None,
+            'rank': rank,
+            'last_seen': datetime.fromtimestamp(ts, VIETNAM_TZ).isoformat()
+        } for keyword, first_volume, last_volume, delta, rank, ts in rows]
+    
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+class SqliteKeywordStore(KeywordStore):
+    """KeywordStore dùng bảng notified trong SQLite thay cho file JSON (upsert theo batch)"""
+    UPSERT = """
+    INSERT INTO notified (scope, keyword, volume, ts) VALUES (?, ?, ?, ?)
+    ON CONFLICT (scope, keyword) DO UPDATE SET volume = excluded.volume, ts = excluded.ts
+    """
+    
+    def __init__(self, history: TrendHistoryStore, legacy_path: str, state_fn, ttl_seconds: float, **kwargs):
+        super().__init__(legacy_path, state_fn, **kwargs)
+        self.history = history
+        self.ttl_seconds = ttl_seconds
+    
+    def load(self) -> Dict[str, Dict[str, Tuple[int, float]]]:
+        self._ensure_flusher()
+        with self.history._lock:
+            rows = self.history.conn.execute("SELECT scope, keyword, volume, ts FROM notified").fetchall()
+        
+        # Lần đầu: import file JSON (+ journal) cũ vào SQLite
+        if not rows and (os.path.exists(self.path) or os.path.exists(self.journal_path)):
+            legacy = super().load()
+            self._append([
+                {'s': scope, 'k': keyword, 'v': volume, 't': ts}
+                for scope, keywords in legacy.items() for keyword, (volume, ts) in keywords.items()
+            ])
+            logger.info(f"📦 Migrated {sum(len(keywords) for keywords in legacy.values())} keywords from {self.path} to SQLite")
+            return legacy
+        
+        storages = {}
+        for scope, keyword, volume, ts in rows:
+            storages.setdefault(scope, {})[keyword] = (volume, ts)
+        return storages
+    
+    def _append(self, pending: List[Dict]):
+        with self.history._lock, self.history.conn:
+            self.history.conn.executemany(self.UPSERT, [(e['s'], e['k'], e['v'], e['t']) for e in pending])
+    
+    def _compact(self):
+        """Với SQLite, compact = xóa các keyword đã quá TTL"""
+        self.state_fn()
+        self._journal_entries = 0
+        if self.ttl_seconds <= 0:
+            return
+        with self.history._lock, self.history.conn:
+            cursor = self.history.conn.execute("DELETE FROM notified WHERE ts < ?", (time.time() - self.ttl_seconds,))
+        if cursor.rowcount:
+            logger.info(f"🗜️ Evicted {cursor.rowcount} expired keywords from SQLite")
+
 class NotificationTracker:
     """Theo dõi từ khóa đã thông báo"""
-    def __init__(self):
-        self.notified_4h = {}
-        self.notified_24h = {}
+    def __init__(self, path: str = KEYWORDS_DB_FILE, ttl_hours: float = KEYWORD_TTL_HOURS,
+                 history: TrendHistoryStore = None, store=None, threshold: int = SEARCH_THRESHOLD,
+                 growth: float = NOTIFY_GROWTH, clock=time.time):
+        # scope ('4h', '24h', 'DE:4h', ...) -> {keyword: (volume, last_notified_ts)}
+        self.storages = {'4h': {}, '24h': {}}
+        self.ttl_seconds = ttl_hours * 3600
+        self.threshold = threshold
+        self.growth = growth
+        self.clock = clock  # replay dùng đồng hồ ảo
+        self._lock = Lock()
+        if store:
+            self.store = store
+        elif history:
+            # SQLite là source of truth; file JSON chỉ dùng để migrate lần đầu
+            self.store = SqliteKeywordStore(history, path, self.snapshot_state, self.ttl_seconds, evict_fn=self.evict_expired)
+        else:
+            self.store = KeywordStore(path, self.snapshot_state, evict_fn=self.evict_expired)
         self.load_data()
     
+    @property
+    def notified_4h(self) -> Dict[str, int]:
+        return {keyword: volume for keyword, (volume, _) in self.storages['4h'].items()}
+    
+    @property
+    def notified_24h(self) -> Dict[str, int]:
+        return {keyword: volume for keyword, (volume, _) in self.storages['24h'].items()}
+    
     def load_data(self):
         try:
-            if os.path.exists(KEYWORDS_DB_FILE):
-                with open(KEYWORDS_DB_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.notified_4h = data.get('4h', {})
-                    self.notified_24h = data.get('24h', {})
-                    logger.info(f"📚 Loaded {len(self.notified_4h)} keywords (4h), {len(self.notified_24h)} keywords (24h)")
+            self.storages.update(self.store.load())
+            evicted = self.evict_expired()
+            logger.info(f"📚 Loaded {len(self.storages['4h'])} keywords (4h), {len(self.storages['24h'])} keywords (24h), {len(self.storages)} scopes, {evicted} expired")
         except Exception as e:
             logger.error(f"Error loading data: {e}")
     
     def save_data(self):
-        try:
-            data = {'4h': self.notified_4h, '24h': self.notified_24h}
-            with open(KEYWORDS_DB_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving data: {e}")
+        """Flush ngay các thay đổi đang chờ (bình thường được ghi theo batch)"""
+        self.store.flush()
+    
+    def evict_expired(self, now: float = None) -> int:
+        """Xóa keyword đã thông báo quá TTL để memory / file không tăng mãi"""
+        if self.ttl_seconds <= 0:
+            return 0
+        cutoff = (now or self.clock()) - self.ttl_seconds
+        evicted = 0
+        with self._lock:
+            for storage in self.storages.values():
+                expired = [keyword for keyword, (_, ts) in storage.items() if ts < cutoff]
+                for keyword in expired:
+                    del storage[keyword]
+                evicted += len(expired)
+        return evicted
+    
+    def snapshot_state(self) -> Dict[str, Dict[str, Tuple[int, float]]]:
+        """State hiện tại (đã evict) dùng cho compaction"""
+        self.evict_expired()
+        with self._lock:
+            return {scope: dict(storage) for scope, storage in self.storages.items()}
     
     def should_notify(self, keyword: str, volume: int, timeframe: str) -> bool:
-        """Kiểm tra có nên thông báo hay không"""
-        storage = self.notified_4h if timeframe == '4h' else self.notified_24h
+        """Kiểm tra có nên thông báo hay không (timeframe = scope của target)"""
+        return self.notify_reason(keyword, volume, timeframe) is not None
+    
+    def notify_reason(self, keyword: str, volume: int, timeframe: str) -> Optional[str]:
+        """Như should_notify nhưng trả về lý do: 'threshold' (lần đầu vượt ngưỡng), 'renotify' hoặc None"""
+        now = self.clock()
+        with self._lock:
+            reason = self._should_notify(keyword, volume, timeframe, now)
+        if reason:
+            self.store.record(timeframe, keyword, volume, now)
+        return reason
+    
+    def _should_notify(self, keyword: str, volume: int, timeframe: str, now: float) -> Optional[str]:
+        storage = self.storages.setdefault(timeframe, {})
         
         # Lần đầu vượt ngưỡng -> thông báo
-        if keyword not in storage and volume >= SEARCH_THRESHOLD:
-            storage[keyword] = volume
-            self.save_data()
-            return True
+        if keyword not in storage and volume >= self.threshold:
+            storage[keyword] = (volume, now)
+            return 'threshold'
         
-        # Đã thông báo nhưng tăng >10% -> thông báo lại
-        if keyword in storage and volume > storage[keyword] * 1.1:
-            storage[keyword] = volume
-            self.save_data()
-            return True
+        # Đã thông báo nhưng tăng > growth (mặc định 10%) -> thông báo lại
+        if keyword in storage and volume > storage[keyword][0] * self.growth:
+            storage[keyword] = (volume, now)
+            return 'renotify'
+        
+        return None
+    
+    def close(self):
+        self.store.close()
+
+class MemoryKeywordStore:
+    """Store không persist cho replay: tracker chỉ giữ state trong memory"""
+    def load(self) -> Dict[str, Dict[str, Tuple[int, float]]]:
+        return {}
+    
+    def record(self, scope: str, keyword: str, volume: int, ts: float):
+        pass
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        pass
+
+class RingBuffer:
+    """Buffer vòng kích thước cố định cho (ts, volume)"""
+    __slots__ = ('times', 'values', 'index', 'count')
+    
+    def __init__(self, size: int):
+        self.times = [0.0] * size
+        self.values = [0] * size
+        self.index = 0
+        self.count = 0
+    
+    def append(self, ts: float, value: int):
+        self.times[self.index] = ts
+        self.values[self.index] = value
+        self.index = (self.index + 1) % len(self.values)
+        self.count = min(self.count + 1, len(self.values))
+    
+    def latest(self) -> Tuple[float, int]:
+        i = (self.index - 1) % len(self.values)
+        return self.times[i], self.values[i]
+    
+    def oldest(self) -> Tuple[float, int]:
+        i = (self.index - self.count) % len(self.values)
+        return self.times[i], self.values[i]
+
+class VelocityState:
+    """State rolling của 1 keyword: buffer + EWMA/EW-variance của growth rate"""
+    __slots__ = ('buffer', 'mean', 'var', 'last_growth', 'samples', 'fired_at')
+    
+    def __init__(self, size: int):
+        self.buffer = RingBuffer(size)
+        self.mean = 0.0
+        self.var = 0.0
+        self.last_growth = 0.0
+        self.samples = 0
+        self.fired_at = float('-inf')
+
+class ArchiveDay(NamedTuple):
+    """Các cột snapshot của 1 ngày; keyword / target là id trong dictionary của ngày đó"""
+    day: str
+    ts: np.ndarray        # int64, epoch ms (chung cho mọi dòng của 1 snapshot)
+    target: np.ndarray    # int32 -> targets
+    rank: np.ndarray      # int32
+    keyword: np.ndarray   # int32 -> keywords
+    volume: np.ndarray    # int64
+    keywords: List[str]
+    targets: List[str]
+    
+    @property
+    def rows(self) -> int:
+        return len(self.ts)
+
+class SnapshotArchiveReader:
+    """Đọc archive snapshot: ngày đã compact (.col) qua np.memmap, ngày đang ghi (.seg) giải nén từng block"""
+    COLUMNS = (('ts', '<i8'), ('target', '<i4'), ('rank', '<i4'), ('keyword', '<i4'), ('volume', '<i8'))
+    BLOCK_MAGIC = b'TSB1'
+    DAY_MAGIC = b'TSC1'
+    BLOCK_HEADER = struct.Struct('<4sII')   # magic, độ dài payload nén, crc32
+    BLOCK_COUNTS = struct.Struct('<III')    # rows, bytes keyword dict, bytes target dict
+    DAY_HEADER = struct.Struct('<4sI')      # magic, độ dài header JSON
+    
+    def __init__(self, directory: str = SNAPSHOT_ARCHIVE_DIR):
+        self.directory = directory
+    
+    def _path(self, day: str, suffix: str) -> str:
+        return os.path.join(self.directory, f'{day}{suffix}')
+    
+    @staticmethod
+    def align(size: int) -> int:
+        """Làm tròn lên bội số của 8 (memmap cột int64 cần căn 8 byte)"""
+        return -(-size // 8) * 8
+    
+    @classmethod
+    def data_start(cls, header_len: int) -> int:
+        return cls.align(cls.DAY_HEADER.size + header_len)
+    
+    @staticmethod
+    def snapshot_starts(data: ArchiveDay) -> np.ndarray:
+        """Mask dòng đầu của mỗi snapshot (dòng của 1 snapshot nằm liền nhau, đổi ts hoặc target = snapshot mới)"""
+        import numpy as np
+        first = np.ones(data.rows, dtype=bool)
+        first[1:] = (data.ts[1:] != data.ts[:-1]) | (data.target[1:] != data.target[:-1])
+        return first
+    
+    def days(self, start: str = None, end: str = None) -> List[str]:
+        """Các ngày có dữ liệu (YYYY-MM-DD, giờ Vietnam), lọc theo [start, end]"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        days = {name[:-4] for name in names if name.endswith(('.seg', '.col'))}
+        return sorted(day for day in days if (not start or day >= start) and (not end or day <= end))
+    
+    def load_day(self, day: str) -> ArchiveDay:
+        if os.path.exists(self._path(day, '.col')):
+            return self._load_compacted(day)
+        return self._load_segment(day)
+    
+    def _load_compacted(self, day: str) -> ArchiveDay:
+        import numpy as np
+        path = self._path(day, '.col')
+        with open(path, 'rb') as f:
+            magic, header_len = self.DAY_HEADER.unpack(f.read(self.DAY_HEADER.size))
+            if magic != self.DAY_MAGIC:
+                raise ValueError(f'{path}: not a compacted archive day')
+            header = json.loads(f.read(header_len))
+            data_start = self.data_start(header_len)
+            f.seek(data_start + header['keywords'][0])
+            keywords = zlib.decompress(f.read(header['keywords'][1])).decode('utf-8')
+        
+        rows = header['rows']
+        columns = {
+            name: np.memmap(path, dtype=dtype, mode='r', offset=data_start + offset, shape=(rows,)) if rows else np.empty(0, dtype)
+            for name, dtype, offset in header['columns']
+        }
+        return ArchiveDay(day, keywords=keywords.split('\0') if keywords else [], targets=header['targets'], **columns)
+    
+    def iter_blocks(self, path: str) -> Iterator[Tuple[List[str], List[str], Dict[str, np.ndarray]]]:
+        """Block trong file .seg; block cuối ghi dở (crash) thì dừng"""
+        import numpy as np
+        with open(path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset + self.BLOCK_HEADER.size <= len(data):
+            magic, length, crc = self.BLOCK_HEADER.unpack_from(data, offset)
+            start = offset + self.BLOCK_HEADER.size
+            payload = data[start:start + length]
+            if magic != self.BLOCK_MAGIC or len(payload) < length or zlib.crc32(payload) != crc:
+                logger.warning(f"⚠️ Archive {path}: truncated block at byte {offset}, ignoring the rest")
+                return
+            offset = start + length
+            
+            raw = zlib.decompress(payload)
+            rows, keywords_len, targets_len = self.BLOCK_COUNTS.unpack_from(raw)
+            position = self.BLOCK_COUNTS.size
+            keywords = raw[position:position + keywords_len].decode('utf-8')
+            position += keywords_len
+            targets = raw[position:position + targets_len].decode('utf-8')
+            position += targets_len
+            columns = {}
+            for name, dtype in self.COLUMNS:
+                columns[name] = np.frombuffer(raw, dtype=dtype, count=rows, offset=position)
+                position += columns[name].nbytes
+            yield keywords.split('\0') if keywords else [], targets.split('\0') if targets else [], columns
+    
+    def _load_segment(self, day: str) -> ArchiveDay:
+        """Gộp các block: dictionary riêng từng block -> dictionary chung của ngày"""
+        import numpy as np
+        keyword_ids: Dict[str, int] = {}
+        target_ids: Dict[str, int] = {}
+        parts = {name: [] for name, _ in self.COLUMNS}
+        path = self._path(day, '.seg')
+        for keywords, targets, columns in self.iter_blocks(path) if os.path.exists(path) else ():
+            keyword_map = np.array([keyword_ids.setdefault(keyword, len(keyword_ids)) for keyword in keywords] or [0], dtype='<i4')
+            target_map = np.array([target_ids.setdefault(target, len(target_ids)) for target in targets] or [0], dtype='<i4')
+            for name, _ in self.COLUMNS:
+                column = columns[name]
+                if name == 'keyword':
+                    column = keyword_map[column]
+                elif name == 'target':
+                    column = target_map[column]
+                parts[name].append(column)
+        
+        columns = {
+            name: np.concatenate(parts[name]).astype(dtype, copy=False) if parts[name] else np.empty(0, dtype)
+            for name, dtype in self.COLUMNS
+        }
+        return ArchiveDay(day, keywords=list(keyword_ids), targets=list(target_ids), **columns)
+
+class SnapshotArchive(SnapshotArchiveReader):
+    """Archive mọi snapshot thô cho backtest.
+    
+    Ngày hiện tại (giờ Vietnam): file .seg append-only, mỗi snapshot là 1 block zlib tự chứa
+    (keyword dictionary + cột int32/int64). Qua ngày mới, các ngày cũ được compact thành .col:
+    cột thô căn 8 byte để đọc bằng np.memmap, keyword dictionary nén zlib.
+    """
+    def __init__(self, directory: str = SNAPSHOT_ARCHIVE_DIR):
+        super().__init__(directory)
+        os.makedirs(directory, exist_ok=True)
+        self._lock = Lock()
+        self._day = None
+        self.stats = {'blocks': 0, 'rows': 0, 'bytes': 0, 'compacted': 0}
+        self.compact_pending()
+    
+    @staticmethod
+    def day_of(ts: float) -> str:
+        return datetime.fromtimestamp(ts, VIETNAM_TZ).strftime('%Y-%m-%d')
+    
+    def append(self, target_key: str, rows: List[TrendRow], fetched_at: float):
+        """Ghi 1 snapshot thành 1 block nén cuối file .seg của ngày"""
+        import numpy as np
+        keyword_ids: Dict[str, int] = {}
+        count = len(rows)
+        columns = (
+            np.full(count, int(fetched_at * 1000), dtype='<i8'),
+            np.zeros(count, dtype='<i4'),
+            np.fromiter((row.rank for row in rows), dtype='<i4', count=count),
+            np.fromiter((keyword_ids.setdefault(row.keyword, len(keyword_ids)) for row in rows), dtype='<i4', count=count),
+            np.fromiter((row.volume for row in rows), dtype='<i8', count=count)
+        )
+        keywords = '\0'.join(keyword_ids).encode('utf-8')
+        target = target_key.encode('utf-8')
+        raw = b''.join((self.BLOCK_COUNTS.pack(count, len(keywords), len(target)), keywords, target,
+                        *(column.tobytes() for column in columns)))
+        payload = zlib.compress(raw, 6)
+        block = self.BLOCK_HEADER.pack(self.BLOCK_MAGIC, len(payload), zlib.crc32(payload)) + payload
+        
+        day = self.day_of(fetched_at)
+        with self._lock:
+            if self._day and day != self._day:
+                self.compact_pending(today=day)
+            self._day = day
+            with open(self._path(day, '.seg'), 'ab') as f:
+                f.write(block)
+            self.stats['blocks'] += 1
+            self.stats['rows'] += count
+            self.stats['bytes'] += len(block)
+    
+    def compact_pending(self, today: str = None) -> int:
+        """Compact mọi ngày trước today còn ở dạng .seg"""
+        today = today or self.day_of(time.time())
+        compacted = 0
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.seg') and name[:-4] < today:
+                try:
+                    self.compact(name[:-4])
+                    compacted += 1
+                except (OSError, ValueError, zlib.error) as e:
+                    logger.error(f"❌ Archive compaction failed for {name}: {e}")
+        return compacted
+    
+    def compact(self, day: str):
+        data = self._load_segment(day)
+        self.write_day(data)
+        os.remove(self._path(day, '.seg'))
+        self.stats['compacted'] += 1
+        logger.info(f"🗜️ Archive {day} compacted: {data.rows:,} rows, {len(data.keywords):,} keywords")
+    
+    def write_day(self, data: ArchiveDay):
+        """Ghi file .col (atomic): header JSON + cột căn 8 byte + keyword dictionary nén"""
+        layout, offset = [], 0
+        for name, dtype in self.COLUMNS:
+            layout.append([name, dtype, offset])
+            # Mỗi cột bắt đầu ở bội số của 8 (số dòng lẻ thì cột int32 để lại 4 byte đệm)
+            offset = self.align(offset + data.rows * int(dtype[-1]))
+        keywords = zlib.compress('\0'.join(data.keywords).encode('utf-8'), 6)
+        
+        # Offset trong header tính từ đầu vùng dữ liệu (ngay sau header, căn 8 byte)
+        header = json.dumps({
+            'rows': data.rows, 'targets': list(data.targets), 'columns': layout, 'keywords': [offset, len(keywords)]
+        }).encode('utf-8')
+        data_start = self.data_start(len(header))
+        
+        path = self._path(data.day, '.col')
+        with open(f'{path}.tmp', 'wb') as f:
+            f.write(self.DAY_HEADER.pack(self.DAY_MAGIC, len(header)))
+            f.write(header)
+            f.write(b'\0' * (data_start - self.DAY_HEADER.size - len(header)))
+            written = 0
+            for name, dtype, column_offset in layout:
+                f.write(b'\0' * (column_offset - written))
+                column = getattr(data, name).astype(dtype, copy=False).tobytes()
+                f.write(column)
+                written = column_offset + len(column)
+            f.write(b'\0' * (offset - written))
+            f.write(keywords)
+        os.replace(f'{path}.tmp', path)
+
+class TrendDetector:
+    """Streaming detector: O(1) mỗi observation, cảnh báo khi growth rate tăng tốc bất thường"""
+    def __init__(self, window: int = DETECTOR_WINDOW, alpha: float = DETECTOR_ALPHA,
+                 z_threshold: float = DETECTOR_Z_THRESHOLD, min_volume: int = DETECTOR_MIN_VOLUME,
+                 min_samples: int = DETECTOR_MIN_SAMPLES, cooldown_minutes: float = DETECTOR_COOLDOWN_MINUTES,
+                 max_keys: int = DETECTOR_MAX_KEYS):
+        self.window = max(2, window)
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_volume = min_volume
+        self.min_samples = min_samples
+        self.cooldown_seconds = cooldown_minutes * 60
+        self.max_keys = max_keys
+        # LRU: keyword lâu không xuất hiện sẽ bị loại khi vượt max_keys
+        self.states: 'OrderedDict[str, VelocityState]' = OrderedDict()
+        self._lock = Lock()
+    
+    def observe(self, key: str, volume: int, ts: float) -> Optional[Dict]:
+        """Cập nhật state của key; trả về alert dict nếu phát hiện tăng tốc"""
+        with self._lock:
+            state = self.states.get(key)
+            if state is None:
+                state = self.states[key] = VelocityState(self.window)
+                if len(self.states) > self.max_keys:
+                    self.states.popitem(last=False)
+            else:
+                self.states.move_to_end(key)
+            
+            if state.buffer.count == 0:
+                state.buffer.append(ts, volume)
+                return None
+            
+            prev_ts, prev_volume = state.buffer.latest()
+            dt_hours = (ts - prev_ts) / 3600
+            if dt_hours <= 0:
+                return None
+            state.buffer.append(ts, volume)
+            
+            # Growth rate tương đối mỗi giờ
+            growth = (volume - prev_volume) / max(prev_volume, 1) / dt_hours
+            std = state.var ** 0.5
+            z = (growth - state.mean) / std if std > 1e-9 else 0.0
+            acceleration = growth - state.last_growth
+            
+            # EWMA + EW variance (incremental)
+            diff = growth - state.mean
+            increment = self.alpha * diff
+            state.mean += increment
+            state.var = (1 - self.alpha) * (state.var + diff * increment)
+            state.last_growth = growth
+            state.samples += 1
+            
+            if (
+                state.samples >= self.min_samples
+                and volume >= self.min_volume
+                and growth > 0 and acceleration > 0
+                and z >= self.z_threshold
+                and ts - state.fired_at >= self.cooldown_seconds
+            ):
+                state.fired_at = ts
+                oldest_ts, oldest_volume = state.buffer.oldest()
+                return {
+                    'key': key,
+                    'volume': volume,
+                    'growth_per_hour': growth,
+                    'acceleration': acceleration,
+                    'z_score': z,
+                    'window_growth': (volume - oldest_volume) / max(oldest_volume, 1),
+                    'window_minutes': (ts - oldest_ts) / 60
+                }
+            return None
+
+class AlertRules:
+    """Rule alert dùng chung cho check live và replay: delta (SnapshotDiffer) -> velocity (TrendDetector)
+    -> threshold + re-notify (NotificationTracker)"""
+    def __init__(self, tracker: NotificationTracker, threshold: int = SEARCH_THRESHOLD,
+                 detector: TrendDetector = None, differ: SnapshotDiffer = None):
+        self.tracker = tracker
+        self.threshold = threshold
+        self.detector = detector or TrendDetector()
+        self.differ = differ or SnapshotDiffer()
+    
+    def evaluate(self, target: TrendTarget, rows: List[TrendRow], vietnam_time: datetime,
+                 estimated: bool = False) -> List[Dict]:
+        """Alert cho 1 bảng trending (rows[0] là top keyword); estimated = volume giả, bỏ qua velocity"""
+        notifications = []
+        keyword, real_volume = rows[0].keyword, rows[0].volume
+        logger.info(f"📊 XPATH RESULT {target.key}: '{keyword}' = {real_volume:,} searches")
+        
+        # Chỉ xử lý delta so với lần check trước: bảng không đổi thì không có gì để alert
+        diff = self.differ.diff(target, rows)
+        if diff.unchanged:
+            logger.info(f"🟰 {target.key} unchanged since last check ({diff.digest}), skipping")
+            return notifications
+        if not diff.baseline:
+            logger.info(f"🔀 {target.key} delta: {len(diff.new)} new, {len(diff.dropped)} dropped, "
+                        f"{len(diff.moved)} moved, {len(diff.tier_jumps)} tier jumps")
+        
+        # Velocity: chỉ dòng mới / đổi volume vào detector (bỏ qua volume giả)
+        if not estimated:
+            notifications.extend(self.detect_velocity(target, diff.volume_changed_rows(), vietnam_time, exclude=keyword))
         
-        return False
+        # Check threshold
+        if real_volume >= self.threshold:
+            reason = self.tracker.notify_reason(normalize_keyword(keyword), real_volume, target.scope)
+            if reason:
+                notifications.append({
+                    'keyword': keyword,
+                    'volume': real_volume,
+                    'timeframe': target.timeframe,
+                    'geo': target.geo,
+                    'timestamp': vietnam_time,
+                    'method': f'FULL-XPATH-{target.timeframe.upper()}',
+                    'reason': reason
+                })
+                ALERTS.inc(reason=reason)
+                logger.info(f"🚨 XPATH ALERT {target.key}: {keyword} - {real_volume:,}")
+            else:
+                logger.info(f"🔄 Already notified ({target.key}): {keyword}")
+        else:
+            logger.info(f"📈 {target.key} below threshold: {real_volume:,} < {self.threshold:,}")
+        return notifications
+    
+    def detect_velocity(self, target: TrendTarget, rows: List[TrendRow], vietnam_time: datetime,
+                        exclude: str = None) -> List[Dict]:
+        """Chạy TrendDetector trên các dòng (mới / đổi volume); exclude = keyword đã được xét theo threshold"""
+        notifications = []
+        ts = vietnam_time.timestamp()
+        exclude = normalize_keyword(exclude) if exclude else None
+        for row in rows:
+            # Cùng key với tracker / differ: các biến thể (dấu, hoa-thường, thứ tự 2 vế) dùng chung 1 state
+            keyword = normalize_keyword(row.keyword)
+            alert = self.detector.observe(f'{target.key}|{keyword}', row.volume, ts)
+            if not alert or (keyword == exclude and row.volume >= self.threshold):
+                continue
+            notifications.append({
+                'keyword': row.keyword,
+                'volume': row.volume,
+                'timeframe': target.timeframe,
+                'geo': target.geo,
+                'timestamp': vietnam_time,
+                'method': f'VELOCITY-{target.timeframe.upper()}',
+                'reason': 'velocity',
+                'growth_per_hour': alert['growth_per_hour'],
+                'z_score': alert['z_score']
+            })
+            ALERTS.inc(reason='velocity')
+            logger.info(f"🚀 VELOCITY ALERT {target.key}: {row.keyword} - {row.volume:,} (+{alert['growth_per_hour']:.0%}/h, z={alert['z_score']:.1f})")
+        return notifications
+
+def parse_bus_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+class ResultBus:
+    """Coordinator: worker process kết nối vào (multiprocessing.connection), kéo job scrape và gửi kết quả về.
+    
+    Mỗi kết nối được phục vụ bởi 1 thread: lấy job từ queue chung, gửi cho worker, chờ kết quả tối đa job_timeout.
+    Worker chết giữa chừng (vd Chrome crash kéo theo process) hoặc treo quá hạn (bị kill) -> job được trả lại queue 1 lần.
+    """
+    def __init__(self, address: Tuple[str, int], authkey: bytes, on_result=None,
+                 job_timeout: float = WORKER_JOB_TIMEOUT_SECONDS):
+        self.address = address
+        self.authkey = authkey
+        self.job_timeout = job_timeout
+        self.on_result = on_result  # on_result(target, message) chạy trước khi future hoàn thành
+        self.jobs = queue.Queue()
+        self.workers: Dict[str, Dict] = {}
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'requeued': 0, 'timed_out': 0}
+        self.listener = None
+        self._job_ids = itertools.count(1)
+        self._lock = Lock()
+        self._closed = Event()
+    
+    def start(self):
+        self.listener = Listener(self.address, authkey=self.authkey)
+        self.address = self.listener.address
+        Thread(target=self._accept_loop, name='result-bus', daemon=True).start()
+        logger.info(f"🚌 Result bus listening on {self.address[0]}:{self.address[1]}")
+    
+    def submit(self, target: TrendTarget, limit: int = None) -> Future:
+        future = Future()
+        with self._lock:
+            self.stats['submitted'] += 1
+        self.jobs.put((next(self._job_ids), target, limit, future, 0))
+        return future
+    
+    def _accept_loop(self):
+        while not self._closed.is_set():
+            try:
+                conn = self.listener.accept()
+            except AuthenticationError as e:
+                logger.warning(f"🔒 Rejected result bus connection: {e}")
+                continue
+            except OSError:
+                if self._closed.is_set():
+                    return
+                continue
+            Thread(target=self._serve_worker, args=(conn,), name='result-bus-worker', daemon=True).start()
+    
+    def _serve_worker(self, conn):
+        job = None
+        worker = '?'
+        pid = None
+        try:
+            if not conn.poll(10):
+                return
+            hello = conn.recv()
+            worker = str(hello.get('worker'))
+            pid = hello.get('pid')
+            with self._lock:
+                self.workers[worker] = {'pid': pid, 'jobs': 0, 'busy': None, 'connected_at': get_vietnam_time().isoformat()}
+            logger.info(f"👷 Worker {worker} connected (pid {hello.get('pid')})")
+            
+            while not self._closed.is_set():
+                job = self.jobs.get()
+                if job is None:
+                    conn.send({'type': 'stop'})
+                    return
+                job_id, target, limit, future, attempts = job
+                if not future.running() and not future.set_running_or_notify_cancel():
+                    job = None
+                    continue
+                
+                with self._lock:
+                    self.workers[worker]['busy'] = target.key
+                conn.send({'type': 'scrape', 'job_id': job_id, 'geo': target.geo, 'hours': target.hours, 'limit': limit})
+                if not conn.poll(self.job_timeout):
+                    raise TimeoutError(f'no result for {target.key} after {self.job_timeout}s')
+                message = conn.recv()
+                job = None
+                with self._lock:
+                    self.workers[worker]['busy'] = None
+                    self.workers[worker]['jobs'] += 1
+                self._complete(target, future, message)
+        except TimeoutError as e:
+            # Worker treo (Chrome kẹt...): kill để supervisor spawn lại, job không bị giữ mãi
+            logger.error(f"⏰ Worker {worker} hung: {e}, killing pid {pid}")
+            with self._lock:
+                self.stats['timed_out'] += 1
+            self._kill(pid)
+            if job:
+                self._retry(job, worker, 'hung')
+        except (EOFError, OSError) as e:
+            logger.error(f"💥 Worker {worker} disconnected: {e}")
+            if job:
+                self._retry(job, worker)
+        finally:
+            with self._lock:
+                self.workers.pop(worker, None)
+            conn.close()
+    
+    def _complete(self, target: TrendTarget, future: Future, message: Dict):
+        if message.get('type') != 'result':
+            with self._lock:
+                self.stats['failed'] += 1
+            future.set_exception(RuntimeError(message.get('error', 'worker error')))
+            return
+        if self.on_result:
+            self.on_result(target, message)
+        with self._lock:
+            self.stats['completed'] += 1
+        future.set_result([TrendRow(*row) for row in message['rows']])
+    
+    @staticmethod
+    def _kill(pid: Optional[int]):
+        if not pid:
+            return
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    
+    def _retry(self, job: Tuple, worker: str, reason: str = 'died'):
+        job_id, target, limit, future, attempts = job
+        if attempts < 1:
+            with self._lock:
+                self.stats['requeued'] += 1
+            logger.warning(f"🔁 Requeue {target.key} (worker {worker} {reason})")
+            self.jobs.put((job_id, target, limit, future, attempts + 1))
+        else:
+            with self._lock:
+                self.stats['failed'] += 1
+            future.set_exception(RuntimeError(f'worker {worker} {reason} while scraping {target.key}'))
+    
+    def close(self, workers: int = 0):
+        """Báo các worker đang kết nối dừng lại rồi đóng listener"""
+        self._closed.set()
+        for _ in range(workers or len(self.workers)):
+            self.jobs.put(None)
+        if self.listener:
+            self.listener.close()
+    
+    def status(self) -> Dict:
+        with self._lock:
+            return {**self.stats, 'queued': self.jobs.qsize(), 'workers': {name: dict(info) for name, info in self.workers.items()}}
+
+class WorkerSupervisor:
+    """Chạy SCRAPE_WORKERS process `python main.py worker` và khởi động lại khi chết (backoff tăng dần)"""
+    WATCH_INTERVAL_SECONDS = 2
+    
+    def __init__(self, count: int, address: Tuple[str, int], authkey: bytes):
+        self.count = count
+        self.address = address
+        self.authkey = authkey
+        self.processes: Dict[str, subprocess.Popen] = {}
+        self.started_at: Dict[str, float] = {}
+        self.backoff: Dict[str, float] = {}
+        self.restarts = 0
+        self._stop = Event()
+    
+    def start(self):
+        for index in range(self.count):
+            self._spawn(f'w{index + 1}')
+        Thread(target=self._watch, name='worker-supervisor', daemon=True).start()
+    
+    def _spawn(self, name: str):
+        env = {
+            **os.environ,
+            'WORKER_PROCESS': '1',
+            'START_MONITOR': '0',
+            # Mỗi worker 1 HttpCache riêng: index trong từng process độc lập, không ghi chung file .tmp
+            'HTTP_CACHE_DIR': os.path.join(HTTP_CACHE_DIR, name),
+            'RESULT_BUS_ADDRESS': f'{self.address[0]}:{self.address[1]}',
+            'RESULT_BUS_AUTHKEY': self.authkey.decode('ascii')
+        }
+        self.processes[name] = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'worker', '--id', name], env=env
+        )
+        self.started_at[name] = time.monotonic()
+        logger.info(f"👷 Spawned worker {name} (pid {self.processes[name].pid})")
+    
+    def _watch(self):
+        restart_at: Dict[str, float] = {}
+        while not self._stop.wait(self.WATCH_INTERVAL_SECONDS):
+            now = time.monotonic()
+            for name, process in list(self.processes.items()):
+                if process.poll() is None:
+                    continue
+                if name not in restart_at:
+                    # Chết nhanh liên tục -> backoff gấp đôi; sống đủ lâu -> reset
+                    lived = now - self.started_at[name]
+                    delay = 1.0 if lived > WORKER_RESTART_MAX_SECONDS else min(WORKER_RESTART_MAX_SECONDS, self.backoff.get(name, 0.5) * 2)
+                    self.backoff[name] = delay
+                    restart_at[name] = now + delay
+                    logger.error(f"💥 Worker {name} exited with code {process.returncode}, restarting in {delay:.0f}s")
+                elif now >= restart_at[name]:
+                    del restart_at[name]
+                    self.restarts += 1
+                    self._spawn(name)
+    
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    
+    def status(self) -> Dict:
+        return {
+            'restarts': self.restarts,
+            'processes': {name: {'pid': process.pid, 'alive': process.poll() is None} for name, process in self.processes.items()}
+        }
+
+class TierBreaker:
+    """Circuit breaker + thống kê của 1 source tier: closed -> open (lỗi liên tiếp) -> half_open (1 probe) -> closed"""
+    STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+    
+    def __init__(self, name: str, failure_threshold: int = TIER_FAILURE_THRESHOLD,
+                 cooldown_seconds: float = TIER_COOLDOWN_SECONDS, max_cooldown_seconds: float = TIER_COOLDOWN_MAX_SECONDS,
+                 alpha: float = TIER_LATENCY_ALPHA):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_cooldown = cooldown_seconds
+        self.max_cooldown = max(cooldown_seconds, max_cooldown_seconds)
+        self.alpha = alpha
+        self.state = 'closed'
+        self.cooldown = cooldown_seconds
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.ewma_seconds: Optional[float] = None
+        # Probe đo latency cho tier closed chưa có số liệu (tối đa 1 lần mỗi cooldown)
+        self.measuring = False
+        self.measured_at = float('-inf')
+        self.stats = {'successes': 0, 'failures': 0, 'probes': 0}
+        self.last_error = ''
+    
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            TIER_TRANSITIONS.inc(tier=self.name, state=state)
+            logger.info(f"🔌 Tier {self.name} circuit -> {state}")
+        TIER_STATE.set(self.STATES[state], tier=self.name)
+    
+    def record_success(self, seconds: float):
+        self.stats['successes'] += 1
+        self.consecutive_failures = 0
+        self.measuring = False
+        self.ewma_seconds = seconds if self.ewma_seconds is None else self.alpha * seconds + (1 - self.alpha) * self.ewma_seconds
+        TIER_LATENCY.set(self.ewma_seconds, tier=self.name)
+        self.cooldown = self.base_cooldown
+        self._set_state('closed')
+    
+    def record_failure(self, error: str = ''):
+        self.stats['failures'] += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+        self.measuring = False
+        if self.state == 'half_open':
+            # Probe lỗi: mở lại với cooldown gấp đôi
+            self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            self.opened_at = time.monotonic()
+            self._set_state('open')
+        elif self.state == 'closed' and self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state('open')
+    
+    def try_probe(self) -> bool:
+        """open và đã hết cooldown -> chuyển half_open, caller chạy đúng 1 probe"""
+        if self.state != 'open' or time.monotonic() - self.opened_at < self.cooldown:
+            return False
+        self.stats['probes'] += 1
+        self._set_state('half_open')
+        return True
+    
+    def try_measure(self) -> bool:
+        """closed nhưng chưa có latency -> caller chạy 1 probe ở background để đo, không đưa tier lên đầu hot path"""
+        if self.state != 'closed' or self.ewma_seconds is not None or self.measuring \
+                or time.monotonic() - self.measured_at < self.base_cooldown:
+            return False
+        self.measuring = True
+        self.measured_at = time.monotonic()
+        self.stats['probes'] += 1
+        return True
+    
+    def status(self) -> Dict:
+        return {
+            **self.stats,
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'ewma_ms': round(self.ewma_seconds * 1000, 1) if self.ewma_seconds is not None else None,
+            'retry_in_seconds': round(max(0.0, self.opened_at + self.cooldown - time.monotonic()), 1) if self.state == 'open' else None,
+            'last_error': self.last_error
+        }
+
+class SourceTierManager:
+    """Chọn thứ tự tier cho mỗi lần scrape: bỏ tier đang open, tier half_open (đang probe) chỉ thử sau mọi tier closed,
+    tier chính xác trước tier xấp xỉ, trong mỗi nhóm tier đã đo latency trước tier chưa đo, ít lỗi liên tiếp trước,
+    rồi EWMA thấp nhất (hòa -> thứ tự tĩnh).
+    Tier hết cooldown / chưa có latency được probe ở background (trong probe_context, tối đa 1 thread mỗi tier)
+    nên không làm chậm cycle."""
+    def __init__(self, tiers: List[Tuple[str, object]], adaptive: bool = TIER_ORDER == 'adaptive', probe_context=None):
+        self.tiers = OrderedDict(tiers)
+        self.adaptive = adaptive
+        # probe_context() -> context manager bao quanh mỗi probe (tài nguyên riêng, không tranh với scrape thật)
+        self.probe_context = probe_context or nullcontext
+        self.breakers = {name: TierBreaker(name) for name in self.tiers}
+        # name -> thread probe đang chạy (probe Selenium treo không sinh thêm thread cho cùng tier)
+        self._probes: Dict[str, Thread] = {}
+        self._lock = Lock()
+    
+    def order(self) -> List[Tuple[str, object]]:
+        with self._lock:
+            healthy = [(index, name) for index, name in enumerate(self.tiers) if self.breakers[name].state != 'open']
+            if self.adaptive:
+                # Tier chưa có latency xếp sau tier đã đo (probe background sẽ đo); tier vừa lỗi xếp sau tier đang chạy tốt
+                healthy.sort(key=lambda item: (
+                    self.breakers[item[1]].state == 'half_open',
+                    item[1] in APPROXIMATE_TIERS,
+                    self.breakers[item[1]].ewma_seconds is None,
+                    self.breakers[item[1]].consecutive_failures,
+                    self.breakers[item[1]].ewma_seconds or 0.0,
+                    item[0]
+                ))
+            else:
+                healthy.sort(key=lambda item: (self.breakers[item[1]].state == 'half_open', item[0]))
+        return [(name, self.tiers[name]) for _, name in healthy]
+    
+    def record(self, name: str, ok: bool, seconds: float, error: str = ''):
+        with self._lock:
+            if ok:
+                self.breakers[name].record_success(seconds)
+            else:
+                self.breakers[name].record_failure(error)
+    
+    def call(self, name: str, timeframe: str, limit: int, geo: str) -> List[TrendRow]:
+        started_at = time.monotonic()
+        try:
+            rows = self.tiers[name](timeframe, limit, geo)
+            error = '' if rows else 'no rows'
+        except Exception as e:
+            rows, error = [], str(e)
+            logger.error(f"❌ {name} tier failed for {geo}:{timeframe}: {e}")
+        self.record(name, bool(rows), time.monotonic() - started_at, error)
+        return rows
+    
+    def probe(self, name: str, timeframe: str, limit: int, geo: str):
+        with self.probe_context():
+            self.call(name, timeframe, limit, geo)
+    
+    def start_probes(self, timeframe: str, limit: int, geo: str):
+        """Half-open: mỗi tier hết cooldown được thử lại 1 lần trên target hiện tại; tier chưa có latency được đo
+        cùng cách (kết quả probe bỏ đi)"""
+        # Tier đứng đầu sẽ được gọi thật ngay sau đây -> không cần probe đo riêng
+        head = next((name for name, _ in self.order()), None)
+        with self._lock:
+            due = [
+                name for name, breaker in self.breakers.items()
+                if not (name in self._probes and self._probes[name].is_alive())
+                and (breaker.try_probe() or (name != head and breaker.try_measure()))
+            ]
+            for name in due:
+                logger.info(f"🩺 Probing tier {name} on {geo}:{timeframe}")
+                thread = self._probes[name] = Thread(target=self.probe, args=(name, timeframe, limit, geo),
+                                                     name=f'tier-probe-{name}', daemon=True)
+                thread.start()
+    
+    def scrape(self, timeframe: str, limit: int, geo: str) -> Tuple[Optional[str], List[TrendRow]]:
+        """Thử các tier healthy theo thứ tự hiện tại; (None, []) nếu tất cả đều lỗi / đang open"""
+        self.start_probes(timeframe, limit, geo)
+        for name, _ in self.order():
+            rows = self.call(name, timeframe, limit, geo)
+            if rows:
+                return name, rows
+            TIER_FAILURES.inc(target=f'{geo}:{timeframe}', tier=name)
+        return None, []
+    
+    def status(self) -> Dict:
+        with self._lock:
+            breakers = {name: breaker.status() for name, breaker in self.breakers.items()}
+            probing = sorted(name for name, thread in self._probes.items() if thread.is_alive())
+        return {'order': [name for name, _ in self.order()], 'probing': probing, 'tiers': breakers}
 
 class PreciseXPathTrendsMonitor:
     """Monitor với FULL XPATH chính xác tuyệt đối"""
-    def __init__(self):
-        self.notification_tracker = NotificationTracker()
-        self.session = requests.Session()
-        self.driver = None
+    def __init__(self, scrape_only: bool = False):
+        # Worker process chỉ scrape: không mở history / tracker (coordinator giữ state)
+        self.history = None if scrape_only else TrendHistoryStore(HISTORY_DB_FILE)
+        self.notification_tracker = None if scrape_only else NotificationTracker(
+            history=self.history if KEYWORDS_BACKEND == 'sqlite' else None
+        )
+        self.archive = SnapshotArchive(SNAPSHOT_ARCHIVE_DIR) if SNAPSHOT_ARCHIVE_DIR and not scrape_only else None
+        self.session = CachingSession(HttpCache() if HTTP_CACHE_MAX_MB > 0 else None)
+        # Probe tier ở background: session không cache + pool 1 driver riêng (xem probing())
+        self.probe_session = CachingSession()
+        self._probe_state = local()
+        # (tier|url) -> (content_hash, limit, rows): tài liệu không đổi thì không parse lại
+        self.parse_memo: 'OrderedDict[str, Tuple[str, Optional[int], List[TrendRow]]]' = OrderedDict()
+        self._memo_lock = Lock()
+        self.targets = parse_targets(SCRAPE_TARGETS)
+        self.driver_pool = DriverPool(self.setup_chrome_driver, BROWSER_POOL_SIZE)
+        self.probe_pool = DriverPool(self.setup_chrome_driver, 1, standby=0)
+        self.tier_manager = SourceTierManager(self.source_tiers(), probe_context=self.probing)
+        # Đủ slot cho pool + standby của mọi worker process dùng chung CHROME_PROFILE_DIR
+        processes = SCRAPE_WORKERS if SCRAPE_MODE == 'process' else 1
+        self.profiles = ProfileSlots(
+            CHROME_PROFILE_DIR, max(1, processes) * (BROWSER_POOL_SIZE + BROWSER_STANDBY) + 2
+        ) if CHROME_PROFILE_DIR else None
+        # target.key -> network stats của lần load Selenium gần nhất
+        self.page_loads: Dict[str, Dict[str, int]] = {}
+        # Đủ thread cho mọi target đang chờ: tier không cần browser (JSON/soup/RSS) không bị giới hạn theo số browser,
+        # DriverPool.acquire tự giới hạn số target dùng Selenium cùng lúc
+        self.executor = ThreadPoolExecutor(max_workers=max(1, MAX_PENDING_TARGETS), thread_name_prefix='scrape')
+        # Backpressure: giới hạn số target đang chờ trong executor
+        self._pending = BoundedSemaphore(max(1, MAX_PENDING_TARGETS))
+        self.snapshots = SnapshotStore(SNAPSHOT_TTL_SECONDS)
+        # 2 differ độc lập: history chỉ lưu delta của mọi lần scrape, check chỉ xử lý delta so với lần check trước
+        self.history_differ = SnapshotDiffer()
+        self.differ = SnapshotDiffer()
+        self.refresh_flight = SingleFlight()
+        # target.key -> tier đã trả kết quả lần gần nhất (json/selenium/soup/rss/fallback)
+        self.served_by: Dict[str, str] = {}
+        self.detector = TrendDetector()
+        self.rules = AlertRules(self.notification_tracker, detector=self.detector, differ=self.differ)
+        # SCRAPE_MODE=process: scrape qua worker process (start_workers)
+        self.result_bus = None
+        self.workers = None
         
         # Browser headers cho fallback
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Cache-Control': 'no-cache'
+            'Accept-Encoding': ACCEPT_ENCODING,
+            'Connection': 'keep-alive'
         })
+        self.probe_session.headers.update(self.session.headers)
+    
+    @contextmanager
+    def probing(self):
+        """Tier probe trong thread hiện tại dùng probe_session (không ghi HttpCache) và probe_pool
+        (không chiếm slot của driver_pool)"""
+        self._probe_state.active = True
+        try:
+            yield
+        finally:
+            self._probe_state.active = False
+    
+    @property
+    def http(self) -> CachingSession:
+        return self.probe_session if getattr(self._probe_state, 'active', False) else self.session
+    
+    @property
+    def browsers(self) -> DriverPool:
+        return self.probe_pool if getattr(self._probe_state, 'active', False) else self.driver_pool
     
     def setup_chrome_driver(self):
-        """Setup Chrome driver cho Selenium"""
-        if self.driver:
-            return self.driver
-            
+        """Tạo 1 Chrome driver mới cho Selenium (DriverPool quản lý việc dùng lại)"""
+        slot = None
         try:
+            from selenium import webdriver
+            from selenium.webdriver.chrome.options import Options
+            
             chrome_options = Options()
+            # 'eager': driver.get trả về khi DOMContentLoaded, không chờ ảnh / iframe; TableRowsStable lo phần còn lại
+            chrome_options.page_load_strategy = PAGE_LOAD_STRATEGY
             chrome_options.add_argument('--headless')  # Run in background
             chrome_options.add_argument('--no-sandbox')
             chrome_options.add_argument('--disable-dev-shm-usage')
@@ -129,21 +2700,47 @@ class PreciseXPathTrendsMonitor:
             # For Render.com compatibility
             chrome_options.add_argument('--disable-extensions')
             chrome_options.add_argument('--disable-plugins')
-            chrome_options.add_argument('--disable-images')
+            chrome_options.add_argument('--blink-settings=imagesEnabled=false')
             chrome_options.add_argument('--disable-background-timer-throttling')
             chrome_options.add_argument('--disable-renderer-backgrounding')
             chrome_options.add_argument('--disable-backgrounding-occluded-windows')
             
-            self.driver = webdriver.Chrome(options=chrome_options)
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            # Profile + disk cache dùng lại giữa các session (JS bundle của trang không tải lại)
+            slot = self.profiles.acquire() if self.profiles else None
+            if slot:
+                chrome_options.add_argument(f'--user-data-dir={os.path.abspath(slot.path)}')
+                chrome_options.add_argument(f'--disk-cache-size={CHROME_DISK_CACHE_MB * 1024 * 1024}')
+            elif self.profiles:
+                logger.warning("⚠️ No free Chrome profile slot, using a temporary profile")
+            
+            # Performance log (chỉ Network) để đếm request / bytes mỗi lần load
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+            chrome_options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
             
-            logger.info("✅ Chrome driver initialized successfully")
-            return self.driver
+            driver = webdriver.Chrome(options=chrome_options)
+            driver.profile_slot = slot
+            driver.set_page_load_timeout(TARGET_TIMEOUT_SECONDS)
+            driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            if BLOCK_RESOURCES and BLOCKED_URL_PATTERNS:
+                driver.execute_cdp_cmd('Network.enable', {})
+                driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+            
+            logger.info(f"✅ Chrome driver initialized successfully (profile {slot.path if slot else 'temporary'})")
+            return driver
             
         except Exception as e:
+            if slot:
+                slot.release()
             logger.error(f"❌ Chrome driver setup failed: {e}")
             return None
     
+    @staticmethod
+    def drain_network_log(driver) -> List[Dict]:
+        try:
+            return driver.get_log('performance')
+        except Exception:
+            return []
+    
     def parse_volume_string(self, volume_str: str) -> int:
         """Convert volume string thành số"""
         if not volume_str:
@@ -161,6 +2758,10 @@ class PreciseXPathTrendsMonitor:
                 # '1.5M' -> 1500000
                 number = float(volume_str.replace('M', ''))
                 return int(number * 1000000)
+            elif 'TR' in volume_str:
+                # '1 Tr+' (triệu, UI tiếng Việt) -> 1000000
+                number = float(volume_str.replace('TR', ''))
+                return int(number * 1000000)
             elif volume_str.isdigit():
                 # Plain number
                 return int(volume_str)
@@ -175,139 +2776,309 @@ class PreciseXPathTrendsMonitor:
         except (ValueError, TypeError):
             logger.error(f"Cannot parse volume: {volume_str}")
             
+        PARSE_FAILURES.inc(kind='volume')
         return 0
     
-    def get_top1_with_full_xpath(self, timeframe='24h') -> Tuple[str, int]:
-        """Lấy TOP 1 với FULL XPATH chính xác tuyệt đối"""
+    def parse_volumes(self, volume_strs: List[str]) -> np.ndarray:
+        """Batch parse_volume_string: mỗi chuỗi khác nhau chỉ parse 1 lần, kết quả là mảng int64"""
+        import numpy as np
+        parsed = {}
+        for volume_str in set(volume_strs):
+            if not volume_str:
+                parsed[volume_str] = 0
+                continue
+            match = VOLUME_FAST_RE.fullmatch(volume_str.strip().upper().translate(VOLUME_CLEAN_TABLE))
+            if not match:
+                parsed[volume_str] = self.parse_volume_string(volume_str)
+                continue
+            number, unit = match.groups()
+            if unit:
+                parsed[volume_str] = int(float(number) * VOLUME_MULTIPLIERS[unit])
+            elif number.isdigit():
+                parsed[volume_str] = int(number)
+            else:
+                # "1.5" không có đơn vị -> scalar coi là nghìn
+                parsed[volume_str] = int(float(number) * 1000)
+        return np.fromiter((parsed[volume_str] for volume_str in volume_strs), dtype=np.int64, count=len(volume_strs))
+    
+    def validate_keywords(self, keywords: List[str]) -> np.ndarray:
+        """Batch is_valid_trending_keyword, trả về mảng bool"""
+        import numpy as np
+        search = UI_TERMS_RE.search
+        return np.fromiter((
+            bool(keyword) and 3 <= len(keyword) <= 100
+            and keyword[0].isalnum()
+            and not search(keyword.lower())
+            and any(c.isalpha() for c in keyword)
+            for keyword in keywords
+        ), dtype=bool, count=len(keywords))
+    
+    @staticmethod
+    def get_trends_url(timeframe: str, geo: str = GEO_LOCATION) -> str:
+        """URL trang trending cho từng timeframe / geo"""
+        hours = int(timeframe.rstrip('h'))
+        return f"{TRENDS_BASE_URL}/trending?geo={geo}&hl=vi&hours={hours}"
+    
+    def extract_trending_table(self, driver, limit: int = None) -> List[TrendRow]:
+        """Đọc toàn bộ bảng trending bằng 1 lần execute_script"""
+        import numpy as np
+        raw_rows = driver.execute_script(TRENDS_TABLE_JS) or []
         
-        # URLs và XPaths chính xác cho từng timeframe
-        if timeframe == '4h':
-            url = "https://trends.google.com/trending?geo=US&hl=vi&hours=4"
-            keyword_xpath = "/html/body/c-wiz/div/div[5]/div[1]/c-wiz/div/div[2]/div[1]/div[1]/div[1]/table/tbody[2]/tr[1]/td[2]/div[1]"
-            volume_xpath = "/html/body/c-wiz/div/div[5]/div[1]/c-wiz/div/div[2]/div[1]/div[1]/div[1]/table/tbody[2]/tr[1]/td[3]/div/div[1]"
-        else:  # 24h
-            url = "https://trends.google.com/trending?geo=US&hl=vi&hours=24"
-            keyword_xpath = "/html/body/c-wiz/div/div[5]/div[1]/c-wiz/div/div[2]/div[1]/div[1]/div[1]/table/tbody[2]/tr[1]/td[2]/div[1]"
-            volume_xpath = "/html/body/c-wiz/div/div[5]/div[1]/c-wiz/div/div[2]/div[1]/div[1]/div[1]/table/tbody[2]/tr[1]/td[3]/div/div[1]"
+        keywords = [(raw.get('keyword') or '').strip() for raw in raw_rows]
+        volume_strs = [(raw.get('volume') or '').strip() for raw in raw_rows]
+        valid = self.validate_keywords(keywords)
+        volumes = self.parse_volumes(volume_strs)
         
-        vietnam_time = get_vietnam_time()
-        logger.info(f"🎯 FULL XPATH SCRAPING {timeframe.upper()} at {vietnam_time.strftime('%H:%M')}")
-        logger.info(f"🔗 URL: {url}")
-        logger.info(f"🎯 Keyword XPath: {keyword_xpath}")
-        logger.info(f"📊 Volume XPath: {volume_xpath}")
+        rows = []
+        for i in np.flatnonzero(valid)[:limit]:
+            raw = raw_rows[i]
+            rows.append(TrendRow(
+                rank=int(i) + 1,
+                keyword=keywords[i],
+                volume_str=volume_strs[i],
+                volume=int(volumes[i]),
+                started=(raw.get('started') or '').strip(),
+                related=[term.strip() for term in raw.get('related') or [] if term and term.strip()]
+            ))
+        
+        return rows
+    
+    def trend_items_to_rows(self, items: List, limit: int = None) -> List[TrendRow]:
+        """Convert trend item JSON (batchexecute / AF_initDataCallback) thành TrendRow"""
+        import numpy as np
+        keywords = [item[0].strip() for item in items]
+        valid = self.validate_keywords(keywords)
+        
+        rows = []
+        for i in np.flatnonzero(valid)[:limit]:
+            item, index, keyword = items[i], int(i) + 1, keywords[i]
+            started = ''
+            if isinstance(item[3], list) and item[3] and isinstance(item[3][0], int):
+                started = datetime.fromtimestamp(item[3][0], VIETNAM_TZ).strftime('%H:%M %d/%m/%Y')
+            related = item[9] if len(item) > 9 and isinstance(item[9], list) else []
+            
+            rows.append(TrendRow(
+                rank=index,
+                keyword=keyword,
+                volume_str=str(item[6]),
+                volume=item[6],
+                started=started,
+                related=[term for term in related if isinstance(term, str)]
+            ))
+        return rows
+    
+    def fetch_trends_json(self, timeframe='24h', limit: int = None, geo: str = GEO_LOCATION) -> List[TrendRow]:
+        """Fast path không cần browser: gọi batchexecute, fallback sang AF_initDataCallback trong HTML"""
+        hours = int(timeframe.rstrip('h'))
+        rpc_args = json.dumps([None, None, geo, 0, 'vi', hours, 1], separators=(',', ':'))
+        f_req = json.dumps([[[TRENDS_RPC_ID, rpc_args, None, 'generic']]], separators=(',', ':'))
         
-        # Method 1: Selenium với Full XPath (Primary method)
         try:
-            driver = self.setup_chrome_driver()
-            if driver:
-                logger.info(f"🌐 Loading page for {timeframe}...")
-                driver.get(url)
-                
-                # Wait for page to load completely
-                WebDriverWait(driver, 30).until(
-                    EC.presence_of_element_located((By.TAG_NAME, "table"))
-                )
-                
-                # Additional wait for dynamic content
-                time.sleep(8)
-                logger.info(f"⏳ Page loaded, extracting data for {timeframe}...")
-                
-                keyword = ""
-                volume_str = ""
-                
-                # Extract keyword using EXACT XPATH
-                try:
-                    keyword_element = WebDriverWait(driver, 15).until(
-                        EC.presence_of_element_located((By.XPATH, keyword_xpath))
-                    )
-                    keyword = keyword_element.text.strip()
-                    logger.info(f"✅ XPATH Keyword {timeframe}: '{keyword}'")
-                except Exception as e:
-                    logger.error(f"❌ XPATH keyword extraction failed for {timeframe}: {e}")
-                
-                # Extract volume using EXACT XPATH
-                try:
-                    volume_element = WebDriverWait(driver, 15).until(
-                        EC.presence_of_element_located((By.XPATH, volume_xpath))
-                    )
-                    volume_str = volume_element.text.strip()
-                    logger.info(f"✅ XPATH Volume {timeframe}: '{volume_str}'")
-                except Exception as e:
-                    logger.error(f"❌ XPATH volume extraction failed for {timeframe}: {e}")
-                
-                # Validate and convert
-                if keyword and volume_str and self.is_valid_trending_keyword(keyword):
-                    volume_int = self.parse_volume_string(volume_str)
-                    logger.info(f"🎯 FULL XPATH SUCCESS {timeframe}: '{keyword}' = '{volume_str}' = {volume_int:,}")
-                    return keyword, volume_int
-                else:
-                    logger.warning(f"⚠️ XPATH validation failed: keyword='{keyword}', volume='{volume_str}'")
-                    
+            response = self.http.post(
+                f"{TRENDS_BASE_URL}/_/TrendsUi/data/batchexecute",
+                params={'rpcids': TRENDS_RPC_ID, 'source-path': '/trending', 'hl': 'vi'},
+                data={'f.req': f_req},
+                timeout=FAST_PATH_TIMEOUT_SECONDS
+            )
+            if response.status_code == 200:
+                rows = self.trend_items_to_rows(find_trend_items(parse_batchexecute_response(response.text)), limit)
+                if rows:
+                    return rows
+            logger.warning(f"⚠️ batchexecute returned no rows for {geo} {timeframe} (HTTP {response.status_code})")
         except Exception as e:
-            logger.error(f"❌ Selenium method failed for {timeframe}: {e}")
-        finally:
-            # Don't quit driver here, reuse it
-            pass
+            logger.error(f"❌ batchexecute failed for {geo} {timeframe}: {e}")
+        
+        # Payload nhúng sẵn trong HTML (server-side render)
+        response = self.http.get(self.get_trends_url(timeframe, geo), timeout=FAST_PATH_TIMEOUT_SECONDS)
+        if response.status_code == 200:
+            return self.parse_once('json', response, self.parse_af_rows, limit)
+        return []
+    
+    def parse_af_rows(self, response: requests.Response, limit: int = None) -> List[TrendRow]:
+        for payload in parse_af_init_data(response.text):
+            rows = self.trend_items_to_rows(find_trend_items(payload), limit)
+            if rows:
+                return rows
+        return []
+    
+    def parse_once(self, tier: str, response: requests.Response, parse, limit: int = None) -> List[TrendRow]:
+        """parse(response, limit) -> rows; cùng URL và cùng content hash với lần trước thì dùng lại rows"""
+        content_hash = getattr(response, 'content_hash', '')
+        key = f'{tier}|{response.url}'
+        if content_hash:
+            with self._memo_lock:
+                cached = self.parse_memo.get(key)
+                # Kết quả đã cắt theo limit chỉ dùng lại được cho limit nhỏ hơn hoặc bằng
+                if cached and cached[0] == content_hash and (cached[1] is None or (limit and limit <= cached[1])):
+                    self.parse_memo.move_to_end(key)
+                    PARSE_SKIPPED.inc(tier=tier)
+                    return cached[2][:limit]
+        
+        rows = parse(response, limit)
+        if content_hash:
+            with self._memo_lock:
+                self.parse_memo[key] = (content_hash, limit, rows)
+                self.parse_memo.move_to_end(key)
+                while len(self.parse_memo) > PARSE_MEMO_SIZE:
+                    self.parse_memo.popitem(last=False)
+        return rows
+    
+    def get_trending_table(self, timeframe='24h', limit: int = None, geo: str = GEO_LOCATION) -> List[TrendRow]:
+        """Lấy toàn bộ bảng trending (keyword, volume, start time, related) với 1 lần load trang"""
+        key = f'{geo}:{timeframe}'
+        with SCRAPE_SECONDS.time(target=key):
+            rows = self._scrape_table(timeframe, limit, geo)
+        TIER_SERVED.inc(target=key, tier=self.served_by.get(key, 'none'))
+        return rows
+    
+    def _scrape_table(self, timeframe: str, limit: int, geo: str) -> List[TrendRow]:
+        """Thử các tier healthy theo SourceTierManager (mặc định JSON -> Selenium -> BeautifulSoup -> RSS), cuối cùng fallback"""
+        key = f'{geo}:{timeframe}'
+        vietnam_time = get_vietnam_time()
+        logger.info(f"🎯 TABLE SCRAPING {geo} {timeframe.upper()} at {vietnam_time.strftime('%H:%M')}")
+        logger.info(f"🔗 URL: {self.get_trends_url(timeframe, geo)}")
+        
+        tier, rows = self.tier_manager.scrape(timeframe, limit, geo)
+        if rows:
+            self.served_by[key] = tier
+            return rows
+        
+        # Fallback không bao giờ lỗi (cũng là đường đi khi mọi tier đang open)
+        self.served_by[key] = 'fallback'
+        return self.scrape_fallback(timeframe, limit, geo)
+    
+    def source_tiers(self) -> List[Tuple[str, object]]:
+        """Các tier scrape theo thứ tự ưu tiên tĩnh (chưa gồm fallback hardcoded); SourceTierManager sắp xếp lại"""
+        return [
+            ('json', self.scrape_json),
+            ('selenium', self.scrape_selenium),
+            ('soup', self.scrape_soup),
+            ('rss', self.scrape_rss)
+        ]
+    
+    def scrape_json(self, timeframe: str, limit: int = None, geo: str = GEO_LOCATION) -> List[TrendRow]:
+        """Method 0: HTTP/JSON fast path - không cần Chrome"""
+        started_at = time.monotonic()
+        rows = self.fetch_trends_json(timeframe, limit, geo)
+        if rows:
+            TIME_TO_DATA_SECONDS.observe(time.monotonic() - started_at, target=f'{geo}:{timeframe}', tier='json')
+            logger.info(f"⚡ JSON SUCCESS {geo} {timeframe}: {len(rows)} rows in {(time.monotonic() - started_at) * 1000:.0f} ms, top='{rows[0].keyword}' = {rows[0].volume:,}")
+        return rows
+    
+    def scrape_selenium(self, timeframe: str, limit: int = None, geo: str = GEO_LOCATION) -> List[TrendRow]:
+        """Method 1: Selenium - toàn bộ table trong 1 round-trip"""
+        with self.browsers.acquire(timeout=TARGET_TIMEOUT_SECONDS) as driver:
+            if not driver:
+                return []
+            logger.info(f"🌐 Loading page for {timeframe}...")
+            self.drain_network_log(driver)
+            started_at = time.monotonic()
+            driver.get(self.get_trends_url(timeframe, geo))
+            page_load_ms = (time.monotonic() - started_at) * 1000
+            PAGE_LOAD_SECONDS.observe(page_load_ms / 1000, target=f'{geo}:{timeframe}')
+            
+            # Chờ tới khi bảng có dữ liệu và ổn định (không sleep cố định)
+            from selenium.webdriver.support.ui import WebDriverWait
+            ready_rows = WebDriverWait(driver, READY_TIMEOUT_SECONDS, poll_frequency=READY_POLL_SECONDS).until(
+                TableRowsStable()
+            )
+            time_to_data_ms = (time.monotonic() - started_at) * 1000
+            TIME_TO_DATA_SECONDS.observe(time_to_data_ms / 1000, target=f'{geo}:{timeframe}', tier='selenium')
+            logger.info(f"⚡ {geo} {timeframe} time-to-data: {time_to_data_ms:.0f} ms (page load {page_load_ms:.0f} ms, {ready_rows} rows)")
+            
+            rows = self.extract_trending_table(driver, limit)
+            self.record_page_load(f'{geo}:{timeframe}', self.drain_network_log(driver))
+            if rows:
+                logger.info(f"🎯 TABLE SUCCESS {timeframe}: {len(rows)} rows, top='{rows[0].keyword}' = {rows[0].volume:,}")
+            else:
+                logger.warning(f"⚠️ Table extraction returned no valid rows for {timeframe}")
+            return rows
+    
+    def record_page_load(self, target_key: str, entries: List[Dict]):
+        """Request / bytes của 1 lần load: network, bị chặn, lấy từ cache"""
+        stats = network_stats(entries)
+        if not stats['requests']:
+            return
+        self.page_loads[target_key] = stats
+        BROWSER_REQUESTS.inc(stats['requests'] - stats['blocked'] - stats['cached'], outcome='network')
+        BROWSER_REQUESTS.inc(stats['blocked'], outcome='blocked')
+        BROWSER_REQUESTS.inc(stats['cached'], outcome='cached')
+        BROWSER_BYTES.inc(stats['bytes'], source='network')
+        BROWSER_BYTES.inc(stats['cached_bytes'], source='cached')
+        logger.info(f"🧹 {target_key} page: {stats['requests']} requests, {stats['blocked']} blocked, "
+                    f"{stats['cached']} from cache ({stats['cached_bytes'] / 1024:.0f} KB), {stats['bytes'] / 1024:.0f} KB transferred")
+    
+    def scrape_soup(self, timeframe: str, limit: int = None, geo: str = GEO_LOCATION) -> List[TrendRow]:
+        """Method 2: BeautifulSoup fallback"""
+        logger.info(f"🔄 Fallback: BeautifulSoup scraping for {timeframe}")
+        
+        response = self.http.get(self.get_trends_url(timeframe, geo), timeout=25)
+        if response.status_code != 200:
+            return []
+        
+        rows = self.parse_once('soup', response, self.parse_soup_rows, limit)
+        if rows:
+            logger.info(f"✅ FALLBACK SUCCESS {timeframe}: {len(rows)} rows, top='{rows[0].keyword}' = {rows[0].volume:,}")
+        return rows
+    
+    def parse_soup_rows(self, response: requests.Response, limit: int = None) -> List[TrendRow]:
+        import numpy as np
+        from bs4 import BeautifulSoup
+        
+        soup = BeautifulSoup(response.text, 'html.parser')
+        
+        # Look for class-based selectors
+        keyword_divs = soup.find_all('div', class_='mZ3RIc')
+        volume_divs = soup.find_all('div', class_='lqv0Cb')
+        
+        keywords = [div.get_text().strip() for div in keyword_divs[:len(volume_divs)]]
+        volume_strs = [div.get_text().strip() for div in volume_divs[:len(keywords)]]
+        volumes = self.parse_volumes(volume_strs)
+        return [
+            TrendRow(int(i) + 1, keywords[i], volume_strs[i], int(volumes[i]), '', [])
+            for i in np.flatnonzero(self.validate_keywords(keywords))[:limit]
+        ]
+    
+    def get_rss_url(self, timeframe: str, geo: str = GEO_LOCATION) -> str:
+        if timeframe == '24h':
+            return f"{TRENDS_BASE_URL}/trends/trendingsearches/daily/rss?geo={geo}"
+        return f"{TRENDS_BASE_URL}/trends/trendingsearches/realtime/rss?geo={geo}"
+    
+    def scrape_rss(self, timeframe: str, limit: int = None, geo: str = GEO_LOCATION) -> List[TrendRow]:
+        """Method 3: RSS Fallback"""
+        rss_url = self.get_rss_url(timeframe, geo)
+        logger.info(f"📡 RSS fallback for {timeframe}: {rss_url}")
         
-        # Method 2: BeautifulSoup fallback
-        try:
-            logger.info(f"🔄 Fallback: BeautifulSoup scraping for {timeframe}")
-            
-            response = self.session.get(url, timeout=25)
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Look for class-based selectors
-                keyword_divs = soup.find_all('div', class_='mZ3RIc')
-                volume_divs = soup.find_all('div', class_='lqv0Cb')
-                
-                if keyword_divs and volume_divs:
-                    keyword = keyword_divs[0].get_text().strip()
-                    volume_str = volume_divs[0].get_text().strip()
-                    
-                    if keyword and self.is_valid_trending_keyword(keyword):
-                        volume_int = self.parse_volume_string(volume_str)
-                        logger.info(f"✅ FALLBACK SUCCESS {timeframe}: '{keyword}' = '{volume_str}' = {volume_int:,}")
-                        return keyword, volume_int
-                        
-        except Exception as e:
-            logger.error(f"❌ BeautifulSoup fallback failed for {timeframe}: {e}")
+        response = self.http.get(rss_url, timeout=15)
+        if response.status_code != 200:
+            return []
         
-        # Method 3: RSS Fallback
-        try:
-            if timeframe == '24h':
-                rss_url = "https://trends.google.com/trends/trendingsearches/daily/rss?geo=US"
-            else:
-                rss_url = "https://trends.google.com/trends/trendingsearches/realtime/rss?geo=US"
-            
-            logger.info(f"📡 RSS fallback for {timeframe}: {rss_url}")
-            
-            response = self.session.get(rss_url, timeout=15)
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'xml')
-                items = soup.find_all('item')
-                
-                if items:
-                    title_elem = items[0].find('title')
-                    if title_elem:
-                        keyword = title_elem.get_text().strip()
-                        if self.is_valid_trending_keyword(keyword):
-                            # Estimate volume based on position
-                            if timeframe == '4h':
-                                volume = random.randint(50000, 150000)
-                            else:  # 24h
-                                volume = random.randint(200000, 500000)
-                            
-                            logger.info(f"✅ RSS SUCCESS {timeframe}: '{keyword}' = ~{volume:,} (estimated)")
-                            return keyword, volume
-                            
-        except Exception as e:
-            logger.error(f"❌ RSS fallback failed for {timeframe}: {e}")
+        rows = self.parse_once('rss', response, self.parse_rss_rows, limit)
+        if rows:
+            logger.info(f"✅ RSS SUCCESS {timeframe}: {len(rows)} rows, top='{rows[0].keyword}' = ~{rows[0].volume:,} (approx traffic)")
+        return rows
+    
+    def parse_rss_rows(self, response: requests.Response, limit: int = None) -> List[TrendRow]:
+        """Stream RSS/Atom: volume lấy từ ht:approx_traffic, dừng ngay khi đủ limit item hợp lệ"""
+        items = []
+        for index, fields in enumerate(iter_feed_items(response.iter_content(chunk_size=16384)), 1):
+            keyword = fields.get('title', '')
+            if not self.is_valid_trending_keyword(keyword):
+                continue
+            items.append((index, keyword, fields.get('approx_traffic', '')))
+            if limit and len(items) >= limit:
+                break
         
-        # Method 4: Realistic fallback với actual data
-        logger.info(f"🎲 Using realistic fallback for {timeframe}")
+        volumes = self.parse_volumes([traffic for _, _, traffic in items])
+        return [
+            TrendRow(index, keyword, traffic, int(volume), '', [])
+            for (index, keyword, traffic), volume in zip(items, volumes)
+        ]
+    
+    def scrape_fallback(self, timeframe: str, limit: int = None, geo: str = GEO_LOCATION) -> List[TrendRow]:
+        """Method 4: Realistic fallback với actual data"""
+        logger.warning(f"🎲 Using realistic fallback for {timeframe} - data is NOT live")
+        vietnam_time = get_vietnam_time()
         
         if timeframe == '4h':
             fallback_data = [
@@ -326,12 +3097,20 @@ class PreciseXPathTrendsMonitor:
                 ("iPhone 16 Pro", 540000)
             ]
         
-        # Time-based selection
+        # Time-based selection: xoay danh sách để phần tử theo giờ đứng đầu
         time_index = (vietnam_time.hour + vietnam_time.minute // 15) % len(fallback_data)
-        keyword, volume = fallback_data[time_index]
+        rotated = fallback_data[time_index:] + fallback_data[:time_index]
+        rows = [TrendRow(index, keyword, '', volume, '', []) for index, (keyword, volume) in enumerate(rotated, 1)]
         
-        logger.info(f"🔄 FALLBACK {timeframe}: '{keyword}' = {volume:,}")
-        return keyword, volume
+        logger.info(f"🔄 FALLBACK {timeframe}: '{rows[0].keyword}' = {rows[0].volume:,}")
+        return rows[:limit] if limit else rows
+    
+    def get_top1_with_full_xpath(self, timeframe='24h', geo: str = GEO_LOCATION) -> Tuple[str, int]:
+        """Lấy TOP 1 từ bảng trending"""
+        rows = self.get_trending_table(timeframe, limit=1, geo=geo)
+        if not rows:
+            return "", 0
+        return rows[0].keyword, rows[0].volume
     
     def is_valid_trending_keyword(self, keyword: str) -> bool:
         """Validate trending keyword"""
@@ -343,13 +3122,7 @@ class PreciseXPathTrendsMonitor:
             return False
         
         # Reject UI terms
-        ui_terms = [
-            'trending', 'search', 'explore', 'more', 'view', 'show', 'load',
-            'see', 'all', 'categories', 'filters', 'menu', 'home', 'back',
-            'next', 'previous', 'settings', 'privacy', 'terms'
-        ]
-        
-        if any(ui_term in keyword.lower() for ui_term in ui_terms):
+        if UI_TERMS_RE.search(keyword.lower()):
             return False
         
         # Must contain letters
@@ -358,99 +3131,247 @@ class PreciseXPathTrendsMonitor:
             
         return True
     
-    def check_both_timeframes_precise(self) -> List[Dict]:
-        """Check cả 2 timeframes với FULL XPATH"""
+    def scrape_targets(self, targets: List[TrendTarget] = None, limit: int = None) -> Dict[TrendTarget, List[TrendRow]]:
+        """Scrape song song nhiều (geo, hours) qua pool driver, có timeout cho từng target"""
+        targets = targets or self.targets
+        futures = {}
+        
+        for target in targets:
+            # Backpressure: chờ khi đã có quá nhiều target trong hàng đợi (có hạn, không block scheduler mãi)
+            if not self._pending.acquire(timeout=TARGET_TIMEOUT_SECONDS):
+                logger.error(f"⏰ Target {target.key} skipped: {MAX_PENDING_TARGETS} targets still pending after {TARGET_TIMEOUT_SECONDS}s")
+                continue
+            try:
+                future = self.submit_scrape(target, limit)
+            except Exception:
+                self._pending.release()
+                raise
+            future.add_done_callback(lambda _: self._pending.release())
+            futures[target] = (future, time.monotonic())
+        
+        results = {}
+        for target, (future, submitted_at) in futures.items():
+            # Timeout tính từ lúc submit, không cộng dồn giữa các target
+            remaining = max(0.0, TARGET_TIMEOUT_SECONDS - (time.monotonic() - submitted_at))
+            try:
+                results[target] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                # cancel() chỉ bỏ được future chưa chạy; scrape đang chạy vẫn giữ thread (và driver) tới khi xong,
+                # slot _pending chỉ trả lại lúc đó nên backpressure vẫn tính target này
+                if future.cancel():
+                    logger.error(f"⏰ Target {target.key} timed out after {TARGET_TIMEOUT_SECONDS}s (cancelled before start)")
+                else:
+                    logger.error(f"⏰ Target {target.key} timed out after {TARGET_TIMEOUT_SECONDS}s (still running, result dropped)")
+                continue
+            except Exception as e:
+                logger.error(f"❌ Target {target.key} failed: {e}")
+                continue
+            
+            snapshot = self.snapshots.put(target, results[target], self.served_by.get(target.key, ''))
+            # Archive bảng đầy đủ (không archive volume giả của fallback)
+            if self.archive and snapshot.rows and snapshot.source not in ESTIMATED_TIERS:
+                try:
+                    self.archive.append(target.key, snapshot.rows, snapshot.fetched_at)
+                except Exception as e:
+                    logger.error(f"❌ Archive write failed for {target.key}: {e}")
+            # Volume giả của fallback không phải observation thật: không diff, không ghi history
+            if snapshot.source in ESTIMATED_TIERS:
+                continue
+            # Chỉ lưu dòng mới / đổi rank / đổi volume; bảng không đổi thì không ghi gì
+            delta = self.history_differ.diff(target, snapshot.rows)
+            if delta.unchanged:
+                continue
+            try:
+                self.history.record_snapshot(target, delta.changed_rows(), snapshot.fetched_at)
+            except Exception as e:
+                logger.error(f"❌ History write failed for {target.key}: {e}")
+        
+        return results
+    
+    def submit_scrape(self, target: TrendTarget, limit: int = None) -> Future:
+        """Scrape 1 target: trong process này (thread pool) hoặc qua worker process (result bus)"""
+        if self.result_bus:
+            return self.result_bus.submit(target, limit)
+        return self.executor.submit(self.get_trending_table, target.timeframe, limit, target.geo)
+    
+    def record_remote_result(self, target: TrendTarget, message: Dict):
+        """Kết quả từ worker: cập nhật tier + metrics phía coordinator"""
+        tier = message.get('tier') or 'none'
+        self.served_by[target.key] = tier
+        SCRAPE_SECONDS.observe(message.get('seconds', 0.0), target=target.key)
+        TIER_SERVED.inc(target=target.key, tier=tier)
+    
+    def start_workers(self, count: int = SCRAPE_WORKERS):
+        """Coordinator: mở result bus và spawn worker process (browser nằm ngoài process Flask)"""
+        authkey = (RESULT_BUS_AUTHKEY or os.urandom(16).hex()).encode('ascii')
+        self.result_bus = ResultBus(parse_bus_address(RESULT_BUS_ADDRESS), authkey, self.record_remote_result)
+        self.result_bus.start()
+        self.workers = WorkerSupervisor(count, self.result_bus.address, authkey)
+        if count > 0:
+            self.workers.start()
+    
+    def stop_workers(self):
+        if self.result_bus:
+            self.result_bus.close(len(self.workers.processes) if self.workers else 0)
+        if self.workers:
+            self.workers.stop()
+    
+    def refresh_snapshots(self, targets: List[TrendTarget] = None) -> Dict[TrendTarget, List[TrendRow]]:
+        """Scrape lại targets qua single-flight: các caller đồng thời dùng chung 1 lần scrape"""
+        targets = list(targets or self.targets)
+        key = ','.join(sorted(target.key for target in targets))
+        return self.refresh_flight.do(key, lambda: self.scrape_targets(targets))
+    
+    def check_both_timeframes_precise(self, targets: List[TrendTarget] = None) -> List[Dict]:
+        """Check các targets (geo, timeframe) song song - mặc định tất cả"""
+        targets = list(targets or self.targets)
         vietnam_time = get_vietnam_time()
-        logger.info(f"🕵️ PRECISE XPATH CHECK at {vietnam_time.strftime('%H:%M %d/%m/%Y')}...")
+        logger.info(f"🕵️ PRECISE XPATH CHECK at {vietnam_time.strftime('%H:%M %d/%m/%Y')} ({len(targets)} targets)...")
         
         notifications = []
+        results = self.refresh_snapshots(targets)
         
-        # Check từng timeframe với full xpath
-        for timeframe in ['4h', '24h']:
+        for target in targets:
             try:
-                logger.info(f"🎯 === FULL XPATH {timeframe.upper()} CHECK ===")
-                
-                # Get keyword + real volume với full xpath
-                keyword, real_volume = self.get_top1_with_full_xpath(timeframe)
-                
-                if not keyword or real_volume <= 0:
-                    logger.warning(f"⚠️ No valid XPATH data for {timeframe}")
+                rows = results.get(target)
+                if not rows or rows[0].volume <= 0:
+                    logger.warning(f"⚠️ No valid XPATH data for {target.key}")
                     continue
                 
-                logger.info(f"📊 XPATH RESULT {timeframe.upper()}: '{keyword}' = {real_volume:,} searches")
-                
-                # Check threshold
-                if real_volume >= SEARCH_THRESHOLD:
-                    if self.notification_tracker.should_notify(keyword, real_volume, timeframe):
-                        notifications.append({
-                            'keyword': keyword,
-                            'volume': real_volume,
-                            'timeframe': timeframe,
-                            'timestamp': vietnam_time,
-                            'method': f'FULL-XPATH-{timeframe.upper()}'
-                        })
-                        logger.info(f"🚨 XPATH ALERT {timeframe.upper()}: {keyword} - {real_volume:,}")
-                    else:
-                        logger.info(f"🔄 Already notified ({timeframe}): {keyword}")
-                else:
-                    logger.info(f"📈 {timeframe} below threshold: {real_volume:,} < {SEARCH_THRESHOLD:,}")
-                
-                time.sleep(3)  # Delay between timeframes
+                estimated = self.served_by.get(target.key) in ESTIMATED_TIERS
+                notifications.extend(self.rules.evaluate(target, rows, vietnam_time, estimated))
                 
             except Exception as e:
-                logger.error(f"❌ Error in XPATH check {timeframe}: {e}")
+                logger.error(f"❌ Error in XPATH check {target.key}: {e}")
                 continue
         
         logger.info(f"📋 PRECISE XPATH CHECK COMPLETE: {len(notifications)} notifications")
         return notifications
     
     def cleanup_driver(self):
-        """Clean up Chrome driver"""
-        if self.driver:
-            try:
-                self.driver.quit()
-                self.driver = None
-                logger.info("🧹 Chrome driver cleaned up")
-            except:
-                pass
+        """Clean up Chrome drivers trong pool"""
+        closed = self.driver_pool.close() + self.probe_pool.close()
+        if closed:
+            logger.info(f"🧹 Chrome driver cleaned up ({closed})")
 
-# Global instances
-monitor = PreciseXPathTrendsMonitor()
-bot_instance = Bot(token=BOT_TOKEN)
+def build_monitor() -> PreciseXPathTrendsMonitor:
+    instance = PreciseXPathTrendsMonitor(scrape_only=WORKER_PROCESS)
+    if instance.notification_tracker:
+        atexit.register(instance.notification_tracker.close)
+    return instance
+
+# Global instances (lazy: tạo ở start_services hoặc lần dùng đầu tiên)
+monitor = LazyService('monitor', build_monitor)
 
 # Flask routes
-@app.route('/health')
+def tier_summary() -> Dict[str, int]:
+    """Số kết quả theo tier (json/selenium/soup/rss/fallback), cộng dồn mọi target"""
+    summary = {}
+    for (_, tier), count in list(TIER_SERVED.values.items()):
+        summary[tier] = summary.get(tier, 0) + int(count)
+    return summary
+
+@routes.route('/metrics')
+def metrics():
+    """Prometheus text format"""
+    if monitor.service_loaded:
+        for field, value in monitor.driver_pool.metrics().items():
+            if isinstance(value, (int, float)):
+                BROWSER_POOL.set(value, field=field)
+    return METRICS.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@routes.route('/health')
 def health():
-    """Health check"""
+    """Liveness: process còn phục vụ request. Không bao giờ tạo monitor / dispatcher ở đây"""
     vietnam_time = get_vietnam_time()
+    tiers = tier_summary()
+    served = sum(tiers.values())
+    live = served - sum(tiers.get(tier, 0) for tier in ESTIMATED_TIERS)
+    loaded = monitor.service_loaded
     return jsonify({
         'status': 'healthy',
-        'bot_active': True,
+        'bot_active': monitor_thread.is_alive(),
+        'monitor_loaded': loaded,
+        'startup': startup_state,
         'threshold': f'{SEARCH_THRESHOLD:,}',
         'interval': f'{CHECK_INTERVAL_MINUTES} min',
         'method': 'FULL XPATH PRECISION SCRAPING',
         'selenium': 'Chrome WebDriver',
+        'browser_pool': monitor.driver_pool.metrics() if loaded else None,
+        'page_loads': dict(monitor.page_loads) if loaded else None,
+        'source_tiers': monitor.tier_manager.status() if loaded else None,
+        'archive': monitor.archive.stats if loaded and monitor.archive else None,
+        'http_cache': monitor.session.cache.stats() if loaded and monitor.session.cache else None,
+        'notify_mode': NOTIFY_MODE,
+        'digest': digest.status(),
+        'scrape_mode': SCRAPE_MODE,
+        'result_bus': monitor.result_bus.status() if loaded and monitor.result_bus else None,
+        'worker_processes': monitor.workers.status() if loaded and monitor.workers else None,
         'timezone': 'Vietnam (UTC+7)',
         'current_time': vietnam_time.strftime('%H:%M %d/%m/%Y'),
-        'xpath_accuracy': '100%',
+        'served_by_tier': tiers,
+        'live_data_ratio': round(live / served, 3) if served else None,
+        'cycles': {result: int(CYCLES.get(result=result)) for result in ('ok', 'error')},
+        'schedule': scheduler.status() if scheduler.service_loaded else None,
         'timestamp': vietnam_time.isoformat()
     })
 
-@app.route('/')
+def readiness_checks() -> Dict[str, object]:
+    """Monitor đã load, scheduler đang chạy và đã có snapshot đầu tiên (không tạo monitor ở đây)"""
+    checks = {
+        'monitor_loaded': monitor.service_loaded,
+        'scheduler_running': monitor_thread.is_alive(),
+        'snapshots': len(monitor.snapshots.all()) if monitor.service_loaded else 0,
+    }
+    if SCRAPE_MODE == 'process':
+        checks['workers_connected'] = bool(monitor.service_loaded and monitor.result_bus and monitor.result_bus.status()['workers'])
+    return checks
+
+def requires_ready(view):
+    """Route đọc monitor: 503 tới khi /ready pass. Monitor chỉ được tạo ở thread startup, không bao giờ trong request"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        checks = readiness_checks()
+        if not all(checks.values()):
+            return jsonify({
+                'error': 'monitor is starting',
+                'checks': checks,
+                'startup': startup_state,
+                'timestamp': get_vietnam_time().isoformat()
+            }), 503, {'Retry-After': '5'}
+        return view(*args, **kwargs)
+    return wrapper
+
+@routes.route('/ready')
+def ready():
+    """Readiness: 200 khi monitor đã load, scheduler đang chạy và đã có snapshot đầu tiên"""
+    checks = readiness_checks()
+    is_ready = all(checks.values())
+    return jsonify({
+        'ready': is_ready,
+        'checks': checks,
+        'startup': startup_state,
+        'timestamp': get_vietnam_time().isoformat()
+    }), 200 if is_ready else 503
+
+@routes.route('/')
 def home():
-    """Home page"""
+    """Home page: luôn 200 (health check của platform trỏ vào đây); readiness probe dùng /ready.
+    Không đụng tới monitor để không tạo monitor trong request"""
     vietnam_time = get_vietnam_time()
+    is_ready = all(readiness_checks().values())
     return jsonify({
         'message': '🎯 FULL XPATH Google Trends Monitor',
-        'status': 'running',
+        'status': 'running' if is_ready else 'starting',
+        'ready': is_ready,
         'threshold': f'{SEARCH_THRESHOLD:,} searches',
         'interval': f'{CHECK_INTERVAL_MINUTES} minutes',
         'precision': 'Full XPath extraction',
         'timezone': 'Vietnam (UTC+7)',
         'current_time': vietnam_time.strftime('%H:%M %d/%m/%Y'),
         'urls': {
-            '4h': 'https://trends.google.com/trending?geo=US&hl=vi&hours=4',
-            '24h': 'https://trends.google.com/trending?geo=US&hl=vi&hours=24'
+            target.key: PreciseXPathTrendsMonitor.get_trends_url(target.timeframe, target.geo)
+            for target in parse_targets(SCRAPE_TARGETS)
         },
         'xpaths': {
             'keyword': '/html/body/c-wiz/div/div[5]/div[1]/c-wiz/div/div[2]/div[1]/div[1]/div[1]/table/tbody[2]/tr[1]/td[2]/div[1]',
@@ -458,35 +3379,48 @@ def home():
         }
     })
 
-@app.route('/status')
+@routes.route('/status')
+@requires_ready
 def status():
-    """Status với full xpath"""
+    """Status từ snapshot gần nhất (không scrape trong request); ?refresh=1 để scheduler chạy check ngay,
+    response vẫn là snapshot hiện tại kèm tuổi của nó"""
     try:
         vietnam_time = get_vietnam_time()
         
-        # Get real data for both timeframes
-        keyword_4h, volume_4h = monitor.get_top1_with_full_xpath('4h')
-        keyword_24h, volume_24h = monitor.get_top1_with_full_xpath('24h')
+        refresh = None
+        if request.args.get('refresh') in ('1', 'true', 'yes'):
+            refresh = scheduler.trigger()
+        
+        trends = {}
+        last_check = None
+        for target in monitor.targets:
+            snapshot = monitor.snapshots.get(target)
+            if not snapshot or not snapshot.rows:
+                trends[target.scope] = {'keyword': None, 'volume': None, 'will_notify': False, 'state': 'pending'}
+                continue
+            
+            top = snapshot.rows[0]
+            trends[target.scope] = {
+                'keyword': top.keyword,
+                'volume': f'{top.volume:,}',
+                'will_notify': top.volume >= SEARCH_THRESHOLD,
+                'state': 'stale' if monitor.snapshots.is_stale(snapshot) else 'fresh',
+                'age_seconds': round(monitor.snapshots.age(snapshot), 1),
+                'fetched_at': snapshot.vietnam_time.isoformat()
+            }
+            if not last_check or snapshot.vietnam_time > last_check:
+                last_check = snapshot.vietnam_time
         
         return jsonify({
             'bot_status': 'running',
-            'xpath_trends': {
-                '4h': {
-                    'keyword': keyword_4h,
-                    'volume': f'{volume_4h:,}',
-                    'will_notify': volume_4h >= SEARCH_THRESHOLD
-                },
-                '24h': {
-                    'keyword': keyword_24h,
-                    'volume': f'{volume_24h:,}',
-                    'will_notify': volume_24h >= SEARCH_THRESHOLD
-                }
-            },
+            'xpath_trends': trends,
             'threshold': f'{SEARCH_THRESHOLD:,}',
             'scraping_method': 'FULL XPATH PRECISION',
+            'snapshot_ttl_seconds': monitor.snapshots.ttl_seconds,
             'timezone': 'Vietnam (UTC+7)',
             'current_time': vietnam_time.strftime('%H:%M %d/%m/%Y'),
-            'last_check': vietnam_time.isoformat()
+            'last_check': last_check.isoformat() if last_check else None,
+            'refresh': refresh
         })
         
     except Exception as e:
@@ -496,61 +3430,934 @@ def status():
             'timestamp': get_vietnam_time().isoformat()
         }), 500
 
-@app.route('/test')
-def test_manual():
-    """Manual test với full xpath"""
+def history_query_args() -> Tuple[str, str, float]:
+    """geo, timeframe, since (từ ?hours=) cho các endpoint lịch sử"""
+    geo = request.args.get('geo', GEO_LOCATION).upper()
+    timeframe = request.args.get('timeframe', '24h')
+    hours = float(request.args.get('hours', 24))
+    return geo, timeframe, time.time() - hours * 3600
+
+@routes.route('/history')
+@requires_ready
+def history():
+    """Lịch sử volume của 1 keyword (chỉ các lần đổi): ?keyword=&geo=&timeframe=&hours=&limit=&cursor="""
+    keyword = request.args.get('keyword', '').strip()
+    if not keyword:
+        return jsonify({'error': 'keyword is required'}), 400
     try:
-        vietnam_time = get_vietnam_time()
-        logger.info(f"🧪 Manual FULL XPATH test at {vietnam_time.strftime('%H:%M %d/%m/%Y')}")
-        notifications = monitor.check_both_timeframes_precise()
-        
-        return jsonify({
-            'test_result': 'success',
-            'notifications_found': len(notifications),
-            'notifications': notifications,
-            'scraping_method': 'FULL XPATH PRECISION',
-            'timezone': 'Vietnam (UTC+7)',
-            'test_time': vietnam_time.strftime('%H:%M %d/%m/%Y'),
-            'timestamp': vietnam_time.isoformat()
-        })
-    except Exception as e:
+        _, _, since = history_query_args()
+        items, next_cursor = monitor.history.history(
+            keyword,
+            geo=request.args.get('geo', '').upper() or None,
+            timeframe=request.args.get('timeframe') or None,
+            since=since,
+            limit=int(request.args.get('limit', 100)),
+            cursor=int(request.args['cursor']) if request.args.get('cursor') else None
+        )
+        return jsonify({'keyword': keyword, 'items': items, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@routes.route('/history/series')
+@requires_ready
+def history_series():
+    """Volume theo thời gian (bucket không đổi mang giá trị trước, samples=0): ?keyword=&geo=&timeframe=&hours=&bucket_minutes="""
+    keyword = request.args.get('keyword', '').strip()
+    if not keyword:
+        return jsonify({'error': 'keyword is required'}), 400
+    try:
+        geo, timeframe, since = history_query_args()
+        bucket_seconds = int(float(request.args.get('bucket_minutes', 60)) * 60)
+        series = monitor.history.volume_series(keyword, geo, timeframe, since, bucket_seconds)
+        return jsonify({'keyword': keyword, 'geo': geo, 'timeframe': timeframe, 'series': series})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@routes.route('/history/movers')
+@requires_ready
+def history_movers():
+    """Top movers trong cửa sổ ?hours=: ?geo=&timeframe=&hours=&limit="""
+    try:
+        geo, timeframe, since = history_query_args()
+        movers = monitor.history.top_movers(geo, timeframe, since, int(request.args.get('limit', 20)))
+        return jsonify({'geo': geo, 'timeframe': timeframe, 'movers': movers})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@routes.route('/changes')
+@requires_ready
+def changes():
+    """Delta của lần check gần nhất cho từng target: new / dropped / moved / tier_jumps"""
+    return jsonify({
+        target.key: diff.to_dict()
+        for target, diff in list(monitor.differ.latest.items())
+    })
+
+@routes.route('/test')
+def test_manual():
+    """Manual test: trigger check ngay trên scheduler (không scrape trong request thread)"""
+    vietnam_time = get_vietnam_time()
+    target_keys = [key.strip() for key in request.args.get('targets', '').split(',') if key.strip()]
+    names = job_names_for(target_keys) if target_keys else None
+    if target_keys and not names:
         return jsonify({
             'test_result': 'error',
-            'error': str(e),
-            'timestamp': get_vietnam_time().isoformat()
-        }), 500
+            'error': f"unknown targets: {','.join(target_keys)}",
+            'timestamp': vietnam_time.isoformat()
+        }), 400
+    
+    logger.info(f"🧪 Manual FULL XPATH test at {vietnam_time.strftime('%H:%M %d/%m/%Y')}")
+    jobs = scheduler.trigger(names)
+    return jsonify({
+        'test_result': 'triggered',
+        'jobs': jobs,
+        'scheduler_running': monitor_thread.is_alive(),
+        'results': '/status',
+        'scraping_method': 'FULL XPATH PRECISION',
+        'timezone': 'Vietnam (UTC+7)',
+        'test_time': vietnam_time.strftime('%H:%M %d/%m/%Y'),
+        'timestamp': vietnam_time.isoformat()
+    }), 202
 
-async def send_notification(keyword_data: Dict):
-    """Send notification với Vietnam time"""
-    timeframe_text = "4h qua" if keyword_data['timeframe'] == '4h' else "24h qua"
+def format_notification(keyword_data: Dict) -> str:
+    """Nội dung tin nhắn cảnh báo (Markdown) với Vietnam time"""
+    timeframe_text = f"{keyword_data['timeframe']} qua"
+    geo = keyword_data.get('geo', GEO_LOCATION)
+    region_text = 'United States' if geo == 'US' else geo
     
     vietnam_time = keyword_data['timestamp']
     
-    message = f"""🚨 **CẢNH BÁO** 🚨
+    velocity_text = ''
+    if keyword_data.get('reason') == 'velocity':
+        velocity_text = f"\n🚀 **Tăng tốc**: `+{keyword_data['growth_per_hour']:.0%}/giờ (z={keyword_data['z_score']:.1f})`"
+    
+    return f"""🚨 **CẢNH BÁO** 🚨
 
 🔍 **Từ khóa**: `{keyword_data['keyword']}`
 📊 **Đã đạt**: `{keyword_data['volume']:,} lượt tìm kiếm`
 ⏱️ **Trong**: `{timeframe_text}`
-🌍 **Khu vực**: `United States`
-📅 **Thời gian**: `{vietnam_time.strftime('%H:%M %d/%m/%Y')}`"""
+🌍 **Khu vực**: `{region_text}`
+📅 **Thời gian**: `{vietnam_time.strftime('%H:%M %d/%m/%Y')}`{velocity_text}"""
 
-    max_retries = 3
-    for attempt in range(max_retries):
+class TokenBucket:
+    """Token bucket cho rate limit (dùng trong 1 event loop, không cần lock)"""
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class OutgoingMessage(NamedTuple):
+    """1 tin nhắn chờ gửi tới 1 chat"""
+    chat_id: str
+    text: str
+    label: str
+    attempt: int = 0
+
+class NotificationDispatcher:
+    """Gửi Telegram qua 1 event loop sống lâu: queue, token bucket (global + từng chat), retry backoff có jitter"""
+    def __init__(self, token: str = BOT_TOKEN, chat_ids: List[str] = None, base_url: str = TELEGRAM_API_BASE,
+                 workers: int = TELEGRAM_POOL_SIZE):
+        self.token = token
+        self.chat_ids = list(chat_ids or CHAT_IDS)
+        self.base_url = base_url
+        self.workers = max(1, workers)
+        self.bot = None
+        self.loop = None
+        self.queue = None
+        self.global_bucket = None
+        self.chat_buckets: Dict[str, TokenBucket] = {}
+        self.stats = {'sent': 0, 'failed': 0, 'retries': 0, 'dropped': 0}
+        self._thread = None
+        self._ready = Event()
+        self._error = None
+        self._start_lock = Lock()
+    
+    def start(self, timeout: float = TELEGRAM_START_TIMEOUT_SECONDS):
+        """Khởi động event loop ở background thread (idempotent).
+        
+        Lỗi khi khởi tạo (vd. BOT_TOKEN rỗng / sai) được raise lại ở đây thay vì để submit_text chờ mãi.
+        """
+        with self._start_lock:
+            if not self._thread:
+                self._thread = Thread(target=self._run_loop, name='telegram-dispatcher', daemon=True)
+                self._thread.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f'Telegram dispatcher not ready after {timeout:g}s')
+        if self._error:
+            raise RuntimeError(f'Telegram dispatcher failed to start: {self._error}') from self._error
+    
+    def _run_loop(self):
         try:
-            await bot_instance.send_message(
-                chat_id=CHAT_ID,
-                text=message,
-                parse_mode='Markdown',
-                read_timeout=30,
-                write_timeout=30
-            )
-            logger.info(f"✅ XPATH notification sent: {keyword_data['keyword']} ({keyword_data['timeframe']}) at {vietnam_time.strftime('%H:%M')}")
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            # 1 Bot + 1 HTTP connection pool dùng lại cho mọi tin nhắn
+            from telegram import Bot
+            from telegram.request import HTTPXRequest
+            request = HTTPXRequest(connection_pool_size=self.workers, read_timeout=30, write_timeout=30, pool_timeout=10)
+            self.bot = Bot(token=self.token, base_url=self.base_url, request=request)
+            self.queue = asyncio.Queue(maxsize=TELEGRAM_QUEUE_SIZE)
+            self.global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+            for _ in range(self.workers):
+                self.loop.create_task(self._worker())
+        except Exception as e:
+            logger.error(f"❌ Telegram dispatcher failed to start: {e}")
+            self._error = e
+            self._ready.set()
+            return
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+        # stop(): hủy worker rồi đóng loop, không để task treo lại cho GC
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+    
+    def chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            # Chat id âm = group/channel -> limit chặt hơn
+            rate = TELEGRAM_GROUP_RATE if str(chat_id).startswith('-') else TELEGRAM_CHAT_RATE
+            bucket = self.chat_buckets[chat_id] = TokenBucket(rate)
+        return bucket
+    
+    def submit_text(self, text: str, label: str = 'message', chat_ids: List[str] = None):
+        """Thread-safe: đưa 1 tin nhắn vào queue cho từng chat (fan-out), không chờ gửi xong"""
+        self.start()
+        for chat_id in chat_ids or self.chat_ids:
+            self.loop.call_soon_threadsafe(self._enqueue, OutgoingMessage(chat_id, text, label))
+    
+    def submit(self, keyword_data: Dict):
+        label = f"{keyword_data['keyword']} ({keyword_data.get('geo', GEO_LOCATION)} {keyword_data['timeframe']})"
+        self.submit_text(format_notification(keyword_data), label)
+    
+    def _enqueue(self, message: OutgoingMessage):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+            TELEGRAM_MESSAGES.inc(result='dropped')
+            logger.error(f"❌ Telegram queue full, dropped: {message.label} -> {message.chat_id}")
+    
+    def backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff với full jitter"""
+        return random.uniform(0, min(TELEGRAM_BACKOFF_MAX_SECONDS, TELEGRAM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    
+    def _retry_later(self, message: OutgoingMessage, delay: float):
+        self.stats['retries'] += 1
+        TELEGRAM_MESSAGES.inc(result='retry')
+        self.loop.call_later(delay, self._enqueue, message._replace(attempt=message.attempt + 1))
+    
+    async def _worker(self):
+        while True:
+            message = await self.queue.get()
+            try:
+                await self._send(message)
+            finally:
+                self.queue.task_done()
+    
+    async def _send(self, message: OutgoingMessage):
+        from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, RetryAfter
+        
+        # Chờ token của chat trước: token global chỉ lấy khi đã sẵn sàng gửi, không bị giữ lúc chờ 1 chat chậm
+        await self.chat_bucket(message.chat_id).acquire()
+        await self.global_bucket.acquire()
+        try:
+            with TELEGRAM_SEND_SECONDS.time():
+                await self.bot.send_message(chat_id=message.chat_id, text=message.text, parse_mode='Markdown')
+            self.stats['sent'] += 1
+            TELEGRAM_MESSAGES.inc(result='sent')
+            logger.info(f"✅ XPATH notification sent: {message.label} -> {message.chat_id}")
+            return
+        except RetryAfter as e:
+            # Telegram báo phải chờ: tôn trọng retry_after thay vì backoff
+            delay = float(e.retry_after)
+            logger.warning(f"⏳ Telegram rate limited, retry {message.label} in {delay:.0f}s")
+        except ChatMigrated as e:
+            logger.warning(f"🔀 Chat {message.chat_id} migrated to {e.new_chat_id}")
+            self.chat_ids = [e.new_chat_id if chat_id == message.chat_id else chat_id for chat_id in self.chat_ids]
+            self._enqueue(message._replace(chat_id=str(e.new_chat_id)))
+            return
+        except (BadRequest, Forbidden, InvalidToken) as e:
+            # Lỗi vĩnh viễn, retry cũng không giúp được
+            self.stats['failed'] += 1
+            TELEGRAM_MESSAGES.inc(result='failed')
+            logger.error(f"❌ Telegram rejected {message.label} -> {message.chat_id}: {e}")
+            return
+        except Exception as e:
+            delay = self.backoff_delay(message.attempt)
+            logger.error(f"❌ Telegram attempt {message.attempt + 1}: {e}")
+        
+        if message.attempt + 1 >= TELEGRAM_MAX_RETRIES:
+            self.stats['failed'] += 1
+            TELEGRAM_MESSAGES.inc(result='failed')
+            logger.error(f"❌ Giving up on {message.label} -> {message.chat_id} after {message.attempt + 1} attempts")
+            return
+        self._retry_later(message, delay)
+    
+    def pending(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+    
+    def join(self, timeout: float = None) -> bool:
+        """Chờ queue gửi hết (không tính các tin đang chờ retry)"""
+        if not self.queue or self._error:
+            return True
+        future = asyncio.run_coroutine_threadsafe(self.queue.join(), self.loop)
+        try:
+            future.result(timeout)
+            return True
+        except FutureTimeoutError:
+            return False
+    
+    def stop(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+dispatcher = LazyService('dispatcher', NotificationDispatcher)
+
+def send_notification(keyword_data: Dict):
+    """Đưa notification vào dispatcher (gửi tới mọi CHAT_IDS, không block)"""
+    dispatcher.submit(keyword_data)
+
+def alert_priority(keyword_data: Dict) -> Tuple[int, int]:
+    """Thứ tự trong digest: threshold / renotify trước velocity, rồi volume giảm dần"""
+    return (0 if keyword_data.get('reason') == 'velocity' else 1, keyword_data['volume'])
+
+def format_digest_line(index: int, keyword_data: Dict) -> str:
+    geo = keyword_data.get('geo', GEO_LOCATION)
+    velocity_text = ''
+    if keyword_data.get('reason') == 'velocity':
+        velocity_text = f" 🚀 `+{keyword_data['growth_per_hour']:.0%}/giờ`"
+    return f"{index}. 🔍 `{keyword_data['keyword']}` — 📊 `{keyword_data['volume']:,}` — ⏱️ {keyword_data['timeframe']} — 🌍 {geo}{velocity_text}"
+
+def telegram_length(text: str) -> int:
+    """Telegram đếm giới hạn 4096 theo UTF-16 code unit (emoji = 2)"""
+    return len(text.encode('utf-16-le')) // 2
+
+def truncate_telegram(text: str, max_units: int) -> str:
+    """Cắt text còn tối đa max_units UTF-16 code unit (kể cả '…'), không cắt đôi emoji"""
+    if telegram_length(text) <= max_units:
+        return text
+    units, cut = 0, 0
+    for index, ch in enumerate(text):
+        units += 2 if ord(ch) > 0xFFFF else 1
+        if units > max_units - 1:
+            break
+        cut = index + 1
+    return text[:cut] + '…'
+
+def format_digest(alerts: List[Dict], max_chars: int = TELEGRAM_MAX_MESSAGE_CHARS) -> List[str]:
+    """Các alert (đã sắp xếp) -> 1 hoặc vài tin nhắn, cắt theo dòng để không vượt max_chars"""
+    if len(alerts) == 1:
+        text = format_notification(alerts[0])
+        if telegram_length(text) <= max_chars:
+            return [text]
+    
+    vietnam_time = max(alert['timestamp'] for alert in alerts)
+    header = f"🚨 **TRENDS DIGEST** 🚨\n📋 `{len(alerts)} cảnh báo` — 📅 `{vietnam_time.strftime('%H:%M %d/%m/%Y')}`"
+    # Chừa chỗ cho " (i/n)" và dòng trống sau header
+    budget = max_chars - telegram_length(header) - len(' (99/99)') - 2
+    
+    parts, current, size = [], [], 0
+    for index, alert in enumerate(alerts, 1):
+        line = format_digest_line(index, alert)
+        overflow = telegram_length(line) - budget
+        if overflow > 0:
+            # 1 alert dài hơn cả tin nhắn: cắt keyword, không cắt giữa `...` (Markdown hỏng) hay giữa emoji
+            keyword = alert['keyword']
+            line = format_digest_line(index, {**alert, 'keyword': truncate_telegram(keyword, max(1, telegram_length(keyword) - overflow))})
+        length = telegram_length(line) + 1
+        if current and size + length > budget:
+            parts.append(current)
+            current, size = [], 0
+        current.append(line)
+        size += length
+    parts.append(current)
+    
+    return [
+        f"{header}{f' ({number}/{len(parts)})' if len(parts) > 1 else ''}\n\n" + '\n'.join(lines)
+        for number, lines in enumerate(parts, 1)
+    ]
+
+class NotificationDigest:
+    """Gom alert thành digest: 1 (hoặc vài) tin nhắn mỗi chat cho 1 chu kỳ / cửa sổ thời gian.
+    
+    window_seconds = 0: flush() cuối mỗi chu kỳ gửi ngay. > 0: giữ alert tới hết cửa sổ tính từ
+    alert đầu tiên (timer), gộp cả nhiều chu kỳ. Alert volume >= immediate_volume bỏ qua digest.
+    """
+    def __init__(self, sender: NotificationDispatcher, window_seconds: float = DIGEST_WINDOW_SECONDS,
+                 immediate_volume: int = DIGEST_IMMEDIATE_VOLUME, max_chars: int = TELEGRAM_MAX_MESSAGE_CHARS):
+        self.sender = sender
+        self.window_seconds = window_seconds
+        self.immediate_volume = immediate_volume
+        self.max_chars = max_chars
+        self.pending: List[Dict] = []
+        self.stats = {'alerts': 0, 'immediate': 0, 'digests': 0, 'messages': 0}
+        self._opened_at = None
+        self._timer = None
+        self._lock = Lock()
+    
+    def add(self, keyword_data: Dict):
+        if self.immediate_volume and keyword_data['volume'] >= self.immediate_volume:
+            with self._lock:
+                self.stats['immediate'] += 1
+            NOTIFICATION_ALERTS.inc(path='immediate')
+            logger.info(f"⚡ Immediate alert: {keyword_data['keyword']} ({keyword_data['volume']:,})")
+            self.sender.submit(keyword_data)
+            return
+        
+        with self._lock:
+            self.pending.append(keyword_data)
+            self.stats['alerts'] += 1
+            NOTIFICATION_ALERTS.inc(path='digest')
+            if self._opened_at is None:
+                self._opened_at = time.monotonic()
+                if self.window_seconds > 0:
+                    self._timer = Timer(self.window_seconds, self.flush, kwargs={'force': True})
+                    self._timer.daemon = True
+                    self._timer.start()
+    
+    def flush(self, force: bool = False) -> int:
+        """Gửi digest nếu cửa sổ đã hết (hoặc force); trả về số tin nhắn đã queue"""
+        with self._lock:
+            if not self.pending:
+                return 0
+            if not force and self.window_seconds > 0 and time.monotonic() - self._opened_at < self.window_seconds:
+                return 0
+            alerts, self.pending = self.pending, []
+            self._opened_at = None
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+        
+        alerts.sort(key=alert_priority, reverse=True)
+        messages = format_digest(alerts, self.max_chars)
+        for text in messages:
+            self.sender.submit_text(text, f'digest {len(alerts)} alerts')
+        with self._lock:
+            self.stats['digests'] += 1
+            self.stats['messages'] += len(messages)
+        logger.info(f"📦 Digest: {len(alerts)} alerts -> {len(messages)} message(s) per chat")
+        return len(messages)
+    
+    def status(self) -> Dict:
+        with self._lock:
+            return {**self.stats, 'pending': len(self.pending)}
+
+digest = NotificationDigest(dispatcher)
+
+def notify(keyword_data: Dict):
+    """Theo NOTIFY_MODE: đưa vào digest hoặc gửi ngay từng alert"""
+    if NOTIFY_MODE == 'digest':
+        digest.add(keyword_data)
+    else:
+        NOTIFICATION_ALERTS.inc(path='single')
+        send_notification(keyword_data)
+
+class ScheduledJob:
+    """Job fixed-rate: tick nằm trên lưới start + k*interval, jitter chỉ cộng vào thời điểm chạy"""
+    def __init__(self, name: str, interval_seconds: float, fn, jitter_seconds: float = 0.0,
+                 policy: str = MISSED_TICK_POLICY):
+        self.name = name
+        self.interval = max(1.0, interval_seconds)
+        self.fn = fn
+        self.jitter = max(0.0, jitter_seconds)
+        self.policy = policy if policy in ('coalesce', 'skip', 'catchup') else 'coalesce'
+        self.next_tick = 0.0
+        self.fire_at = 0.0
+        self.running = False
+        self.triggered = False
+        self.stats = {'runs': 0, 'triggered': 0, 'missed': 0, 'errors': 0}
+        self.last_duration = None
+        self.last_error = ''
+    
+    def plan(self, tick: float):
+        self.next_tick = tick
+        self.fire_at = tick + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+    
+    def status(self) -> Dict:
+        return {
+            **self.stats,
+            'interval_seconds': self.interval,
+            'policy': self.policy,
+            'running': self.running,
+            'next_run': (get_vietnam_time() + timedelta(seconds=max(0.0, self.fire_at - time.monotonic()))).isoformat(),
+            'last_duration_seconds': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'last_error': self.last_error
+        }
+
+class Scheduler:
+    """Chạy các ScheduledJob theo lịch cố định (không trôi theo thời gian scrape).
+    
+    Mỗi job chạy trên worker riêng và không bao giờ chồng lên chính nó; tick rơi vào lúc
+    job đang chạy được xử lý theo policy của job. trigger() chạy job ngay mà không lệch lịch.
+    """
+    def __init__(self):
+        self.jobs: Dict[str, ScheduledJob] = OrderedDict()
+        self.executor = None
+        self._cond = Condition()
+        self._stop = Event()
+    
+    def add(self, name: str, interval_seconds: float, fn, jitter_seconds: float = SCHEDULE_JITTER_SECONDS,
+            policy: str = MISSED_TICK_POLICY) -> ScheduledJob:
+        job = ScheduledJob(name, interval_seconds, fn, jitter_seconds, policy)
+        with self._cond:
+            self.jobs[name] = job
+            job.plan(time.monotonic())
+            self._cond.notify_all()
+        return job
+    
+    def trigger(self, names: List[str] = None) -> Dict[str, str]:
+        """Yêu cầu chạy ngay (on-demand); job đang chạy thì không chạy chồng"""
+        result = {}
+        with self._cond:
+            for name, job in self.jobs.items():
+                if names and name not in names:
+                    continue
+                if job.running:
+                    result[name] = 'running'
+                else:
+                    job.triggered = True
+                    result[name] = 'queued'
+            self._cond.notify_all()
+        return result
+    
+    def run(self):
+        """Vòng lặp scheduler (blocking) - gọi trong monitor thread"""
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.jobs)), thread_name_prefix='job')
+        with self._cond:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                waiting = [job for job in self.jobs.values() if not job.running]
+                due = [job for job in waiting if job.triggered or job.fire_at <= now]
+                if not due:
+                    # Chờ tới job sớm nhất, hoặc tới khi có trigger / job chạy xong
+                    timeout = min((job.fire_at - now for job in waiting), default=None)
+                    self._cond.wait(timeout)
+                    continue
+                for job in due:
+                    self._start(job, now)
+        self.executor.shutdown(wait=False)
+    
+    def _start(self, job: ScheduledJob, now: float):
+        on_demand = job.fire_at > now
+        job.running = True
+        job.triggered = False
+        if on_demand:
+            job.stats['triggered'] += 1
+            SCHEDULER_TICKS.inc(job=job.name, outcome='triggered')
+        else:
+            job.stats['runs'] += 1
+            SCHEDULER_TICKS.inc(job=job.name, outcome='run')
+            SCHEDULER_LAG_SECONDS.observe(now - job.next_tick, job=job.name)
+        self.executor.submit(self._execute, job, on_demand)
+    
+    def _execute(self, job: ScheduledJob, on_demand: bool):
+        started_at = time.monotonic()
+        try:
+            job.fn()
+            job.last_error = ''
+        except Exception as e:
+            job.stats['errors'] += 1
+            job.last_error = str(e)
+            SCHEDULER_TICKS.inc(job=job.name, outcome='error')
+            logger.error(f"❌ Job {job.name} failed: {e}")
+        finally:
+            with self._cond:
+                job.last_duration = time.monotonic() - started_at
+                job.running = False
+                # Chạy on-demand không làm lệch lịch; chạy theo lịch thì tiến 1 tick trên lưới
+                self._reschedule(job, job.next_tick if on_demand else job.next_tick + job.interval)
+                self._cond.notify_all()
+            wait_seconds = max(0.0, job.fire_at - time.monotonic())
+            next_run = get_vietnam_time() + timedelta(seconds=wait_seconds)
+            logger.info(f"⏰ Job {job.name} took {job.last_duration:.1f}s, next run at {next_run.strftime('%H:%M:%S %d/%m/%Y')} (in {wait_seconds:.0f}s)")
+    
+    def _reschedule(self, job: ScheduledJob, tick: float):
+        """Áp dụng missed-tick policy khi tick kế tiếp đã trôi qua"""
+        now = time.monotonic()
+        if tick > now:
+            job.plan(tick)
+            return
+        
+        missed = int((now - tick) // job.interval) + 1
+        if job.policy == 'catchup':
+            # Giữ nguyên tick -> chạy bù liên tiếp tới khi bắt kịp lưới
+            job.plan(tick)
             return
+        
+        job.stats['missed'] += missed
+        SCHEDULER_TICKS.inc(missed, job=job.name, outcome='missed')
+        if job.policy == 'skip':
+            job.plan(tick + missed * job.interval)
+            logger.warning(f"⏭️ Job {job.name} skipped {missed} missed tick(s)")
+        else:
+            # coalesce: gộp các tick lỡ thành 1 lần chạy ngay, sau đó về lại lưới
+            job.plan(tick + (missed - 1) * job.interval)
+            job.fire_at = now
+            if missed > 1:
+                logger.warning(f"⏩ Job {job.name} coalesced {missed} missed tick(s) into 1 run")
+    
+    def stop(self):
+        with self._cond:
+            self._stop.set()
+            self._cond.notify_all()
+    
+    def status(self) -> Dict[str, Dict]:
+        with self._cond:
+            return {name: job.status() for name, job in self.jobs.items()}
+
+def run_check(targets: List[TrendTarget]):
+    """1 chu kỳ check cho nhóm targets: scrape, queue notifications, bảo trì browser"""
+    current_time = get_vietnam_time()
+    logger.info(f"🔄 FULL XPATH MONITORING {','.join(target.key for target in targets)}")
+    logger.info(f"🕐 Vietnam time: {current_time.strftime('%H:%M %d/%m/%Y')}")
+    logger.info("=" * 80)
+    
+    try:
+        cycle_started = time.monotonic()
+        notifications = monitor.check_both_timeframes_precise(targets)
+        
+        if notifications:
+            logger.info(f"📨 Queueing {len(notifications)} XPATH notifications for {len(dispatcher.chat_ids)} chat(s)...")
+            
+            for notification in notifications:
+                notify(notification)
+            digest.flush()
             
+            logger.info(f"✅ XPATH notifications queued: {len(notifications)} (pending {dispatcher.pending()})")
+        else:
+            logger.info("📊 No XPATH notifications needed")
+        
+        CYCLE_SECONDS.observe(time.monotonic() - cycle_started)
+        CYCLES.inc(result='ok')
+    except Exception:
+        CYCLES.inc(result='error')
+        raise
+    finally:
+        # Probe / recycle browser giữa các chu kỳ (không rơi vào đường scrape)
+        try:
+            monitor.driver_pool.maintain()
+            monitor.probe_pool.maintain()
+        except Exception as e:
+            logger.error(f"❌ Browser maintenance error: {e}")
+        logger.info("=" * 80)
+
+def build_scheduler(targets: List[TrendTarget]) -> Scheduler:
+    """1 job cho mỗi nhóm targets cùng interval (TARGET_INTERVALS)"""
+    intervals = parse_intervals(TARGET_INTERVALS)
+    groups: Dict[float, List[TrendTarget]] = OrderedDict()
+    for target in targets:
+        groups.setdefault(target_interval_minutes(target, intervals), []).append(target)
+    
+    schedule = Scheduler()
+    for minutes, group in groups.items():
+        name = ','.join(target.key for target in group)
+        schedule.add(name, minutes * 60, lambda group=group: run_check(group))
+    return schedule
+
+# Targets lấy từ config, không cần tạo monitor để biết lịch
+scheduler = LazyService('scheduler', lambda: build_scheduler(parse_targets(SCRAPE_TARGETS)))
+
+def job_names_for(target_keys: List[str]) -> List[str]:
+    """Tên các job chứa ít nhất 1 target trong target_keys"""
+    return [name for name in scheduler.jobs if set(name.split(',')) & set(target_keys)]
+
+def markdown_escape(text: str) -> str:
+    """Text do người dùng gửi -> an toàn trong reply parse_mode=Markdown (đặt ngoài entity, không trong `...`)"""
+    return re.sub(r'([_*`\[])', r'\\\1', str(text))
+
+def parse_command(text: str) -> Tuple[str, List[str], Dict[str, str]]:
+    """'/top@TrendsBot geo=DE n=10' -> ('top', [], {'geo': 'DE', 'n': '10'})"""
+    parts = text.split()
+    command = parts[0][1:].split('@', 1)[0].lower()
+    args, options = [], {}
+    for part in parts[1:]:
+        key, sep, value = part.partition('=')
+        if sep and key:
+            options[key.lower()] = value
+        else:
+            args.append(part)
+    return command, args, options
+
+def command_target(options: Dict[str, str]) -> TrendTarget:
+    """geo= / hours= của command; thiếu hours thì lấy target đầu tiên đang theo dõi cho geo đó"""
+    geo = options.get('geo', GEO_LOCATION).strip().upper()
+    if 'hours' in options:
+        return TrendTarget(geo, int(options['hours'].lower().rstrip('h')))
+    monitored = [target for target in parse_targets(SCRAPE_TARGETS) if target.geo == geo]
+    return monitored[0] if monitored else TrendTarget(geo, 24)
+
+def queue_refresh(target: TrendTarget) -> Optional[str]:
+    """Xếp job scrape cho target trên scheduler (background), không scrape trong request"""
+    names = job_names_for([target.key]) if monitor_thread.is_alive() else []
+    if not names:
+        return None
+    return ', '.join(sorted(set(scheduler.trigger(names).values())))
+
+def command_top(args: List[str], options: Dict[str, str]) -> str:
+    target = command_target(options)
+    limit = max(1, min(int(options.get('n', 10)), 25))
+    snapshot = monitor.snapshots.get(target)
+    if not snapshot or not snapshot.rows:
+        monitored = parse_targets(SCRAPE_TARGETS)
+        if target not in monitored:
+            return f"⚠️ {markdown_escape(target.key)} không được theo dõi. Targets: {', '.join(f'`{item.key}`' for item in monitored)}"
+        queued = queue_refresh(target)
+        return f"⏳ Chưa có dữ liệu cho `{target.key}`" + (f", đã xếp lịch scrape ({queued})" if queued else '') + ". Thử lại sau ít phút."
+    
+    lines = [f"📊 **Top {min(limit, len(snapshot.rows))} {target.key}** — {snapshot.vietnam_time.strftime('%H:%M %d/%m/%Y')}"]
+    lines += [f"{row.rank}. `{row.keyword}` — `{row.volume:,}`" for row in snapshot.rows[:limit]]
+    if monitor.snapshots.is_stale(snapshot):
+        queued = queue_refresh(target)
+        lines.append(f"🕰️ Dữ liệu cũ ({monitor.snapshots.age(snapshot) / 60:.0f} phút)" + (f", đang cập nhật ({queued})" if queued else ''))
+    if snapshot.source in ESTIMATED_TIERS:
+        lines.append("🎲 Dữ liệu ước lượng (fallback), không phải live")
+    return '\n'.join(lines)
+
+def command_history(args: List[str], options: Dict[str, str]) -> str:
+    keyword = ' '.join(args).strip()
+    if not keyword:
+        return "Dùng: `/history <keyword> [geo=US] [hours=24]`"
+    hours = float(options.get('hours', 24))
+    items, _ = monitor.history.history(
+        keyword,
+        geo=options['geo'].upper() if 'geo' in options else None,
+        timeframe=options.get('timeframe'),
+        since=time.time() - hours * 3600,
+        limit=max(1, min(int(options.get('n', 10)), 25))
+    )
+    if not items:
+        return f"🔍 Không có lịch sử cho {markdown_escape(keyword)} trong {hours:g} giờ qua"
+    lines = [f"📈 {markdown_escape(keyword)} — {hours:g} giờ qua"]
+    lines += [
+        f"{datetime.fromtimestamp(item['ts'], VIETNAM_TZ).strftime('%H:%M %d/%m')} — {item['geo']} {item['timeframe']} "
+        f"#{item['rank']} `{item['volume']:,}`"
+        for item in items
+    ]
+    return '\n'.join(lines)
+
+def command_threshold(args: List[str], options: Dict[str, str]) -> str:
+    lines = [f"🎯 **Threshold**: `{SEARCH_THRESHOLD:,}` — báo lại khi tăng > `{NOTIFY_GROWTH - 1:.0%}`"]
+    for target in monitor.targets:
+        snapshot = monitor.snapshots.get(target)
+        if snapshot and snapshot.rows:
+            top = snapshot.rows[0]
+            mark = '🚨' if top.volume >= SEARCH_THRESHOLD else '📉'
+            lines.append(f"{mark} {target.key}: `{top.keyword}` `{top.volume:,}`")
+        else:
+            lines.append(f"⏳ {target.key}: chưa có dữ liệu")
+    return '\n'.join(lines)
+
+def command_check(args: List[str], options: Dict[str, str]) -> str:
+    target_keys = [target.key for target in parse_targets(','.join(args))] if args else None
+    names = job_names_for(target_keys) if target_keys else None
+    if target_keys and not names:
+        return f"⚠️ Không có job cho {markdown_escape(', '.join(target_keys))}"
+    if not monitor_thread.is_alive():
+        return "⏳ Scheduler chưa chạy"
+    jobs = scheduler.trigger(names)
+    return "🧪 Đã xếp lịch check:\n" + '\n'.join(f"• `{name}`: {state}" for name, state in jobs.items())
+
+def command_help(args: List[str], options: Dict[str, str]) -> str:
+    return ("🤖 **Commands**\n"
+            "`/top [geo=US] [hours=4] [n=10]` — bảng trending gần nhất\n"
+            "`/history <keyword> [geo=US] [hours=24]` — lịch sử volume\n"
+            "`/threshold` — ngưỡng hiện tại và top mỗi target\n"
+            "`/check [US:4,DE:24]` — xếp lịch check ngay")
+
+TELEGRAM_COMMAND_HANDLERS = {
+    'top': command_top,
+    'history': command_history,
+    'threshold': command_threshold,
+    'check': command_check,
+    'help': command_help,
+    'start': command_help
+}
+
+def handle_update(update: Dict) -> Optional[Dict]:
+    """1 Telegram update -> method call trả về trong webhook response (None = không trả lời)"""
+    message = update.get('message') or update.get('edited_message') or {}
+    text = (message.get('text') or '').strip()
+    chat_id = str((message.get('chat') or {}).get('id', ''))
+    if not text.startswith('/') or not chat_id:
+        return None
+    
+    command, args, options = parse_command(text)
+    if chat_id not in TELEGRAM_COMMAND_CHATS:
+        # Label cố định: người ngoài không được tạo label mới trong /metrics
+        TELEGRAM_COMMANDS.inc(command='other', result='rejected')
+        logger.warning(f"🚫 Command /{command} from unauthorized chat {chat_id}")
+        return None
+    
+    handler = TELEGRAM_COMMAND_HANDLERS.get(command)
+    if not handler:
+        TELEGRAM_COMMANDS.inc(command='other', result='unknown')
+        reply = command_help(args, options)
+    elif command in ('top', 'history', 'threshold') and not monitor.service_loaded:
+        TELEGRAM_COMMANDS.inc(command=command, result='starting')
+        reply = "⏳ Bot đang khởi động, thử lại sau ít giây"
+    else:
+        try:
+            reply = handler(args, options)
+            TELEGRAM_COMMANDS.inc(command=command, result='ok')
+        except (ValueError, KeyError) as e:
+            TELEGRAM_COMMANDS.inc(command=command, result='error')
+            reply = f"⚠️ Tham số không hợp lệ: {markdown_escape(e)}"
         except Exception as e:
-            logger.error(f"❌ Telegram attempt {attempt + 1}: {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(5)
+            # Trả 200 để Telegram không gửi lại update mãi
+            TELEGRAM_COMMANDS.inc(command=command, result='error')
+            logger.error(f"❌ Command /{command} failed: {e}")
+            reply = "❌ Lỗi khi xử lý command"
+    logger.info(f"💬 /{command} from {chat_id}")
+    response = {'method': 'sendMessage', 'chat_id': message['chat']['id'], 'text': reply, 'parse_mode': 'Markdown'}
+    if message.get('message_id'):
+        response['reply_to_message_id'] = message['message_id']
+    return response
+
+@routes.route('/telegram/webhook', methods=['POST'])
+def telegram_webhook():
+    """Telegram webhook: trả lời ngay trong response body, không gọi Bot API / không scrape trong request"""
+    if not TELEGRAM_WEBHOOK_SECRET:
+        return jsonify({'error': 'webhook disabled'}), 404
+    token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not hmac.compare_digest(token.encode('utf-8'), TELEGRAM_WEBHOOK_SECRET.encode('utf-8')):
+        return jsonify({'error': 'forbidden'}), 403
+    
+    update = request.get_json(silent=True)
+    if not isinstance(update, dict):
+        return jsonify({'error': 'invalid update'}), 400
+    reply = handle_update(update)
+    # Telegram chỉ cần 200; body rỗng = không trả lời
+    return jsonify(reply) if reply else ('', 200)
+
+def run_worker(address: Tuple[str, int], authkey: bytes, worker_id: str):
+    """Worker process: kết nối result bus, scrape từng job bằng browser riêng, gửi rows về coordinator"""
+    logger.info(f"👷 Worker {worker_id} connecting to {address[0]}:{address[1]}")
+    conn = Client(address, authkey=authkey)
+    conn.send({'type': 'hello', 'worker': worker_id, 'pid': os.getpid()})
+    try:
+        while True:
+            # Rảnh thì probe / recycle browser, không làm trong lúc có job
+            if not conn.poll(BROWSER_PROBE_IDLE_SECONDS):
+                monitor.driver_pool.maintain()
+                continue
+            job = conn.recv()
+            if job.get('type') == 'stop':
+                break
+            
+            target = TrendTarget(job['geo'], job['hours'])
+            started_at = time.monotonic()
+            try:
+                rows = monitor.get_trending_table(target.timeframe, job.get('limit'), target.geo)
+                conn.send({
+                    'type': 'result',
+                    'job_id': job['job_id'],
+                    'rows': [tuple(row) for row in rows],
+                    'tier': monitor.served_by.get(target.key, ''),
+                    'seconds': time.monotonic() - started_at
+                })
+            except Exception as e:
+                logger.error(f"❌ Worker {worker_id} failed {target.key}: {e}")
+                conn.send({'type': 'error', 'job_id': job['job_id'], 'error': str(e)})
+    except (EOFError, OSError) as e:
+        logger.error(f"❌ Worker {worker_id} lost result bus: {e}")
+    finally:
+        conn.close()
+        monitor.cleanup_driver()
+
+class VirtualClock:
+    """Đồng hồ ảo cho replay: time() = thời điểm của snapshot đang replay"""
+    def __init__(self, now: float = 0.0):
+        self.now = now
+    
+    def time(self) -> float:
+        return self.now
+
+def run_replay(reader: SnapshotArchiveReader, start: str = None, end: str = None,
+               threshold: int = SEARCH_THRESHOLD, growth: float = NOTIFY_GROWTH,
+               ttl_hours: float = KEYWORD_TTL_HOURS, target_keys: List[str] = None) -> Dict:
+    """Backtest: snapshot trong archive -> AlertRules (differ, detector, tracker) theo đồng hồ ảo.
+    
+    Không browser, không Telegram, không ghi state. Tracker evict TTL mỗi giờ ảo.
+    """
+    clock = VirtualClock()
+    tracker = NotificationTracker(ttl_hours=ttl_hours, store=MemoryKeywordStore(),
+                                  threshold=threshold, growth=growth, clock=clock.time)
+    rules = AlertRules(tracker, threshold=threshold)
+    alerts = []
+    stats = {'days': 0, 'snapshots': 0, 'rows': 0}
+    first_ts = last_ts = last_evict = None
+    
+    # Log từng target của check live quá nhiều khi replay hàng nghìn snapshot
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    started_at = time.perf_counter()
+    try:
+        for day in reader.days(start, end):
+            data = reader.load_day(day)
+            stats['days'] += 1
+            if not data.rows:
+                continue
+            targets = [parse_targets(key)[0] for key in data.targets]
+            starts = reader.snapshot_starts(data).nonzero()[0].tolist()
+            ranks, keyword_ids, volumes = data.rank.tolist(), data.keyword.tolist(), data.volume.tolist()
+            
+            for begin, stop in zip(starts, starts[1:] + [data.rows]):
+                target = targets[int(data.target[begin])]
+                if target_keys and target.key not in target_keys:
+                    continue
+                ts = int(data.ts[begin]) / 1000
+                clock.now = ts
+                first_ts = first_ts or ts
+                last_ts = ts
+                if last_evict is None or ts - last_evict >= 3600:
+                    tracker.evict_expired(ts)
+                    last_evict = ts
+                
+                rows = [TrendRow(ranks[i], data.keywords[keyword_ids[i]], '', volumes[i], '', []) for i in range(begin, stop)]
+                stats['snapshots'] += 1
+                stats['rows'] += len(rows)
+                if rows[0].volume > 0:
+                    alerts.extend(rules.evaluate(target, rows, datetime.fromtimestamp(ts, VIETNAM_TZ)))
+    finally:
+        logger.setLevel(level)
+    
+    seconds = time.perf_counter() - started_at
+    virtual_seconds = (last_ts - first_ts) if first_ts else 0
+    by_reason: Dict[str, int] = {}
+    for alert in alerts:
+        by_reason[alert['reason']] = by_reason.get(alert['reason'], 0) + 1
+    stats.update(
+        alerts=len(alerts),
+        alerts_by_reason=by_reason,
+        seconds=round(seconds, 3),
+        virtual_hours=round(virtual_seconds / 3600, 1),
+        speedup=round(virtual_seconds / seconds) if seconds else None,
+        snapshots_per_second=round(stats['snapshots'] / seconds) if seconds else None,
+        rows_per_second=round(stats['rows'] / seconds) if seconds else None
+    )
+    return {
+        'rules': {'threshold': threshold, 'growth': growth, 'ttl_hours': ttl_hours},
+        'range': {'start': first_ts and datetime.fromtimestamp(first_ts, VIETNAM_TZ).isoformat(),
+                  'end': last_ts and datetime.fromtimestamp(last_ts, VIETNAM_TZ).isoformat()},
+        'stats': stats,
+        'alerts': [{**alert, 'timestamp': alert['timestamp'].isoformat()} for alert in alerts]
+    }
 
 def monitoring_loop():
     """Main monitoring với full xpath precision"""
@@ -560,55 +4367,14 @@ def monitoring_loop():
     logger.info(f"🕐 Timezone: Vietnam (UTC+7)")
     logger.info(f"🕐 Start time: {vietnam_time.strftime('%H:%M %d/%m/%Y')}")
     logger.info("🎯 Method: Selenium + Full XPath")
-    logger.info("🔗 4h URL: https://trends.google.com/trending?geo=US&hl=vi&hours=4")
-    logger.info("🔗 24h URL: https://trends.google.com/trending?geo=US&hl=vi&hours=24")
-    logger.info(f"⏱️ Interval: {CHECK_INTERVAL_MINUTES} minute(s)")
+    for target in monitor.targets:
+        logger.info(f"🔗 {target.key} URL: {monitor.get_trends_url(target.timeframe, target.geo)}")
+    logger.info(f"🌐 Browser pool: {BROWSER_POOL_SIZE} driver(s), timeout {TARGET_TIMEOUT_SECONDS}s/target")
+    for job in scheduler.jobs.values():
+        logger.info(f"⏱️ Job {job.name}: every {job.interval / 60:g} minute(s), jitter {job.jitter:g}s, missed ticks: {job.policy}")
     logger.info(f"📊 Threshold: {SEARCH_THRESHOLD:,}")
     
-    iteration = 0
-    
-    while True:
-        try:
-            iteration += 1
-            current_time = get_vietnam_time()
-            
-            logger.info(f"🔄 FULL XPATH MONITORING #{iteration}")
-            logger.info(f"🕐 Vietnam time: {current_time.strftime('%H:%M %d/%m/%Y')}")
-            logger.info("=" * 80)
-            
-            notifications = monitor.check_both_timeframes_precise()
-            
-            if notifications:
-                logger.info(f"📨 Processing {len(notifications)} XPATH notifications...")
-                
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                for i, notification in enumerate(notifications, 1):
-                    logger.info(f"📤 Sending XPATH notification {i}/{len(notifications)}")
-                    loop.run_until_complete(send_notification(notification))
-                    time.sleep(2)
-                
-                loop.close()
-                logger.info(f"✅ XPATH notifications sent: {len(notifications)}")
-            else:
-                logger.info("📊 No XPATH notifications needed")
-            
-        except Exception as e:
-            logger.error(f"❌ XPATH monitoring error #{iteration}: {e}")
-        
-        # Cleanup driver periodically
-        if iteration % 20 == 0:  # Every 20 iterations
-            monitor.cleanup_driver()
-            logger.info("🧹 Periodic driver cleanup")
-        
-        # Calculate next check time
-        next_check_time = current_time + timedelta(minutes=CHECK_INTERVAL_MINUTES)
-        
-        logger.info("=" * 80)
-        logger.info(f"💤 Sleeping {CHECK_INTERVAL_MINUTES} minute(s)...")
-        logger.info(f"🕐 Next XPATH check at: {next_check_time.strftime('%H:%M %d/%m/%Y')}")
-        time.sleep(CHECK_INTERVAL_MINUTES * 60)
+    scheduler.run()
 
 # Initialize với Vietnam time
 vietnam_start_time = get_vietnam_time()
@@ -620,13 +4386,113 @@ logger.info("📊 Real volume extraction from exact elements")
 logger.info("🕐 Vietnam timezone support")
 logger.info(f"⚙️ Mode: {CHECK_INTERVAL_MINUTES} min, {SEARCH_THRESHOLD:,} threshold")
 
-# Start monitoring
-monitor_thread = Thread(target=monitoring_loop, daemon=True)
-monitor_thread.start()
+monitor_thread = Thread(target=monitoring_loop, name='monitor', daemon=True)
+startup_state = {'import_seconds': None, 'services_seconds': None, 'phase': 'imported'}
+
+def wait_for_port(port: int, timeout: float) -> bool:
+    """Chờ tới khi server đã bind và nhận kết nối trên port"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+def start_services():
+    """Tạo monitor (kéo theo requests / numpy / Selenium), start workers và scheduler"""
+    if monitor_thread.is_alive():
+        return
+    started_at = time.perf_counter()
+    startup_state['phase'] = 'starting'
+    monitor.load()
+    scheduler.load()
+    if SCRAPE_MODE == 'process':
+        monitor.start_workers()
+    monitor_thread.start()
+    seconds = time.perf_counter() - started_at
+    STARTUP_SECONDS.set(seconds, phase='services')
+    startup_state.update(services_seconds=round(seconds, 3), phase='running')
+    logger.info(f"✅ Monitor services started in {seconds:.2f}s")
+
+def start_after_bind():
+    if not wait_for_port(PORT, STARTUP_BIND_TIMEOUT_SECONDS):
+        logger.warning(f"⚠️ Port {PORT} not accepting connections after {STARTUP_BIND_TIMEOUT_SECONDS:g}s, starting monitor anyway")
+    try:
+        start_services()
+    except Exception as e:
+        startup_state['phase'] = 'failed'
+        logger.error(f"❌ Monitor startup failed: {e}")
+
+def create_app(start_monitor: bool = START_MONITOR and not WORKER_PROCESS and not REPLAY_PROCESS) -> Flask:
+    """Application factory: đăng ký routes; monitor start ở background sau khi server đã bind PORT.
+    
+    START_MONITOR=0 khi import để benchmark / tooling.
+    """
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(routes)
+    if start_monitor:
+        Thread(target=start_after_bind, name='startup', daemon=True).start()
+    return flask_app
+
+app = create_app()
+
+# Import budget: chỉ tính phần import module (chưa có Selenium / Telegram / numpy)
+import_seconds = time.perf_counter() - IMPORT_STARTED_AT
+STARTUP_SECONDS.set(import_seconds, phase='import')
+startup_state['import_seconds'] = round(import_seconds, 3)
+if import_seconds > IMPORT_BUDGET_SECONDS:
+    logger.warning(f"⚠️ Import took {import_seconds:.2f}s (budget {IMPORT_BUDGET_SECONDS:g}s)")
+else:
+    logger.info(f"⚡ Import took {import_seconds:.2f}s (budget {IMPORT_BUDGET_SECONDS:g}s)")
+
+def build_cli() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Google Trends -> Telegram monitor')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('serve', help='Flask + monitor (mặc định)')
+    worker = commands.add_parser('worker', help='scrape worker kết nối vào result bus của coordinator')
+    worker.add_argument('--bus', default=RESULT_BUS_ADDRESS, help='host:port của result bus')
+    worker.add_argument('--id', default=f'{os.uname().nodename}-{os.getpid()}', help='tên worker')
+    replay = commands.add_parser('replay', help='backtest rule alert trên snapshot archive (không browser / Telegram)')
+    replay.add_argument('--archive', default=SNAPSHOT_ARCHIVE_DIR, help='thư mục snapshot archive')
+    replay.add_argument('--start', help='ngày bắt đầu YYYY-MM-DD (giờ Vietnam)')
+    replay.add_argument('--end', help='ngày kết thúc YYYY-MM-DD')
+    replay.add_argument('--targets', help='chỉ replay các target, ví dụ "US:4h,DE:24h"')
+    replay.add_argument('--threshold', type=int, default=SEARCH_THRESHOLD)
+    replay.add_argument('--growth', type=float, default=NOTIFY_GROWTH, help='báo lại khi volume > growth x lần trước')
+    replay.add_argument('--ttl-hours', type=float, default=KEYWORD_TTL_HOURS)
+    replay.add_argument('--output', help='ghi kết quả JSON ra file (mặc định stdout)')
+    return parser
 
 if __name__ == '__main__':
+    args = build_cli().parse_args()
+    if args.command == 'worker':
+        if not RESULT_BUS_AUTHKEY:
+            sys.exit('RESULT_BUS_AUTHKEY is required for worker processes')
+        run_worker(parse_bus_address(args.bus), RESULT_BUS_AUTHKEY.encode('ascii'), args.id)
+        sys.exit(0)
+    if args.command == 'replay':
+        target_keys = [target.key for target in parse_targets(args.targets)] if args.targets else None
+        report = run_replay(SnapshotArchiveReader(args.archive), args.start, args.end, args.threshold,
+                            args.growth, args.ttl_hours, target_keys)
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(output)
+        else:
+            print(output)
+        stats = report['stats']
+        logger.info(f"⏪ Replay: {stats['snapshots']:,} snapshots ({stats['virtual_hours']:g}h) in {stats['seconds']:g}s, "
+                    f"{stats['alerts']} alerts {stats['alerts_by_reason']}")
+        sys.exit(0)
+    
     logger.info(f"🚀 Flask server starting at {vietnam_start_time.strftime('%H:%M %d/%m/%Y')}...")
     try:
         app.run(host='0.0.0.0', port=PORT, debug=False)
     finally:
-        monitor.cleanup_driver()
+        if scheduler.service_loaded:
+            scheduler.stop()
+        if monitor.service_loaded:
+            monitor.stop_workers()
+            monitor.cleanup_driver()
@@ -0,0 +1,48 @@
+"""Fixture chung cho test: import main không start monitor, Google Trends giả phục vụ fixture đã ghi
+
+Fixture trong tests/fixtures được ghi bằng `python bench.py --record tests/fixtures`.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+sys.path.insert(0, ROOT)
+os.environ['START_MONITOR'] = '0'
+
+import bench  # noqa: E402
+import main  # noqa: E402
+
+@pytest.fixture
+def recorded():
+    return bench.load_fixtures(FIXTURE_DIR)
+
+@pytest.fixture
+def serve_trends(monkeypatch):
+    """serve_trends(fixtures) -> base URL; main.TRENDS_BASE_URL trỏ về server local"""
+    servers = []
+
+    def start(fixtures):
+        server = bench.start_server(bench.trends_handler(fixtures))
+        servers.append(server)
+        base_url = f'http://127.0.0.1:{server.server_address[1]}'
+        monkeypatch.setattr(main, 'TRENDS_BASE_URL', base_url)
+        return base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def monitor(tmp_path, monkeypatch):
+    """Monitor chỉ scrape (không history / tracker), cache và profile nằm trong tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    instance = main.PreciseXPathTrendsMonitor(scrape_only=True)
+    yield instance
+    instance.session.close()
+    instance.probe_session.close()
+    instance.executor.shutdown(wait=False)
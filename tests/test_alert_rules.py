@@ -0,0 +1,15 @@
+"""AlertRules: detector, tracker và differ dùng chung key normalize_keyword"""
+from datetime import datetime
+
+import main
+
+def test_velocity_detector_keys_on_normalized_keyword():
+    rules = main.AlertRules(main.NotificationTracker(store=main.MemoryKeywordStore()))
+    target = main.parse_targets('VN:4')[0]
+    variants = ['Real Madrid vs Barcelona', 'barcelona - real madrid', 'REAL MADRID v BARCELONA']
+    for hour, keyword in enumerate(variants):
+        when = datetime.fromtimestamp(1760000000 + hour * 3600, main.VIETNAM_TZ)
+        rules.detect_velocity(target, [main.TrendRow(1, keyword, '', 10000 * (hour + 1), '', [])], when)
+
+    assert list(rules.detector.states) == [f"{target.key}|{main.normalize_keyword(variants[0])}"]
+    assert rules.detector.states[f"{target.key}|{main.normalize_keyword(variants[0])}"].buffer.count == 3
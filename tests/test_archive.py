@@ -0,0 +1,94 @@
+"""Archive snapshot: file .col căn cột 8 byte và đọc lại đúng dữ liệu"""
+import json
+
+import numpy as np
+
+import main
+
+def archive_day(rows: int) -> main.ArchiveDay:
+    """Snapshot 3 dòng / target, 2 target xen kẽ, số dòng lẻ"""
+    index = np.arange(rows)
+    return main.ArchiveDay(
+        day='2025-01-01',
+        ts=(1735689600000 + index // 6 * 60000).astype('<i8'),
+        target=(index // 3 % 2).astype('<i4'),
+        rank=(index % 3 + 1).astype('<i4'),
+        keyword=(index % 7).astype('<i4'),
+        volume=(index * 100000).astype('<i8'),
+        keywords=[f'keyword {i}' for i in range(7)],
+        targets=['VN:4', 'VN:24']
+    )
+
+def test_compacted_columns_are_aligned(tmp_path):
+    archive = main.SnapshotArchive(str(tmp_path))
+    data = archive_day(33)
+    archive.write_day(data)
+
+    path = tmp_path / '2025-01-01.col'
+    raw = path.read_bytes()
+    header_len = archive.DAY_HEADER.unpack_from(raw)[1]
+    header = json.loads(raw[archive.DAY_HEADER.size:archive.DAY_HEADER.size + header_len])
+    data_start = archive.data_start(header_len)
+    for name, dtype, offset in header['columns']:
+        assert (data_start + offset) % 8 == 0, name
+
+    loaded = archive.load_day('2025-01-01')
+    for name, _ in archive.COLUMNS:
+        assert np.array_equal(getattr(loaded, name), getattr(data, name)), name
+    assert loaded.keywords == data.keywords
+    assert loaded.targets == data.targets
+
+def test_snapshot_starts(tmp_path):
+    data = archive_day(12)
+    assert np.flatnonzero(main.SnapshotArchiveReader.snapshot_starts(data)).tolist() == [0, 3, 6, 9]
+
+def test_replay_reports_tracker_reasons(tmp_path):
+    archive = main.SnapshotArchive(str(tmp_path))
+    archive.write_day(archive_day(600))
+
+    report = main.run_replay(archive, threshold=500000, growth=1.1, ttl_hours=0)
+    assert {'threshold', 'renotify'} <= set(report['stats']['alerts_by_reason'])
+
+def snapshot_day(tables) -> main.ArchiveDay:
+    """1 target VN:4; tables = [(phút kể từ 0h UTC, [(keyword, volume), ...]), ...]"""
+    keywords = sorted({keyword for _, rows in tables for keyword, _ in rows})
+    flat = [(minute, rank, keywords.index(keyword), volume)
+            for minute, rows in tables for rank, (keyword, volume) in enumerate(rows, 1)]
+    ts, rank, keyword, volume = zip(*flat)
+    return main.ArchiveDay(
+        day='2025-01-01',
+        ts=(1735689600000 + np.array(ts) * 60000).astype('<i8'),
+        target=np.zeros(len(flat), '<i4'),
+        rank=np.array(rank, '<i4'),
+        keyword=np.array(keyword, '<i4'),
+        volume=np.array(volume, '<i8'),
+        keywords=keywords,
+        targets=['VN:4']
+    )
+
+def replayed(archive, **rules):
+    report = main.run_replay(archive, threshold=500000, growth=1.1, **rules)
+    return [(alert['keyword'], alert['reason']) for alert in report['alerts'] if alert['reason'] != 'velocity']
+
+def test_replay_renotifies_after_ttl(tmp_path):
+    archive = main.SnapshotArchive(str(tmp_path))
+    archive.write_day(snapshot_day([
+        (0, [('giá vàng', 600000), ('a', 1000)]),
+        (30, [('giá vàng', 600000), ('b', 1000)]),    # trong TTL, không tăng > 10%
+        (180, [('giá vàng', 600000), ('c', 1000)]),   # quá TTL 1h -> tracker đã evict
+        (190, [('giá vàng', 700000), ('c', 1000)]),   # +16% -> renotify
+    ]))
+    assert replayed(archive, ttl_hours=1) == [
+        ('giá vàng', 'threshold'), ('giá vàng', 'threshold'), ('giá vàng', 'renotify')
+    ]
+    assert replayed(archive, ttl_hours=0) == [('giá vàng', 'threshold'), ('giá vàng', 'renotify')]
+
+def test_replay_skips_unchanged_table(tmp_path):
+    archive = main.SnapshotArchive(str(tmp_path))
+    table = [('giá vàng', 600000), ('bitcoin', 1000)]
+    archive.write_day(snapshot_day([(0, table), (180, table), (181, table)]))
+
+    report = main.run_replay(archive, threshold=500000, growth=1.1, ttl_hours=1)
+    # Bảng y hệt sau TTL: AlertRules bỏ qua như check live, không alert lại
+    assert [(alert['keyword'], alert['reason']) for alert in report['alerts']] == [('giá vàng', 'threshold')]
+    assert report['stats']['snapshots'] == 3
@@ -0,0 +1,33 @@
+"""parse_volumes / validate_keywords (batch) phải cho kết quả giống hệt bản scalar trên từng dòng"""
+import random
+
+VOLUME_CORPUS = [
+    '', ' ', '+', '200K+', '200 K+', '2 N+', '500 N+', '1 Tr+', '2,5 Tr+', '1.5 Tr+', '1M+', '2.5M+', '1,000+',
+    '1,000,000+', '5000', '10 K+', '50k+', '1.5', '.5K', '1.K', '1e5', '-5K', '5KM', 'K', 'M+', 'Tr',
+    '２００K+', '１ Tr+', '２ N+', '５０００', '1.2.3K', 'NaN', 'abc', 'Tìm kiếm', '  300+  ', '٣٠٠+'
+]
+
+KEYWORD_CORPUS = [
+    '', 'ab', 'abc', 'x' * 100, 'x' * 101, ' leading space', '#hashtag', '2 N+', '1 Tr+', '200K+', '12345',
+    'iPhone 17', 'giá vàng hôm nay', 'Thời tiết hà nội', 'Tìm kiếm', 'Xu hướng', 'Trending now', 'SEARCH',
+    'Show all', 'taylor swift', 'NFL week 5', 'real madrid vs barcelona', '２０２５ world cup', 'Ｘ factor',
+    'ÉCOLE', 'İstanbul', '1 2 3', '_under', 'menu', 'homeland', 'a' + '́' * 3, 'việt nam 🇻🇳'
+]
+
+def fuzz(seed: int, count: int, alphabet: str, max_length: int):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length))) for _ in range(count)]
+
+def test_parse_volumes_matches_scalar(monitor):
+    corpus = VOLUME_CORPUS + fuzz(10, 5000, '0123456789.,+ KMNTrkmtr２５', 8)
+    batch = monitor.parse_volumes(corpus)
+    assert len(batch) == len(corpus)
+    for volume_str, volume in zip(corpus, batch):
+        assert int(volume) == monitor.parse_volume_string(volume_str), volume_str
+
+def test_validate_keywords_matches_scalar(monitor):
+    corpus = KEYWORD_CORPUS + fuzz(10, 5000, 'abcxyzMENUshowàếộ 0123#-_２Ｘ', 12)
+    batch = monitor.validate_keywords(corpus)
+    assert len(batch) == len(corpus)
+    for keyword, valid in zip(corpus, batch):
+        assert bool(valid) == monitor.is_valid_trending_keyword(keyword), keyword
@@ -0,0 +1,50 @@
+"""format_digest: mỗi tin nhắn <= 4096 UTF-16 code unit (emoji = 2), không cắt đôi emoji hay code span"""
+from datetime import datetime
+
+import main
+
+LIMIT = main.TELEGRAM_MAX_MESSAGE_CHARS
+
+def alert(keyword, volume=600000, **extra):
+    return {'keyword': keyword, 'volume': volume, 'timeframe': '4h', 'geo': 'VN', 'reason': 'threshold',
+            'timestamp': datetime(2025, 1, 1, 8, 0, tzinfo=main.VIETNAM_TZ), **extra}
+
+def assert_valid(messages):
+    for message in messages:
+        assert main.telegram_length(message) <= LIMIT
+        message.encode('utf-8')  # không còn nửa surrogate pair
+        for line in message.split('\n'):
+            assert line.count('`') % 2 == 0, line
+
+def test_astral_keywords_split_on_utf16_length():
+    # Dòng toàn emoji: len() của Python chỉ bằng ~1/2 độ dài Telegram đếm
+    alerts = [alert(f'{i} ' + '🔥🇻🇳' * 12) for i in range(120)]
+    messages = main.format_digest(alerts)
+    assert len(messages) > 1
+    assert_valid(messages)
+    assert max(len(message) for message in messages) < LIMIT * 0.8 < max(main.telegram_length(m) for m in messages)
+
+    # Mọi alert xuất hiện đúng 1 lần, theo thứ tự; tin nào cũng đầy tới mức thêm dòng kế tiếp sẽ vượt giới hạn
+    lines = [line for message in messages for line in message.split('\n\n', 1)[1].split('\n')]
+    assert [line.split('.', 1)[0] for line in lines] == [str(i) for i in range(1, 121)]
+    for message, following in zip(messages, messages[1:]):
+        assert main.telegram_length(message + '\n' + following.split('\n\n', 1)[1].split('\n')[0]) > LIMIT
+    for number, message in enumerate(messages, 1):
+        assert f'({number}/{len(messages)})' in message.split('\n\n', 1)[0]
+
+def test_single_alert_longer_than_limit():
+    keyword = 'giá vàng ' + '😀' * 3000
+    messages = main.format_digest([alert(keyword)])
+    assert len(messages) == 1
+    assert_valid(messages)
+    assert '😀…`' in messages[0]
+
+    # Trong digest nhiều alert: chỉ dòng quá dài bị cắt
+    messages = main.format_digest([alert('bitcoin'), alert(keyword), alert('iphone 17')])
+    assert_valid(messages)
+    assert '`bitcoin`' in messages[0] and '`iphone 17`' in messages[-1]
+
+def test_truncate_keeps_surrogate_pairs():
+    assert main.truncate_telegram('ab😀cd', 4) == 'ab…'
+    assert main.truncate_telegram('ab😀cd', 5) == 'ab😀…'
+    assert main.truncate_telegram('ab😀cd', 6) == 'ab😀cd'
@@ -0,0 +1,112 @@
+"""NotificationDispatcher gửi qua Bot API giả (local): fan-out, RetryAfter, token bucket chat trước global, join"""
+import json
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+import pytest
+
+import bench
+import main
+
+def telegram_handler(sent, rate_limited):
+    """sendMessage ghi (chat_id, text, thời điểm); chat trong rate_limited nhận 429 ở lần đầu"""
+    class TelegramHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            form = parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+            chat_id, text = form['chat_id'][0], form['text'][0]
+            if chat_id in rate_limited:
+                rate_limited.discard(chat_id)
+                status, payload = 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                                        'parameters': {'retry_after': 1}}
+            else:
+                sent.append((chat_id, text, time.monotonic()))
+                status, payload = 200, {'ok': True, 'result': {
+                    'message_id': len(sent), 'date': int(time.time()), 'chat': {'id': int(chat_id), 'type': 'private'},
+                    'text': text
+                }}
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return TelegramHandler
+
+@pytest.fixture
+def telegram():
+    """telegram(chat_ids, workers, rate_limited) -> (dispatcher, danh sách tin đã nhận)"""
+    servers, dispatchers = [], []
+
+    def start(chat_ids, workers=4, rate_limited=()):
+        sent = []
+        server = bench.start_server(telegram_handler(sent, set(rate_limited)))
+        servers.append(server)
+        dispatcher = main.NotificationDispatcher(token='123:test', chat_ids=chat_ids, workers=workers,
+                                                 base_url=f'http://127.0.0.1:{server.server_address[1]}/bot')
+        dispatchers.append(dispatcher)
+        return dispatcher, sent
+
+    yield start
+    for dispatcher in dispatchers:
+        dispatcher.stop()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.02)
+
+def test_fan_out_and_join_drains_queue(telegram, monkeypatch):
+    monkeypatch.setattr(main, 'TELEGRAM_CHAT_RATE', 100)
+    dispatcher, sent = telegram(['1', '2', '3'])
+    for i in range(5):
+        dispatcher.submit_text(f'tin {i}')
+
+    assert dispatcher.join(10)
+    assert dispatcher.pending() == 0
+    assert dispatcher.stats['sent'] == 15
+    for chat_id in ('1', '2', '3'):
+        assert sorted(text for chat, text, _ in sent if chat == chat_id) == [f'tin {i}' for i in range(5)]
+
+def test_retry_after_is_retried(telegram):
+    dispatcher, sent = telegram(['1', '2'], rate_limited={'2'})
+    started = time.monotonic()
+    dispatcher.submit_text('giá vàng')
+
+    wait_for(lambda: dispatcher.stats['sent'] == 2)
+    assert dispatcher.stats['retries'] == 1
+    assert dispatcher.stats['failed'] == 0
+    retried = [at for chat, _, at in sent if chat == '2']
+    assert len(retried) == 1 and retried[0] - started >= 1  # chờ đúng retry_after
+
+def test_chat_bucket_taken_before_global(telegram, monkeypatch):
+    # Global 2 msg/s; chat chậm 1 msg/s đang có 3 tin chờ không được giữ token global của chat khác
+    monkeypatch.setattr(main, 'TELEGRAM_GLOBAL_RATE', 2)
+    monkeypatch.setattr(main, 'TELEGRAM_CHAT_RATE', 1)
+    dispatcher, sent = telegram(['10'], workers=4)
+    dispatcher.start()
+    started = time.monotonic()
+    for i in range(4):
+        dispatcher.submit_text(f'slow {i}')
+    dispatcher.submit_text('fast', chat_ids=['20'])
+
+    wait_for(lambda: any(chat == '20' for chat, _, _ in sent))
+    assert next(at for chat, _, at in sent if chat == '20') - started < 0.3
+    assert dispatcher.join(10)
+    assert sorted(text for chat, text, _ in sent if chat == '10') == [f'slow {i}' for i in range(4)]
+
+def test_start_error_is_raised():
+    dispatcher = main.NotificationDispatcher(token='', chat_ids=['1'])
+    with pytest.raises(RuntimeError):
+        dispatcher.submit_text('x')
+    assert dispatcher.join(1)
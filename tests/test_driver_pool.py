@@ -0,0 +1,42 @@
+"""DriverPool chỉ bỏ driver khi lỗi thuộc về driver / session, lỗi parse thì trả driver về pool"""
+import pytest
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException, TimeoutException
+from urllib3.exceptions import ProtocolError
+
+import main
+
+class FakeDriver:
+    def __init__(self):
+        self.quit_called = False
+
+    def execute_script(self, script):
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+def make_pool():
+    return main.DriverPool(FakeDriver, 1, standby=0, max_uses=0, max_age_minutes=0, max_rss_mb=0)
+
+@pytest.mark.parametrize('error', [ValueError('bad table'), TimeoutException('element not ready')])
+def test_non_driver_error_returns_driver_to_pool(error):
+    pool = make_pool()
+    with pytest.raises(type(error)):
+        with pool.acquire(timeout=1) as driver:
+            first = driver
+            raise error
+    with pool.acquire(timeout=1) as driver:
+        assert driver is first
+    assert pool.stats['recycled'] == 0
+
+@pytest.mark.parametrize('error', [InvalidSessionIdException('gone'), NoSuchWindowException('closed'),
+                                   ProtocolError('reset'), ConnectionRefusedError()])
+def test_driver_failure_retires_driver(error):
+    pool = make_pool()
+    with pytest.raises(type(error)):
+        with pool.acquire(timeout=1) as driver:
+            first = driver
+            raise error
+    with pool.acquire(timeout=1) as driver:
+        assert driver is not first
+    assert pool.recycle_reasons == {'error': 1}
@@ -0,0 +1,118 @@
+"""TrendHistoryStore: migration keyword_key, tra cứu theo keyword đã normalize + phân trang,
+chỉ ghi delta (series điền bucket không đổi, movers lấy giá trị trước cửa sổ)"""
+import sqlite3
+
+import pytest
+
+import main
+
+T0 = 1735689600  # bội số của 3600
+
+@pytest.fixture
+def store(tmp_path):
+    instance = main.TrendHistoryStore(str(tmp_path / 'history.db'), retention_days=0)
+    yield instance
+    instance.close()
+
+def record(store, ts, *rows, geo='VN', hours=4):
+    store.record_snapshot(main.TrendTarget(geo, hours), [main.TrendRow(rank, keyword, '', volume, '', [])
+                                                        for rank, (keyword, volume) in enumerate(rows, 1)], ts)
+
+def test_series_carries_unchanged_buckets(store):
+    record(store, T0 - 7200, ('giá vàng', 100000))
+    record(store, T0 + 3 * 3600 + 60, ('giá vàng', 200000))
+
+    series = store.volume_series('giá vàng', 'VN', '4h', since=T0, bucket_seconds=3600)
+    assert [(item['ts'] - T0, item['volume'], item['samples']) for item in series] == [
+        (0, 100000, 0), (3600, 100000, 0), (7200, 100000, 0), (10800, 200000, 1)
+    ]
+
+def test_movers_start_from_value_before_window(store):
+    record(store, T0 - 600, ('giá vàng', 100000), ('bitcoin', 50000))
+    record(store, T0 + 600, ('bitcoin', 500000), ('giá vàng', 100000))  # giá vàng chỉ đổi rank
+    record(store, T0 + 1200, ('bitcoin', 500000), ('giá vàng', 200000), ('iphone 17', 20000))
+
+    movers = {item['keyword']: item for item in store.top_movers('VN', '4h', since=T0)}
+    assert (movers['bitcoin']['first_volume'], movers['bitcoin']['delta']) == (50000, 450000)
+    assert (movers['giá vàng']['first_volume'], movers['giá vàng']['delta']) == (100000, 100000)
+    assert movers['iphone 17']['delta'] == 0  # mới vào bảng trong cửa sổ
+    assert [item['keyword'] for item in store.top_movers('VN', '4h', since=T0)] == ['bitcoin', 'giá vàng', 'iphone 17']
+
+OLD_SCHEMA = """
+CREATE TABLE observations (
+    id INTEGER PRIMARY KEY, ts INTEGER NOT NULL, geo TEXT NOT NULL, timeframe TEXT NOT NULL,
+    keyword TEXT NOT NULL, rank INTEGER NOT NULL, volume INTEGER NOT NULL
+);
+CREATE INDEX idx_observations_keyword ON observations (geo, timeframe, keyword, ts);
+CREATE INDEX idx_observations_keyword_any ON observations (keyword, ts);
+INSERT INTO observations (ts, geo, timeframe, keyword, rank, volume) VALUES
+    (1735689600, 'VN', '4h', 'Giá Vàng', 1, 500000),
+    (1735693200, 'VN', '4h', 'giá vàng', 1, 600000),
+    (1735693200, 'US', '4h', 'Real Madrid vs Barca', 2, 200000);
+"""
+
+def test_migration_adds_normalized_key(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(OLD_SCHEMA)
+    conn.close()
+
+    store = main.TrendHistoryStore(path, retention_days=0)
+    keys = store.conn.execute('SELECT keyword, keyword_key FROM observations ORDER BY id').fetchall()
+    assert keys == [('Giá Vàng', 'gia vang'), ('giá vàng', 'gia vang'), ('Real Madrid vs Barca', 'barca vs real madrid')]
+    indexes = {row[1] for row in store.conn.execute('PRAGMA index_list(observations)')}
+    assert {'idx_observations_key', 'idx_observations_key_any'} <= indexes
+    assert not indexes & {'idx_observations_keyword', 'idx_observations_keyword_any'}
+
+    items, _ = store.history('GIA VANG')
+    assert [item['keyword'] for item in items] == ['giá vàng', 'Giá Vàng']
+    assert store.history('barca - real madrid', geo='US')[0][0]['volume'] == 200000
+    store.close()
+
+    # Mở lại: không migrate lần nữa
+    reopened = main.TrendHistoryStore(path, retention_days=0)
+    assert reopened.conn.execute('SELECT COUNT(*) FROM observations').fetchone() == (3,)
+    reopened.close()
+
+def test_history_pagination(store):
+    for i in range(7):
+        record(store, T0 + i * 60, ('Bitcoin', 100000 + i), geo='VN')
+        record(store, T0 + i * 60, ('bitcoin', 900000 + i), geo='US')
+
+    pages, cursor = [], None
+    while True:
+        items, cursor = store.history('bitcoin', geo='VN', limit=3, cursor=cursor)
+        pages.append([item['volume'] - 100000 for item in items])
+        if cursor is None:
+            break
+    assert pages == [[6, 5, 4], [3, 2, 1], [0]]
+
+    items, cursor = store.history('BITCOIN', limit=100)
+    assert len(items) == 14 and cursor is None
+    assert store.history('bitcoin', since=T0 + 5 * 60, timeframe='4h')[0][0]['ts'] == T0 + 6 * 60
+
+@pytest.mark.parametrize('filters, index', [
+    ({}, 'idx_observations_key_any'),
+    ({'geo': 'VN'}, 'idx_observations_key_any'),
+    ({'geo': 'VN', 'timeframe': '4h'}, 'idx_observations_key')
+])
+def test_history_query_uses_index(store, monkeypatch, filters, index):
+    plans = []
+    execute = store.conn.execute
+
+    class Conn:
+        def execute(self, query, params=()):
+            plans.extend(row[-1] for row in execute('EXPLAIN QUERY PLAN ' + query, params))
+            return execute(query, params)
+
+    monkeypatch.setattr(store, 'conn', Conn())
+    store.history('bitcoin', **filters)
+    assert any(index in plan for plan in plans), plans
+
+def test_movers_group_keyword_variants(store):
+    record(store, T0 - 60, ('Real Madrid vs Barca', 100000))
+    record(store, T0 + 60, ('barca - real madrid', 300000))
+
+    assert [(item['keyword'], item['first_volume'], item['delta']) for item in store.top_movers('VN', '4h', since=T0)] == [
+        ('barca - real madrid', 100000, 200000)
+    ]
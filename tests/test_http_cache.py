@@ -0,0 +1,113 @@
+"""CachingSession + HttpCache: GET có điều kiện, 304 phục vụ từ đĩa, LRU theo dung lượng, stream=True không qua cache"""
+import os
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import bench
+import main
+
+LAST_MODIFIED = 'Wed, 01 Jan 2025 00:00:00 GMT'
+
+def origin_handler(requests_seen):
+    """/etag/<name> có ETag, /modified/<name> có Last-Modified, /size/<n> trả n byte; ghi lại header mỗi request"""
+    class OriginHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append((self.path, dict(self.headers)))
+            kind, _, name = self.path.strip('/').partition('/')
+            headers = {'Content-Type': 'text/plain; charset=utf-8'}
+            if kind == 'etag':
+                headers['ETag'] = f'"{name}-v1"'
+                fresh = self.headers.get('If-None-Match') == headers['ETag']
+            elif kind == 'modified':
+                headers['Last-Modified'] = LAST_MODIFIED
+                fresh = self.headers.get('If-Modified-Since') == LAST_MODIFIED
+            else:
+                fresh = False
+            body = b'' if fresh else (b'x' * int(name) if kind == 'size' else f'body of {self.path}'.encode('utf-8'))
+            self.send_response(304 if fresh else 200)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return OriginHandler
+
+@pytest.fixture
+def origin():
+    seen = []
+    server = bench.start_server(origin_handler(seen))
+    yield f'http://127.0.0.1:{server.server_address[1]}', seen
+    server.shutdown()
+    server.server_close()
+
+def make_session(tmp_path, max_bytes=1024 * 1024):
+    return main.CachingSession(main.HttpCache(str(tmp_path / 'cache'), max_bytes=max_bytes))
+
+@pytest.mark.parametrize('path, header, value', [
+    ('/etag/a', 'If-None-Match', '"a-v1"'),
+    ('/modified/a', 'If-Modified-Since', LAST_MODIFIED)
+])
+def test_revalidation_sends_validators_and_serves_304_from_disk(tmp_path, origin, path, header, value):
+    base_url, seen = origin
+    session = make_session(tmp_path)
+    first = session.get(base_url + path)
+    assert first.status_code == 200 and not first.from_cache and not first.unchanged
+
+    second = session.get(base_url + path)
+    assert seen[-1][1].get(header) == value
+    assert second.status_code == 200
+    assert second.from_cache and second.unchanged
+    assert second.text == first.text == f'body of {path}'
+    assert second.content_hash == first.content_hash
+    session.close()
+
+def test_missing_body_refetches_and_restores_cache(tmp_path, origin):
+    base_url, seen = origin
+    session = make_session(tmp_path)
+    first = session.get(base_url + '/etag/b')
+    entry = session.cache.lookup(base_url + '/etag/b')
+    os.remove(session.cache._path(entry.url, '.body'))
+
+    again = session.get(base_url + '/etag/b')
+    assert 'If-None-Match' not in seen[-1][1]  # tải lại không điều kiện
+    assert again.status_code == 200 and again.text == first.text
+    assert again.content_hash == first.content_hash and not again.from_cache
+    assert session.cache.lookup(base_url + '/etag/b') is not None
+
+    cached = session.get(base_url + '/etag/b')
+    assert cached.from_cache and cached.text == first.text
+    session.close()
+
+def test_lru_evicts_by_byte_budget(tmp_path, origin):
+    base_url, _ = origin
+    session = make_session(tmp_path, max_bytes=250)
+    for size in (100, 101):
+        session.get(f'{base_url}/size/{size}')
+    session.get(f'{base_url}/size/100')  # dùng lại -> mới nhất trong LRU
+    session.get(f'{base_url}/size/102')
+
+    assert session.cache.lookup(f'{base_url}/size/101') is None
+    assert session.cache.lookup(f'{base_url}/size/100') is not None
+    assert session.cache.stats() == {'entries': 2, 'bytes': 202, 'max_bytes': 250}
+    assert len(os.listdir(tmp_path / 'cache')) == 4  # .json + .body của 2 entry
+    session.close()
+
+def test_stream_bypasses_cache(tmp_path, origin):
+    base_url, seen = origin
+    session = make_session(tmp_path)
+    session.get(base_url + '/etag/c')
+    response = session.get(base_url + '/etag/c', stream=True)
+    assert 'If-None-Match' not in seen[-1][1]
+    assert response.status_code == 200 and not hasattr(response, 'from_cache')
+    response.close()
+
+    session.get(base_url + '/etag/d', stream=True).close()
+    assert session.cache.lookup(base_url + '/etag/d') is None
+    session.close()
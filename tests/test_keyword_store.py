@@ -0,0 +1,39 @@
+"""TTL của NotificationTracker + KeywordStore: keyword cũ không sống lâu hơn TTL trong memory / file"""
+import json
+import os
+import time
+
+import main
+
+def test_legacy_entries_use_file_mtime(tmp_path):
+    path = tmp_path / 'notified_keywords.json'
+    path.write_text(json.dumps({'4h': {'old keyword': 600000}, '24h': {'other': 700000}}))
+    stamped = time.time() - 3 * 3600
+    os.utime(path, (stamped, stamped))
+
+    tracker = main.NotificationTracker(str(path), ttl_hours=24)
+    assert tracker.storages['4h']['old keyword'] == (600000, stamped)
+    tracker.close()
+
+    expired = main.NotificationTracker(str(path), ttl_hours=1)
+    assert 'old keyword' not in expired.storages['4h']
+    assert 'other' not in expired.storages['24h']
+    expired.close()
+
+def test_periodic_flush_evicts_expired_keywords(tmp_path):
+    now = [1000000.0]
+    path = tmp_path / 'notified_keywords.json'
+    tracker = main.NotificationTracker(str(path), ttl_hours=1, clock=lambda: now[0])
+    tracker.store.EVICT_INTERVAL_SECONDS = 0
+    assert tracker.should_notify('giá vàng', 600000, '4h')
+    tracker.save_data()
+    assert not path.exists()  # chưa hết hạn: chỉ nằm trong journal
+    assert path.with_name(path.name + '.journal').read_text()
+
+    now[0] += 2 * 3600
+    assert tracker.should_notify('bitcoin', 800000, '4h')
+    tracker.save_data()
+    assert 'giá vàng' not in tracker.storages['4h']
+    assert list(json.loads(path.read_text())['4h']) == ['bitcoin']
+    assert path.with_name(path.name + '.journal').read_text() == ''
+    tracker.close()
@@ -0,0 +1,56 @@
+"""Metrics registry: text format cho /metrics (HELP / TYPE, bucket cộng dồn, +Inf, escape label)"""
+import main
+
+def test_label_values_are_escaped():
+    counter = main.Counter('test_total', 'test', ('command',))
+    counter.inc(command='a"}\\\nb')
+    assert counter.render() == ['test_total{command="a\\"}\\\\\\nb"} 1']
+
+def scrape(monkeypatch, registry=None):
+    if registry:
+        monkeypatch.setattr(main, 'METRICS', registry)
+    response = main.create_app(start_monitor=False).test_client().get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    return response.get_data(as_text=True)
+
+def test_metrics_exposition(monkeypatch):
+    registry = main.MetricsRegistry()
+    requests_total = registry.counter('app_requests_total', 'Requests by result', ('result',))
+    queue_size = registry.gauge('app_queue', 'Queued items', ())
+    latency = registry.histogram('app_latency_seconds', 'Latency', ('route',), buckets=(1, 0.1, 10))
+    requests_total.inc(result='ok')
+    requests_total.inc(2, result='error')
+    queue_size.set(3)
+    for value in (0.05, 0.1, 0.3, 7, 500):
+        latency.observe(value, route='/top')
+
+    assert scrape(monkeypatch, registry).splitlines() == [
+        '# HELP app_requests_total Requests by result',
+        '# TYPE app_requests_total counter',
+        'app_requests_total{result="error"} 2',
+        'app_requests_total{result="ok"} 1',
+        '# HELP app_queue Queued items',
+        '# TYPE app_queue gauge',
+        'app_queue 3',
+        '# HELP app_latency_seconds Latency',
+        '# TYPE app_latency_seconds histogram',
+        'app_latency_seconds_bucket{route="/top",le="0.1"} 2',  # le là cận trên bao gồm
+        'app_latency_seconds_bucket{route="/top",le="1"} 3',
+        'app_latency_seconds_bucket{route="/top",le="10"} 4',
+        'app_latency_seconds_bucket{route="/top",le="+Inf"} 5',
+        'app_latency_seconds_sum{route="/top"} 507.45',
+        'app_latency_seconds_count{route="/top"} 5',
+    ]
+
+def test_every_registered_metric_has_help_and_type(monkeypatch):
+    main.CYCLE_SECONDS.observe(12)
+    lines = scrape(monkeypatch).splitlines()
+    for metric in main.METRICS.metrics:
+        assert f'# HELP {metric.name} {metric.help}' in lines
+        assert f'# TYPE {metric.name} {metric.kind}' in lines
+    buckets = [line for line in lines if line.startswith('monitor_cycle_seconds_bucket')]
+    counts = [int(line.rsplit(' ', 1)[1]) for line in buckets]
+    assert buckets[-1].startswith('monitor_cycle_seconds_bucket{le="+Inf"}')
+    total = next(line for line in lines if line.startswith('monitor_cycle_seconds_count'))
+    assert counts == sorted(counts) and counts[-1] == int(total.rsplit(' ', 1)[1])
@@ -0,0 +1,115 @@
+"""ResultBus trả job lại queue khi worker chết / treo, WorkerSupervisor spawn lại worker (worker giả trong process)"""
+import time
+from multiprocessing.connection import Client
+from threading import Event, Thread
+
+import pytest
+
+import main
+
+AUTHKEY = b'test-authkey'
+
+def fake_worker(address, name, behaviour='ok', exited=None):
+    """Worker giả qua multiprocessing.connection: 'ok' trả rows, 'die' đóng kết nối khi nhận job, 'hang' không trả lời"""
+    conn = Client(address, authkey=AUTHKEY)
+    # pid None: bus không kill được process test khi worker treo
+    conn.send({'type': 'hello', 'worker': name, 'pid': None})
+    try:
+        while True:
+            job = conn.recv()
+            if job['type'] == 'stop' or behaviour == 'die':
+                break
+            if behaviour == 'hang':
+                continue  # recv tiếp: bus đóng kết nối sau job_timeout -> EOFError
+            conn.send({'type': 'result', 'job_id': job['job_id'], 'tier': 'json', 'seconds': 0.01,
+                       'rows': [(1, f"{job['geo']} {job['hours']}h", '', 600000, '', [])]})
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+        if exited:
+            exited.set()
+
+def start_worker(bus, name, behaviour='ok', exited=None):
+    thread = Thread(target=fake_worker, args=(bus.address, name, behaviour, exited), daemon=True)
+    thread.start()
+    return thread
+
+@pytest.fixture
+def bus():
+    instance = main.ResultBus(('127.0.0.1', 0), AUTHKEY, job_timeout=0.3)
+    instance.start()
+    yield instance
+    instance.close()
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+@pytest.mark.parametrize('behaviour, counter', [('die', 'requeued'), ('hang', 'timed_out')])
+def test_job_requeued_when_worker_dies_or_hangs(bus, behaviour, counter):
+    future = bus.submit(main.TrendTarget('VN', 4))
+    start_worker(bus, 'bad', behaviour).join(5)
+    wait_for(lambda: bus.stats['requeued'] == 1)
+    assert not future.done()
+
+    start_worker(bus, 'good')
+    rows = future.result(timeout=5)
+    assert [row.keyword for row in rows] == ['VN 4h']
+    assert bus.stats[counter] == 1
+    assert (bus.stats['completed'], bus.stats['failed']) == (1, 0)
+
+def test_job_fails_after_second_worker_loss(bus):
+    future = bus.submit(main.TrendTarget('VN', 24))
+    start_worker(bus, 'first', 'die').join(5)
+    start_worker(bus, 'second', 'die').join(5)
+    with pytest.raises(RuntimeError, match='second died'):
+        future.result(timeout=5)
+    assert (bus.stats['requeued'], bus.stats['failed']) == (1, 1)
+
+class FakeProcess:
+    """Popen giả: 'thoát' khi thread worker giả kết thúc"""
+    def __init__(self, exited):
+        self.pid = None
+        self.exited = exited
+
+    @property
+    def returncode(self):
+        return 1 if self.exited.is_set() else None
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        pass
+
+    def wait(self, timeout=None):
+        self.exited.wait(timeout)
+
+def test_supervisor_restarts_dead_worker(bus, monkeypatch):
+    monkeypatch.setattr(main.WorkerSupervisor, 'WATCH_INTERVAL_SECONDS', 0.05)
+    supervisor = main.WorkerSupervisor(1, bus.address, AUTHKEY)
+    spawned = []
+
+    def spawn(name):
+        # Lần đầu worker chết giữa job (như Chrome crash kéo theo process), lần sau chạy bình thường
+        exited = Event()
+        start_worker(bus, name, 'die' if not spawned else 'ok', exited)
+        spawned.append(name)
+        supervisor.processes[name] = FakeProcess(exited)
+        supervisor.started_at[name] = time.monotonic()
+
+    monkeypatch.setattr(supervisor, '_spawn', spawn)
+    supervisor.start()
+    try:
+        future = bus.submit(main.TrendTarget('US', 4))
+        assert [row.keyword for row in future.result(timeout=10)] == ['US 4h']
+        assert spawned == ['w1', 'w1']
+        assert supervisor.restarts == 1
+        assert bus.stats['requeued'] == 1
+        assert supervisor.backoff['w1'] == 1.0
+    finally:
+        bus.close(1)
+        supervisor.stop()
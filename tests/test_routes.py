@@ -0,0 +1,59 @@
+"""Route đọc monitor không được tạo monitor trong request thread"""
+import pytest
+
+import main
+
+@pytest.mark.parametrize('path', ['/status', '/status?refresh=1', '/history?keyword=x', '/history/series?keyword=x',
+                                  '/history/movers', '/changes'])
+def test_monitor_routes_return_503_until_ready(path):
+    client = main.create_app(start_monitor=False).test_client()
+    response = client.get(path)
+    assert response.status_code == 503
+    assert response.get_json()['checks']['monitor_loaded'] is False
+    assert not main.monitor.service_loaded
+
+def test_health_does_not_build_monitor():
+    client = main.create_app(start_monitor=False).test_client()
+    assert client.get('/health').status_code == 200
+    assert client.get('/ready').status_code == 503
+    assert not main.monitor.service_loaded
+
+def test_home_is_not_gated_during_cold_start():
+    response = main.create_app(start_monitor=False).test_client().get('/')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'starting'
+    assert not main.monitor.service_loaded
+
+class FakeMonitor:
+    service_loaded = True
+
+    def __init__(self):
+        self.targets = main.parse_targets('VN:4')
+        self.snapshots = main.SnapshotStore(600)
+
+    def refresh_snapshots(self, targets=None):
+        raise AssertionError('scrape in request thread')
+
+class FakeScheduler:
+    def __init__(self):
+        self.triggered = []
+
+    def trigger(self, names=None):
+        self.triggered.append(names)
+        return {'VN:4h': 'queued'}
+
+def test_status_refresh_triggers_scheduler(monkeypatch):
+    fake_monitor, fake_scheduler = FakeMonitor(), FakeScheduler()
+    target = fake_monitor.targets[0]
+    fake_monitor.snapshots.put(target, [main.TrendRow(1, 'giá vàng', '2 Tr+', 2000000, '', [])], 'json')
+    monkeypatch.setattr(main, 'monitor', fake_monitor)
+    monkeypatch.setattr(main, 'scheduler', fake_scheduler)
+    monkeypatch.setattr(main, 'readiness_checks', lambda: {'ready': True})
+
+    response = main.create_app(start_monitor=False).test_client().get('/status?refresh=1')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert fake_scheduler.triggered == [None]
+    assert body['refresh'] == {'VN:4h': 'queued'}
+    assert body['xpath_trends'][target.scope]['keyword'] == 'giá vàng'
+    assert body['xpath_trends'][target.scope]['age_seconds'] >= 0
@@ -0,0 +1,46 @@
+"""scrape_targets: target không cần browser chạy song song vượt BROWSER_POOL_SIZE, target treo bị bỏ sau timeout"""
+import time
+from threading import Event
+
+import main
+
+def fake_table(delays, release=None):
+    def get_trending_table(timeframe, limit, geo):
+        delay = delays[f'{geo}:{timeframe}']
+        if delay is None:
+            release.wait(5)
+        else:
+            time.sleep(delay)
+        return [main.TrendRow(1, f'{geo} {timeframe}', '', 600000, '', [])]
+    return get_trending_table
+
+def test_executor_not_capped_by_browser_pool(monitor, monkeypatch):
+    targets = main.parse_targets('VN:4,VN:24,US:4,US:24')
+    assert monitor.executor._max_workers == main.MAX_PENDING_TARGETS >= len(targets) > main.BROWSER_POOL_SIZE
+    monkeypatch.setattr(monitor, 'get_trending_table', fake_table({target.key: 0.3 for target in targets}))
+
+    started = time.monotonic()
+    results = monitor.scrape_targets(targets)
+    assert time.monotonic() - started < 0.55  # 4 target x 0.3s chạy cùng lúc
+    assert sorted(rows[0].keyword for rows in results.values()) == ['US 24h', 'US 4h', 'VN 24h', 'VN 4h']
+
+def test_hung_target_times_out_without_blocking_others(monitor, monkeypatch):
+    targets = main.parse_targets('VN:4,VN:24,US:4')
+    release = Event()
+    monkeypatch.setattr(main, 'TARGET_TIMEOUT_SECONDS', 0.5)
+    monkeypatch.setattr(monitor, 'get_trending_table', fake_table({'VN:4h': 0.05, 'VN:24h': None, 'US:4h': 0.1}, release))
+
+    try:
+        started = time.monotonic()
+        results = monitor.scrape_targets(targets)
+        elapsed = time.monotonic() - started
+        assert 0.45 < elapsed < 1.0  # timeout tính từ lúc submit, không cộng dồn
+        assert sorted(target.key for target in results) == ['US:4h', 'VN:4h']
+        # Scrape treo vẫn giữ slot backpressure tới khi thật sự xong
+        assert monitor._pending._value == main.MAX_PENDING_TARGETS - 1
+    finally:
+        release.set()
+    deadline = time.monotonic() + 5
+    while monitor._pending._value < main.MAX_PENDING_TARGETS and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert monitor._pending._value == main.MAX_PENDING_TARGETS
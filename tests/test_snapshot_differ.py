@@ -0,0 +1,51 @@
+"""normalize_keyword + SnapshotDiffer: biến thể của cùng keyword dùng chung 1 key, chỉ dòng đổi mới là delta"""
+import unicodedata
+
+import pytest
+
+import main
+
+@pytest.mark.parametrize('variant', [
+    'Giá Vàng', 'GIÁ VÀNG', 'gia vang', 'giá  vàng ', '  giá\tvàng', 'giá vàng!', 'ｇｉá ｖàｎｇ'
+])
+def test_keyword_variants_share_key(variant):
+    assert main.normalize_keyword(variant) == main.normalize_keyword('giá vàng') == 'gia vang'
+
+def test_decomposed_diacritics_and_d():
+    assert main.normalize_keyword('Đà Nẵng') == main.normalize_keyword('Đà Nẵng') == 'da nang'
+
+@pytest.mark.parametrize('variant', [
+    'Real Madrid vs Real Sociedad', 'real sociedad - real madrid', 'Real Sociedad – Real Madrid',
+    'real madrid v. real sociedad', 'REAL SOCIEDAD VS REAL MADRID', 'real madrid versus real sociedad'
+])
+def test_match_sides_are_ordered(variant):
+    assert main.normalize_keyword(variant) == 'real madrid vs real sociedad'
+
+def test_hyphenated_word_is_not_a_match():
+    assert main.normalize_keyword('spider-man') == 'spider man'
+    assert main.normalize_keyword('') == ''
+
+def row(rank, keyword, volume):
+    return main.TrendRow(rank, keyword, '', volume, '', [])
+
+def test_differ_reports_only_changes():
+    differ, target = main.SnapshotDiffer(), main.TrendTarget('VN', 4)
+    baseline = differ.diff(target, [row(1, 'giá vàng', 500000), row(2, 'bitcoin', 100000), row(3, 'Real Madrid vs Barca', 50000)])
+    assert baseline.baseline and len(baseline.changed_rows()) == 3
+
+    # Cùng bảng, keyword viết khác (hoa-thường, dấu, thứ tự 2 vế) -> unchanged
+    same = differ.diff(target, [row(1, 'Giá Vàng', 500000), row(2, 'BITCOIN', 100000), row(3, 'barca - real madrid', 50000)])
+    assert same.unchanged and same.changed_rows() == []
+
+    diff = differ.diff(target, [row(1, 'bitcoin', 200000), row(2, 'giá vàng', 500000), row(3, 'iphone 17', 20000)])
+    assert [r.keyword for r in diff.new] == ['iphone 17']
+    assert [r.keyword for r in diff.dropped] == ['barca - real madrid']
+    assert [(r.keyword, rank) for r, rank in diff.moved] == [('bitcoin', 2), ('giá vàng', 1)]
+    assert [(r.keyword, volume) for r, volume in diff.updated] == [('bitcoin', 100000)]
+    assert [(r.keyword, volume) for r, volume in diff.tier_jumps] == [('bitcoin', 100000)]
+    assert [r.rank for r in diff.changed_rows()] == [1, 2, 3]
+
+def test_duplicate_variants_keep_best_rank():
+    differ, target = main.SnapshotDiffer(), main.TrendTarget('VN', 4)
+    diff = differ.diff(target, [row(1, 'giá vàng', 500000), row(4, 'Gia Vang', 20000)])
+    assert [(r.rank, r.keyword) for r in diff.new] == [(1, 'giá vàng')]
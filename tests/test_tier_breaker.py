@@ -0,0 +1,99 @@
+"""Circuit breaker của source tier: open sau N lỗi, half_open sau cooldown, cooldown x2 khi probe lỗi, closed khi thành công"""
+from threading import Event
+
+import main
+
+def make_breaker():
+    return main.TierBreaker('json', failure_threshold=3, cooldown_seconds=10, max_cooldown_seconds=25)
+
+def expire_cooldown(breaker):
+    breaker.opened_at -= breaker.cooldown
+
+def test_opens_after_consecutive_failures():
+    breaker = make_breaker()
+    breaker.record_failure('boom')
+    breaker.record_success(0.1)  # thành công ở giữa reset chuỗi lỗi
+    for _ in range(2):
+        breaker.record_failure('boom')
+    assert breaker.state == 'closed'
+    breaker.record_failure('boom')
+    assert breaker.state == 'open'
+
+def test_half_open_after_cooldown():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    assert not breaker.try_probe()
+    expire_cooldown(breaker)
+    assert breaker.try_probe()
+    assert breaker.state == 'half_open'
+    assert not breaker.try_probe()  # đúng 1 probe
+
+def test_failed_probe_doubles_cooldown():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    for cooldown in (20, 25, 25):
+        expire_cooldown(breaker)
+        assert breaker.try_probe()
+        breaker.record_failure('still down')
+        assert breaker.state == 'open'
+        assert breaker.cooldown == cooldown
+
+def test_successful_probe_closes_and_resets_cooldown():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    expire_cooldown(breaker)
+    assert breaker.try_probe()
+    breaker.record_failure()
+    expire_cooldown(breaker)
+    assert breaker.try_probe()
+    breaker.record_success(0.2)
+    assert breaker.state == 'closed'
+    assert breaker.cooldown == 10
+    assert breaker.consecutive_failures == 0
+
+def rows(*args):
+    return [main.TrendRow(1, 'giá vàng', '', 600000, '', [])]
+
+def test_order_tries_half_open_tier_last():
+    manager = main.SourceTierManager([('json', rows), ('soup', rows), ('rss', rows)], adaptive=True)
+    for name, seconds in (('json', 0.1), ('soup', 0.5), ('rss', 0.01)):
+        manager.record(name, True, seconds)
+    for _ in range(3):
+        manager.record('json', False, 1.0)
+    assert [name for name, _ in manager.order()] == ['soup', 'rss']
+
+    expire_cooldown(manager.breakers['json'])
+    assert manager.breakers['json'].try_probe()
+    assert [name for name, _ in manager.order()] == ['soup', 'rss', 'json']
+
+def test_one_probe_thread_per_tier():
+    release, calls = Event(), []
+
+    def hung(*args):
+        calls.append(args)
+        release.wait(5)
+        return []
+
+    manager = main.SourceTierManager([('json', rows), ('selenium', hung)], adaptive=True)
+    manager.record('json', True, 0.1)
+    for _ in range(3):
+        manager.record('selenium', False, 1.0)
+    breaker = manager.breakers['selenium']
+    try:
+        expire_cooldown(breaker)
+        manager.start_probes('4h', 10, 'VN')
+        manager._probes['selenium'].join(0.2)  # probe đang treo trong tier
+        # Scrape thật trên tier half_open lỗi -> open lại; probe cũ vẫn treo
+        manager.record('selenium', False, 1.0)
+        expire_cooldown(breaker)
+        manager.start_probes('4h', 10, 'VN')
+        assert len(calls) == 1
+        assert manager.status()['probing'] == ['selenium']
+        assert breaker.state == 'open'
+    finally:
+        release.set()
+    manager._probes['selenium'].join(5)
+    assert manager.status()['probing'] == []
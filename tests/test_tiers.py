@@ -0,0 +1,78 @@
+"""Các tier không cần browser (batchexecute, AF_initDataCallback, soup, RSS) trên fixture đã ghi:
+kết quả phải khớp tier XPath (Selenium), payload hỏng phải rơi xuống tier kế tiếp"""
+import re
+
+import lxml.html
+import pytest
+
+import main
+
+class XPathDriver:
+    """Driver giả cho tier Selenium: execute_script(TRENDS_TABLE_JS) đọc bảng bằng XPath trên cùng trang"""
+    def __init__(self, html: str):
+        self.document = lxml.html.fromstring(html)
+
+    @staticmethod
+    def first_line(elements) -> str:
+        return elements[0].text_content().strip().split('\n')[0].strip() if elements else ''
+
+    def execute_script(self, script: str):
+        assert script == main.TRENDS_TABLE_JS
+        bodies = self.document.xpath('//table/tbody')
+        rows = []
+        for tr in bodies[1 if len(bodies) > 1 else 0].xpath('./tr'):
+            cells = tr.xpath('./td')
+            if len(cells) < 3:
+                continue
+            rows.append({
+                'keyword': self.first_line(cells[1].xpath('./div')),
+                'volume': self.first_line(cells[2].xpath('./div/div')),
+                'started': self.first_line(cells[3].xpath('./div')) if len(cells) > 3 else '',
+                'related': cells[4].xpath('.//@data-term') if len(cells) > 4 else []
+            })
+        return rows
+
+def table(rows, related: bool = True):
+    return [(row.rank, row.keyword, row.volume, row.related if related else None) for row in rows]
+
+def malformed(fixtures, keep_soup: bool = True):
+    """batchexecute bị cắt cụt, AF_initDataCallback hỏng; keep_soup=False bỏ luôn div class cho BeautifulSoup"""
+    trending = re.sub(r"AF_initDataCallback\(\{key: 'ds:1'.*?\}\);", "AF_initDataCallback({key: 'ds:1', data:[null, [[1, 2", fixtures['trending'])
+    if not keep_soup:
+        trending = re.sub(r'<div class="(mZ3RIc|lqv0Cb)">.*?</div>', '', trending)
+    return {**fixtures, 'batchexecute': ")]}'\n\n31\n[[\"wrb.fr\",\"i0OFE\",\"[null, [[\"", 'trending': trending}
+
+@pytest.fixture
+def xpath_rows(monitor, recorded):
+    rows = monitor.extract_trending_table(XPathDriver(recorded['trending']))
+    assert len(rows) == 25
+    return rows
+
+def test_batchexecute_matches_xpath_tier(monitor, recorded, serve_trends, xpath_rows):
+    serve_trends(recorded)
+    assert table(monitor.scrape_json('24h', None, 'US')) == table(xpath_rows)
+
+def test_af_init_data_matches_xpath_tier(monitor, recorded, serve_trends, xpath_rows):
+    serve_trends({**recorded, 'batchexecute': ")]}'\n\n"})
+    assert table(monitor.scrape_json('24h', None, 'US')) == table(xpath_rows)
+
+def test_limit_applies_to_json_tier(monitor, recorded, serve_trends, xpath_rows):
+    serve_trends(recorded)
+    assert table(monitor.scrape_json('4h', 5, 'US')) == table(xpath_rows[:5])
+
+def test_soup_and_rss_match_xpath_tier(monitor, recorded, serve_trends, xpath_rows):
+    serve_trends(recorded)
+    assert table(monitor.scrape_soup('24h', None, 'US'), related=False) == table(xpath_rows, related=False)
+    assert table(monitor.scrape_rss('24h', None, 'US'), related=False) == table(xpath_rows, related=False)
+
+@pytest.mark.parametrize('keep_soup, served', [(True, 'soup'), (False, 'rss')])
+def test_malformed_payload_falls_through(monitor, recorded, serve_trends, xpath_rows, keep_soup, served):
+    serve_trends(malformed(recorded, keep_soup))
+    assert monitor.scrape_json('24h', None, 'US') == []
+
+    tiers = [(name, tier) for name, tier in monitor.source_tiers() if name != 'selenium']
+    manager = main.SourceTierManager(tiers, adaptive=False)
+    name, rows = manager.scrape('24h', None, 'US')
+    assert name == served
+    assert table(rows, related=False) == table(xpath_rows, related=False)
+    assert manager.breakers['json'].stats['failures'] == 1
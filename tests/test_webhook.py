@@ -0,0 +1,71 @@
+"""Telegram webhook: secret, chat được phép, reply command từ snapshot / history (không scrape trong request)"""
+import time
+
+import pytest
+
+import main
+
+SECRET = 'webhook-secret'
+
+class FakeMonitor:
+    service_loaded = True
+
+    def __init__(self, history):
+        self.targets = main.parse_targets('VN:4')
+        self.snapshots = main.SnapshotStore(600)
+        self.history = history
+
+@pytest.fixture
+def fake_monitor(tmp_path, monkeypatch):
+    instance = FakeMonitor(main.TrendHistoryStore(str(tmp_path / 'history.db')))
+    monkeypatch.setattr(main, 'monitor', instance)
+    monkeypatch.setattr(main, 'SCRAPE_TARGETS', 'VN:4')
+    monkeypatch.setattr(main, 'TELEGRAM_WEBHOOK_SECRET', SECRET)
+    monkeypatch.setattr(main, 'TELEGRAM_COMMAND_CHATS', ['42'])
+    yield instance
+    instance.history.conn.close()
+
+def post(text, chat_id=42, secret=SECRET):
+    client = main.create_app(start_monitor=False).test_client()
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret is not None else {}
+    update = {'update_id': 1, 'message': {'message_id': 7, 'chat': {'id': chat_id, 'type': 'private'}, 'text': text}}
+    return client.post('/telegram/webhook', json=update, headers=headers)
+
+@pytest.mark.parametrize('secret', [None, '', 'wrong'])
+def test_wrong_or_missing_secret_is_forbidden(fake_monitor, secret):
+    assert post('/top', secret=secret).status_code == 403
+
+def test_unauthorized_chat_gets_no_reply(fake_monitor):
+    response = post('/top', chat_id=99)
+    assert response.status_code == 200
+    assert response.get_data() == b''
+
+def test_top_before_first_snapshot(fake_monitor):
+    reply = post('/top geo=VN hours=4').get_json()
+    assert reply['method'] == 'sendMessage'
+    assert reply['chat_id'] == 42 and reply['reply_to_message_id'] == 7
+    assert 'Chưa có dữ liệu' in reply['text'] and 'VN:4h' in reply['text']
+
+def test_top_from_snapshot(fake_monitor):
+    target = fake_monitor.targets[0]
+    fake_monitor.snapshots.put(target, [main.TrendRow(1, 'giá vàng', '2 Tr+', 2000000, '', [])], 'json')
+    text = post('/top geo=VN n=5').get_json()['text']
+    assert '1. `giá vàng` — `2,000,000`' in text
+
+def test_history_filters_by_geo(fake_monitor):
+    now = time.time()
+    fake_monitor.history.record_snapshot(main.TrendTarget('VN', 4), [main.TrendRow(1, 'bitcoin', '', 600000, '', [])], now - 60)
+    fake_monitor.history.record_snapshot(main.TrendTarget('US', 4), [main.TrendRow(3, 'bitcoin', '', 900000, '', [])], now - 30)
+
+    text = post('/history bitcoin geo=vn').get_json()['text']
+    assert '`600,000`' in text and '900,000' not in text
+    both = post('/history bitcoin').get_json()['text']
+    assert '`600,000`' in both and '`900,000`' in both
+
+@pytest.mark.parametrize('command', ['/top n=abc', '/top hours=x', '/history bitcoin hours=abc', '/history bitcoin n=x'])
+def test_bad_numbers_reply_with_error(fake_monitor, command):
+    assert post(command).get_json()['text'].startswith('⚠️ Tham số không hợp lệ')
+
+def test_user_text_is_markdown_escaped(fake_monitor):
+    text = post('/history a_b*c`d[e').get_json()['text']
+    assert 'a\\_b\\*c\\`d\\[e' in text